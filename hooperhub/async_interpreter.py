@@ -0,0 +1,475 @@
+""" asyncio variant of the Interpreter on psycopg2's asynchronous mode """
+
+import asyncio
+import weakref
+import functools
+import psycopg2 as psql
+import psycopg2.extensions as psql_ext
+
+from collections import deque
+
+from hooperhub.interpreter import Interpreter
+from hooperhub.util.calculator import STAT_RECIPES
+from hooperhub.util.columnar import (get_columnar_store, column_sql,
+                                     game_list_query, group_query, group_rows,
+                                     last_games_query, game_log_query,
+                                     game_values_from_rows)
+from hooperhub.util.leaderboard import get_leaderboard, SELECT_PLAYER_SPLITS
+from hooperhub.util.rollups import FIND_ROLLUP_VERSION, SELECT_ROLLUP_VERSION
+from hooperhub.util.lookup_index import (get_lookup_index, SELECT_PLAYERS,
+                                         SELECT_TEAMS)
+from hooperhub.util.query_cache import get_query_cache
+
+
+SELECT_PLAYER_ID = """ SELECT player_id FROM player WHERE name=%s; """
+SELECT_TEAM_ABBR = """ SELECT abbr FROM team WHERE team_id=%s; """
+
+
+def _set_ready(future):
+    if not future.done():
+        future.set_result(None)
+
+
+async def wait_ready(conn):
+    """ Waits without blocking the event loop until an asynchronous
+        connection has finished connecting or running its current query.
+    """
+    loop = asyncio.get_event_loop()
+    fd = conn.fileno()
+    while True:
+        state = conn.poll()
+        if state == psql_ext.POLL_OK:
+            return
+        ready = loop.create_future()
+        if state == psql_ext.POLL_READ:
+            loop.add_reader(fd, _set_ready, ready)
+            remove = loop.remove_reader
+        elif state == psql_ext.POLL_WRITE:
+            loop.add_writer(fd, _set_ready, ready)
+            remove = loop.remove_writer
+        else:
+            raise psql.OperationalError("Bad poll state: {}".format(state))
+        try:
+            await ready
+        finally:
+            remove(fd)
+
+
+class _PooledConnection(object):
+    """ Async context manager returned by AsyncConnectionPool.connection().
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._conn = None
+
+
+    async def __aenter__(self):
+        self._conn = await self._pool.acquire()
+        return self._conn
+
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._pool.release(self._conn)
+
+
+class AsyncConnectionPool(object):
+    """ Hands out asynchronous psycopg2 connections to coroutines, one query
+        at a time each, opening up to max_size of them. Coroutines wait when
+        every connection is in use. Asynchronous connections are always in
+        autocommit mode, so there is no transaction to roll back on release.
+        Create the pool inside the event loop that will use it.
+    """
+
+    def __init__(self, connect, max_size=10):
+        """ Creates the AsyncConnectionPool. No connection is opened until
+            one is needed.
+            Args:
+                connect: A function with no arguments that starts opening an
+                    asynchronous connection, e.g. a partial of
+                    psycopg2.connect with async_=True.
+                max_size: The maximum number of open connections.
+        """
+        self._connect = connect
+        self.max_size = max_size
+        self._slots = asyncio.Semaphore(max_size)
+        self._idle = []
+        self.created_count = 0
+
+
+    async def acquire(self):
+        """ Returns:
+                A ready connection that must be given back with release().
+        """
+        await self._slots.acquire()
+        if self._idle:
+            return self._idle.pop()
+        try:
+            conn = self._connect()
+            await wait_ready(conn)
+        except Exception:
+            self._slots.release()
+            raise
+        self.created_count += 1
+        return conn
+
+
+    def release(self, conn):
+        """ Gives a connection back to the pool, dropping it if it was closed
+            by an error.
+        """
+        if not conn.closed:
+            self._idle.append(conn)
+        self._slots.release()
+
+
+    def connection(self):
+        """ Async context manager that acquires a connection and releases it
+            on exit.
+        """
+        return _PooledConnection(self)
+
+
+    def close(self):
+        """ Closes every idle connection. """
+        for conn in self._idle:
+            conn.close()
+        self._idle = []
+
+
+def create_async_pool(PG_HOST, PG_PORT, PG_DBNAME, PG_USER, max_size=10):
+    """ Returns:
+            An AsyncConnectionPool for the given PostgreSQL database.
+    """
+    return AsyncConnectionPool(functools.partial(psql.connect,
+                                                 host = PG_HOST,
+                                                 port = PG_PORT,
+                                                 dbname = PG_DBNAME,
+                                                 user = PG_USER,
+                                                 async_ = True),
+                               max_size)
+
+
+async def fetch(pool, query, params=None, fetch_all=False):
+    """ Runs one query on a connection from pool.
+        Returns:
+            The first row, or every row if fetch_all is true.
+    """
+    async with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, params)
+            await wait_ready(conn)
+            return cursor.fetchall() if fetch_all else cursor.fetchone()
+        finally:
+            cursor.close()
+
+
+# the LookupIndex reload currently running in each event loop, so that
+# concurrent requests share it
+_index_refreshes = weakref.WeakKeyDictionary()
+
+
+async def _load_index(pool, index):
+    players, teams = await asyncio.gather(
+        fetch(pool, SELECT_PLAYERS, fetch_all=True),
+        fetch(pool, SELECT_TEAMS, fetch_all=True))
+    index.load(players, teams)
+
+
+async def refresh_index_if_stale(pool, index):
+    """ Reloads a stale LookupIndex, with both tables read concurrently. """
+    if not index.stale:
+        return
+    loop = asyncio.get_event_loop()
+    task = _index_refreshes.get(loop)
+    if task is None or task.done():
+        task = loop.create_task(_load_index(pool, index))
+        _index_refreshes[loop] = task
+    await task
+
+
+class AsyncGameLog(object):
+    """ Asynchronous iterator over the games of an AsyncInterpreter's game log
+        query, for use with async for. Asynchronous connections cannot hold a
+        server-side cursor, so every page of page_size games is its own
+        keyset query that starts after the last game of the previous page,
+        and no connection is held between pages.
+    """
+
+    def __init__(self, interpreter, after=None, limit=None, page_size=500):
+        """ Creates the AsyncGameLog. The arguments are those of
+            Interpreter.game_log().
+        """
+        self._interpreter = interpreter
+        self._after = after
+        self._remaining = limit
+        self._page_size = page_size
+        self._started = False
+        self._done = False
+        self._conditions_str = None
+        # rows of the current page that have not been returned yet
+        self._page = deque()
+        # the ColumnarStore's game list, when the store is loaded
+        self._store_rows = None
+
+
+    def __aiter__(self):
+        return self
+
+
+    async def _start(self):
+        interpreter = self._interpreter
+        entity_table = interpreter._entity_table
+        await interpreter._resolve_lookups()
+        _, self._conditions_str = interpreter._aggregate_conditions()
+        if self._after is not None:
+            self._after = interpreter._game_key(self._after)
+
+        store = get_columnar_store()
+        if store is not None:
+            self._store_rows = store.game_list(interpreter._player_id,
+                                               entity_table, self._after,
+                                               self._remaining,
+                                               entity_table.min_points)
+
+
+    async def _fetch_page(self):
+        if self._remaining is not None and self._remaining <= 0:
+            self._done = True
+            return
+        entity_table = self._interpreter._entity_table
+        size = self._page_size
+        if self._remaining is not None:
+            size = min(size, self._remaining)
+        query = game_list_query(self._conditions_str,
+                                self._after is not None, size,
+                                entity_table.min_points)
+        params = [entity_table.start_date, entity_table.end_date]
+        if self._after is not None:
+            params.extend(self._after)
+        rows = await fetch(self._interpreter._pool, query, params,
+                           fetch_all=True)
+        self._page.extend(rows)
+        if len(rows) < size:
+            self._done = True
+            return
+        if self._remaining is not None:
+            self._remaining -= len(rows)
+        # the key of the last game is (game_date, player_id)
+        self._after = (rows[-1][1], rows[-1][0])
+
+
+    async def __anext__(self):
+        if not self._started:
+            self._started = True
+            await self._start()
+        if self._store_rows is not None:
+            row = next(self._store_rows, None)
+        else:
+            if not self._page and not self._done:
+                await self._fetch_page()
+            row = self._page.popleft() if self._page else None
+        if row is None:
+            raise StopAsyncIteration
+        return self._interpreter._game_entry(row)
+
+
+class AsyncInterpreter(Interpreter):
+    """ An Interpreter whose queries wait on the event loop instead of
+        blocking the worker thread, so that one worker can keep many requests
+        in flight. The player and team lookups that miss the LookupIndex run
+        concurrently, each on its own connection from an AsyncConnectionPool,
+        before the shared _aggregate_conditions and Calculator logic runs.
+        Call it with await.
+    """
+
+    def __init__(self, entity_table, stat_path, pool):
+        """ Create the AsyncInterpreter.
+            Args:
+                entity_table: an EntityTable object containing all queried
+                    statistics and conditions of the query.
+                stat_path: Unused, as for the Interpreter.
+                pool: The AsyncConnectionPool to query with.
+        """
+        self._entity_table = entity_table
+        self._player_id = None
+        self._pool = pool
+        self.conn = None
+        self.cursor = None
+        self._index = get_lookup_index()
+        self.stat_recipes = STAT_RECIPES
+        # lookups fetched by _resolve_lookups for _aggregate_conditions
+        self._player_ids = {}
+        self._team_abbrs = {}
+
+
+    def close_psql_connection(self):
+        """ Connections are only held while a query runs. """
+        pass
+
+
+    def _get_player_id(self, player_name):
+        if player_name in self._player_ids:
+            return self._player_ids[player_name]
+        return self._index.player_id(player_name)
+
+
+    def _get_team_abbr(self, team_id):
+        if team_id in self._team_abbrs:
+            return self._team_abbrs[team_id]
+        return self._index.team_abbr(team_id)
+
+
+    async def _lookup_player_id(self, player_name):
+        row = await fetch(self._pool, SELECT_PLAYER_ID, (player_name,))
+        if row is None:
+            raise KeyError(player_name)
+        self._player_ids[player_name] = row[0]
+
+
+    async def _lookup_team_abbr(self, team_id):
+        row = await fetch(self._pool, SELECT_TEAM_ABBR, (team_id,))
+        self._team_abbrs[team_id] = row[0] if row else None
+
+
+    async def _resolve_lookups(self):
+        """ Fetches the player id and team abbreviations the LookupIndex does
+            not have, all at once.
+        """
+        await refresh_index_if_stale(self._pool, self._index)
+        lookups = []
+        player_name = self._entity_table.player_name
+        if player_name and self._index.player_id(player_name) is None:
+            lookups.append(self._lookup_player_id(player_name))
+        for team_id in (self._entity_table.played_for,
+                        self._entity_table.played_against):
+            if team_id and self._index.team_abbr(team_id) is None:
+                lookups.append(self._lookup_team_abbr(team_id))
+        if lookups:
+            await asyncio.gather(*lookups)
+
+
+    async def _interpret_leaders_db(self, entity_table, stat_entities):
+        """ Ranks the league as Interpreter._interpret_leaders does,
+            reloading a stale LeaderboardIndex asynchronously.
+        """
+        condition_entitys, filters = self._leader_conditions(entity_table)
+        leaderboard = get_leaderboard()
+        if not leaderboard.stale and leaderboard.version is not None:
+            row = await fetch(self._pool, SELECT_ROLLUP_VERSION)
+            leaderboard.outdated(row[0])
+        if leaderboard.stale:
+            version = None
+            if (await fetch(self._pool, FIND_ROLLUP_VERSION))[0] is not None:
+                version = (await fetch(self._pool, SELECT_ROLLUP_VERSION))[0]
+            leaderboard.load(await fetch(self._pool, SELECT_PLAYER_SPLITS,
+                                         fetch_all=True), version)
+        await refresh_index_if_stale(self._pool, self._index)
+        return condition_entitys, self._rank_leaders(entity_table,
+                                                     stat_entities, filters)
+
+
+    async def _query_db(self, columns, conditions_str):
+        query = self._base_query.format(cols = ','.join(map(column_sql,
+                                                            columns)),
+                                        conds = conditions_str)
+        row = await fetch(self._pool, query, (self._entity_table.start_date,
+                                              self._entity_table.end_date))
+        return self._parse_row(columns, row[0])
+
+
+    async def _interpret_special_db(self, stat_entities, columns,
+                                    conditions_str):
+        """ Interprets a rolling window, a breakdown or a last games query
+            from the database, as Interpreter._interpret_special does.
+            Returns:
+                The calculated results, or None for a plain query.
+        """
+        et = self._entity_table
+        dates = (et.start_date, et.end_date)
+        if et.rolling_window:
+            rows = await fetch(self._pool,
+                               game_log_query(columns, conditions_str),
+                               dates, fetch_all=True)
+            game_dates, values = game_values_from_rows(columns, rows)
+            return self._rolling_results(et, stat_entities, columns,
+                                         game_dates, values)
+        if et.group_by:
+            rows = await fetch(self._pool,
+                               group_query(columns, conditions_str,
+                                           et.group_by),
+                               dates, fetch_all=True)
+            return self._series(et.group_by, stat_entities,
+                                group_rows(columns, rows))
+        if et.last_games:
+            row = await fetch(self._pool,
+                              last_games_query(columns, conditions_str,
+                                               et.last_games),
+                              dates)
+            return self._calculate(stat_entities,
+                                   self._parse_row(columns, row[0]))
+        return None
+
+
+    def game_log(self, after=None, limit=None, page_size=500):
+        """ Lists the games as Interpreter.game_log() does, for use with
+            async for.
+            Returns:
+                An AsyncGameLog.
+        """
+        return AsyncGameLog(self, after, limit, page_size)
+
+
+    async def __call__(self):
+        """ The "main" function of the AsyncInterpreter.
+        Returns:
+            A dictionary containing all of the parsed entities and a dictionary
+            containing calculated results, all contained in a 2-tuple.
+        """
+        if self._entity_table.game_log:
+            await self._resolve_lookups()
+            return self._game_log_conditions(), self.game_log()
+
+        cache = get_query_cache()
+        cache_key = self._entity_table.key()
+        cached = cache.get_result(cache_key)
+        if cached is not None:
+            return cached
+
+        stat_entities = self._get_stat_entities(self._entity_table)
+        if self._entity_table.leaders:
+            result = await self._interpret_leaders_db(self._entity_table,
+                                                      stat_entities)
+            cache.put_result(cache_key, result)
+            return result
+        columns = list(self._get_needed_columns(stat_entities))
+
+        await self._resolve_lookups()
+        condition_entitys, conditions_str = self._aggregate_conditions()
+
+        store = get_columnar_store()
+        if store is not None:
+            # the in-process paths never touch a connection
+            result_entitys = self._interpret_special(self._entity_table,
+                                                     stat_entities,
+                                                     columns,
+                                                     conditions_str)
+            if result_entitys is None:
+                rudimentary_stats = store.query(self._player_id,
+                                                self._entity_table,
+                                                columns)
+                result_entitys = self._calculate(stat_entities,
+                                                 rudimentary_stats)
+        else:
+            result_entitys = await self._interpret_special_db(stat_entities,
+                                                              columns,
+                                                              conditions_str)
+            if result_entitys is None:
+                rudimentary_stats = await self._query_db(columns,
+                                                         conditions_str)
+                result_entitys = self._calculate(stat_entities,
+                                                 rudimentary_stats)
+
+        cache.put_result(cache_key, (condition_entitys, result_entitys))
+        return condition_entitys, result_entitys
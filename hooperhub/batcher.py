@@ -0,0 +1,153 @@
+import queue
+import threading
+
+from time import monotonic
+from concurrent.futures import Future
+
+from hooperhub.engine import get_engine
+
+
+class MicroBatcher(object):
+    """ Collects sentences from concurrent Lexer.decode calls and runs them
+        through the InferenceEngine together. A batch is closed when it
+        reaches max_batch_size sentences or when max_wait_ms has passed since
+        its first sentence arrived, so a caller never waits longer than the
+        window plus one model run.
+    """
+
+    def __init__(self, engine, max_batch_size=16, max_wait_ms=3):
+        """ Creates the MicroBatcher. The worker thread is started on the
+            first submitted sentence.
+            Args:
+                engine: The InferenceEngine used to decode each batch.
+                max_batch_size: The maximum number of sentences in one batch.
+                max_wait_ms: How long to wait for more sentences after the
+                    first one in a batch arrives, in milliseconds.
+        """
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batch_count = 0
+        self.sentence_count = 0
+
+
+    def _start_worker(self):
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run,
+                                                name='hooperhub-batcher',
+                                                daemon=True)
+                self._worker.start()
+
+
+    def submit(self, sentence):
+        """ Queues a sentence for the next batch.
+            Args:
+                sentence: A list of input token id's.
+            Returns:
+                A Future that resolves to the list of target token id's.
+        """
+        if self._worker is None:
+            self._start_worker()
+        future = Future()
+        self._queue.put((sentence, future))
+        return future
+
+
+    def decode(self, sentence):
+        """ Queues a sentence and blocks until its batch has been decoded.
+            Args:
+                sentence: A list of input token id's.
+            Returns:
+                A list of target token id's, one for each input token.
+        """
+        return self.submit(sentence).result()
+
+
+    def _collect(self):
+        """ Blocks for the first queued sentence, then keeps taking sentences
+            until the batch is full or the window has closed.
+            Returns:
+                A list of (sentence, future) pairs.
+        """
+        batch = [self._queue.get()]
+        deadline = monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+
+    def _run(self):
+        """ Worker loop that decodes each batch and hands the predictions
+            back to the callers' futures.
+        """
+        while True:
+            batch = self._collect()
+            sentences = [sentence for sentence, _ in batch]
+            try:
+                predictions = self.engine.decode_batch(sentences)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+            with self._stats_lock:
+                self.batch_count += 1
+                self.sentence_count += len(batch)
+
+
+    def stats(self):
+        """ Returns:
+                A dictionary with the number of batches run, the number of
+                sentences decoded and the average batch size.
+        """
+        with self._stats_lock:
+            batches, sentences = self.batch_count, self.sentence_count
+        return {
+            'batches': batches,
+            'sentences': sentences,
+            'avg_batch_size': sentences / batches if batches else 0.0
+        }
+
+
+# batching window used by the process-wide MicroBatcher
+MAX_BATCH_SIZE = 16
+MAX_WAIT_MS = 3
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def configure_batcher(max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+    """ Replaces the process-wide MicroBatcher with one using the given
+        window. This should be called at startup before any queries arrive.
+        Returns:
+            The new MicroBatcher.
+    """
+    global _batcher
+    with _batcher_lock:
+        _batcher = MicroBatcher(get_engine(), max_batch_size, max_wait_ms)
+    return _batcher
+
+
+def get_batcher():
+    """ Returns the process-wide MicroBatcher, creating it on first use. """
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(get_engine(),
+                                        MAX_BATCH_SIZE,
+                                        MAX_WAIT_MS)
+    return _batcher
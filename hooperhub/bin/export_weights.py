@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+""" Exports the trained checkpoint to an .npz file for the NumPy runtime """
+
+import os
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import re
+import numpy as np
+import tensorflow as tf
+from hooperhub.numpy_model import PRECISIONS, WEIGHT_NAMES, quantize_weights
+
+
+tf.app.flags.DEFINE_integer("source_vocab_size", 1100,
+                            "Input vocabulary size.")
+tf.app.flags.DEFINE_integer("target_vocab_size", 200,
+                            "Output vocabulary size.")
+tf.app.flags.DEFINE_integer("size", "512", "Size of each model layer")
+tf.app.flags.DEFINE_string("data_dir", ".", "Training directory")
+tf.app.flags.DEFINE_string("output", None,
+                           "Path of the .npz file (defaults to "
+                           "data_dir/model.npz)")
+tf.app.flags.DEFINE_string("precision", "float32",
+                           "Precision of the exported matrices: float32, "
+                           "float16 or int8 with per-row scales")
+
+FLAGS = tf.app.flags.FLAGS
+
+
+def gru_weight_name(var_name):
+  """ Maps a GRUCell variable from the checkpoint to its exported name.
+      Args:
+        var_name: The checkpoint variable name, e.g.
+          bidirectional_rnn/fw/gru_cell/gates/weights.
+      Returns:
+        The exported name, e.g. enc_fw_gates_w, or None if the variable is not
+        part of a GRUCell.
+  """
+  match = re.search(r'(gates|candidate)/(weights|biases|kernel|bias)$',
+                    var_name)
+  if not match or 'gru_cell' not in var_name.lower():
+    return None
+  if '/fw/' in var_name:
+    prefix = 'enc_fw_'
+  elif '/bw/' in var_name:
+    prefix = 'enc_bw_'
+  else:
+    prefix = 'dec_'
+  suffix = '_w' if match.group(2) in ('weights', 'kernel') else '_b'
+  return prefix + match.group(1) + suffix
+
+
+def export_weights(ckpt_path):
+  """ Reads the model variables out of a checkpoint. The embeddings and
+      output projection are plain tf.Variables without names, so they are
+      told apart by their shapes.
+      Args:
+        ckpt_path: Path of the checkpoint to read.
+      Returns:
+        A dictionary mapping each name in WEIGHT_NAMES to a float32 array.
+  """
+  reader = tf.train.NewCheckpointReader(ckpt_path)
+  shapes = {
+    (FLAGS.source_vocab_size, FLAGS.size): 'src_embed',
+    (FLAGS.target_vocab_size, FLAGS.size): 'tgt_embed',
+    (FLAGS.size*2, FLAGS.target_vocab_size): 'W',
+    (FLAGS.target_vocab_size,): 'b'
+  }
+  weights = {}
+  for var_name, shape in reader.get_variable_to_shape_map().items():
+    # skip the optimizer slots and accumulators
+    if 'Adam' in var_name or 'power' in var_name:
+      continue
+    if re.match(r'^Variable(_\d+)?$', var_name):
+      name = shapes.get(tuple(shape))
+    else:
+      name = gru_weight_name(var_name)
+    if name is None:
+      continue
+    if name in weights:
+      raise ValueError("Checkpoint has more than one variable for "
+                       "{}".format(name))
+    weights[name] = reader.get_tensor(var_name).astype(np.float32)
+  missing = [name for name in WEIGHT_NAMES if name not in weights]
+  if missing:
+    raise ValueError("Checkpoint is missing {}".format(', '.join(missing)))
+  return weights
+
+
+def main(_):
+  ckpt_path = tf.train.latest_checkpoint(FLAGS.data_dir)
+  if ckpt_path is None:
+    print("No checkpoint exists. Please run the trainer first.")
+    return
+  if FLAGS.precision not in PRECISIONS:
+    print("Precision must be one of {}".format(', '.join(PRECISIONS)))
+    return
+  output = FLAGS.output or os.path.join(FLAGS.data_dir, 'model.npz')
+  weights = export_weights(ckpt_path)
+  np.savez(output, **quantize_weights(weights, FLAGS.precision))
+  print("Exported {} to {} at {}".format(ckpt_path, output, FLAGS.precision))
+
+
+if __name__ == '__main__':
+  tf.app.run()
@@ -0,0 +1,296 @@
+import os
+import threading
+
+from hooperhub.numpy_model import NumpySeq2SeqModel
+from hooperhub.util.query_cache import get_query_cache
+
+
+# name of the file written by hooperhub/bin/export_weights.py; set HH_WEIGHTS
+# to serve another export, such as a float16 or int8 copy of the weights
+NUMPY_WEIGHTS = os.environ.get('HH_WEIGHTS', 'model.npz')
+
+
+def default_data_dir():
+    return os.path.join(os.environ['HH_ROOT'], 'hooperhub/data/')
+
+
+class InferenceEngine(object):
+    """ Keeps a single Seq2SeqModel graph and session alive for the lifetime
+        of the process so that the Lexer does not have to rebuild the graph
+        and restore the checkpoint for every query. Sessions are thread-safe
+        for concurrent sess.run calls, so the lock only guards loading and
+        swapping the graph during a reload. TensorFlow is only imported when
+        the checkpoint is first loaded.
+    """
+
+    def __init__(self, data_dir=None):
+        """ Creates the InferenceEngine. The checkpoint is not loaded until
+            the first decode call or an explicit load().
+            Args:
+                data_dir: The directory containing the trained checkpoint.
+                    Defaults to $HH_ROOT/hooperhub/data/.
+        """
+        if data_dir is None:
+            data_dir = default_data_dir()
+        self.data_dir = data_dir
+        self._lock = threading.Lock()
+        self._graph = None
+        self._sess = None
+        self._model = None
+        self._ckpt_path = None
+        # the number of decodes running against each session, so that a
+        # session replaced by reload() is only closed once they finish
+        self._in_flight = {}
+        self._retired = set()
+
+
+    def _build(self):
+        """ Builds a new graph and session and restores the latest checkpoint
+            into it.
+            Returns:
+                A 4-tuple of the graph, session, model and checkpoint path.
+        """
+        import tensorflow as tf
+        from hooperhub.seq2seq_model import Seq2SeqModel
+
+        ckpt = tf.train.get_checkpoint_state(self.data_dir)
+        if not (ckpt and tf.train.checkpoint_exists(ckpt.model_checkpoint_path)):
+            raise IOError("No checkpoint exists. Please run the trainer first.")
+        graph = tf.Graph()
+        with graph.as_default():
+            model = Seq2SeqModel(1100,  # source_vocab_size
+                                 200,   # target_vocab_size
+                                 512,   # layer_size
+                                 50,    # batch_size
+                                 0.001, # learn_rate
+                                 train=False)
+            sess = tf.Session(graph=graph)
+            ckpt_path = tf.train.latest_checkpoint(self.data_dir)
+            model_meta_graph = os.path.join(self.data_dir, 'model.ckpt.meta')
+            saver = tf.train.import_meta_graph(model_meta_graph)
+            saver.restore(sess, ckpt_path)
+        graph.finalize()
+        return graph, sess, model, ckpt_path
+
+
+    def load(self):
+        """ Loads the checkpoint if it has not been loaded yet. """
+        with self._lock:
+            if self._sess is None:
+                (self._graph, self._sess,
+                 self._model, self._ckpt_path) = self._build()
+
+
+    def reload(self):
+        """ Restores the latest checkpoint in data_dir into a fresh graph and
+            swaps it in. Decodes that are already running finish against the
+            old session, which is closed when the last of them returns.
+            Returns:
+                The path of the checkpoint that is now being served.
+        """
+        graph, sess, model, ckpt_path = self._build()
+        with self._lock:
+            old_sess = self._sess
+            self._graph, self._sess = graph, sess
+            self._model, self._ckpt_path = model, ckpt_path
+            if old_sess is not None and self._in_flight.get(old_sess):
+                self._retired.add(old_sess)
+                old_sess = None
+        if old_sess is not None:
+            old_sess.close()
+        return ckpt_path
+
+
+    def _release(self, sess):
+        """ Ends a decode against sess, closing the session if reload()
+            replaced it and this was the last decode using it.
+        """
+        with self._lock:
+            self._in_flight[sess] -= 1
+            if self._in_flight[sess]:
+                return
+            del self._in_flight[sess]
+            if sess not in self._retired:
+                return
+            self._retired.remove(sess)
+        sess.close()
+
+
+    @property
+    def checkpoint_path(self):
+        return self._ckpt_path
+
+
+    def decode(self, sentence):
+        """ Runs a single tokenized sentence through the warm model.
+            Args:
+                sentence: A list of input token id's.
+            Returns:
+                A list of target token id's, one for each input token.
+        """
+        return self.decode_batch([sentence])[0]
+
+
+    def decode_batch(self, sentences):
+        """ Runs several tokenized sentences through the warm model in a
+            single make_prediction call. Shorter sentences are padded by
+            get_batch and their predictions are trimmed back to length.
+            Args:
+                sentences: A list of sentences, each a list of token id's.
+            Returns:
+                A list with one list of target token id's per sentence.
+        """
+        if self._sess is None:
+            self.load()
+        with self._lock:
+            sess, model = self._sess, self._model
+            self._in_flight[sess] = self._in_flight.get(sess, 0) + 1
+        try:
+            sentence_batch, sentence_len = model.get_batch(sentences)
+            targets = [[0] * len(sentence) for sentence in sentences]
+            target_batch, _ = model.get_batch(targets)
+            input_feed = {
+                model.enc_inputs: sentence_batch,
+                model.enc_inputs_len: sentence_len,
+                model.dec_targets: target_batch
+            }
+            predict = model.make_prediction(sess, input_feed)
+        finally:
+            self._release(sess)
+        return [list(predict[:length, i])
+                for i, length in enumerate(sentence_len)]
+
+
+class NumpyInferenceEngine(object):
+    """ Serves the tagger from weights exported by export_weights.py using
+        the NumPy runtime, so the process never imports TensorFlow. It has
+        the same interface as InferenceEngine. The model holds no per-call
+        state, so the lock only guards loading and swapping the weights.
+    """
+
+    def __init__(self, data_dir=None):
+        """ Creates the NumpyInferenceEngine. The weights are not loaded
+            until the first decode call or an explicit load().
+            Args:
+                data_dir: The directory containing model.npz. Defaults to
+                    $HH_ROOT/hooperhub/data/. The stored precision of the
+                    weights is read from the file.
+        """
+        if data_dir is None:
+            data_dir = default_data_dir()
+        self.data_dir = data_dir
+        self._lock = threading.Lock()
+        self._model = None
+        self._weights_path = None
+
+
+    def _build(self):
+        """ Loads the exported weights.
+            Returns:
+                A pair of the NumpySeq2SeqModel and the weights path.
+        """
+        weights_path = os.path.join(self.data_dir, NUMPY_WEIGHTS)
+        if not os.path.exists(weights_path):
+            raise IOError("No exported weights exist. Please run "
+                          "export_weights.py first.")
+        return NumpySeq2SeqModel.load(weights_path), weights_path
+
+
+    def load(self):
+        """ Loads the weights if they have not been loaded yet. """
+        with self._lock:
+            if self._model is None:
+                self._model, self._weights_path = self._build()
+
+
+    def reload(self):
+        """ Loads model.npz again and swaps it in. Decodes that are already
+            running finish against the old weights.
+            Returns:
+                The path of the weights that are now being served.
+        """
+        model, weights_path = self._build()
+        with self._lock:
+            self._model, self._weights_path = model, weights_path
+        return weights_path
+
+
+    @property
+    def checkpoint_path(self):
+        return self._weights_path
+
+
+    def decode(self, sentence):
+        """ Runs a single tokenized sentence through the model.
+            Args:
+                sentence: A list of input token id's.
+            Returns:
+                A list of target token id's, one for each input token.
+        """
+        return self.decode_batch([sentence])[0]
+
+
+    def decode_batch(self, sentences):
+        """ Runs several tokenized sentences through the model at once.
+            Args:
+                sentences: A list of sentences, each a list of token id's.
+            Returns:
+                A list with one list of target token id's per sentence.
+        """
+        if self._model is None:
+            self.load()
+        return self._model.decode_batch(sentences)
+
+
+# the tagger backend, either 'numpy' or 'tensorflow'; when unset the NumPy
+# runtime is used if exported weights exist
+BACKEND = os.environ.get('HH_BACKEND')
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def create_engine(backend=None, data_dir=None):
+    """ Creates an inference engine for the given backend.
+        Args:
+            backend: 'numpy', 'tensorflow' or None to pick the NumPy runtime
+                whenever model.npz exists in data_dir.
+            data_dir: The directory containing the checkpoint or weights.
+        Returns:
+            A NumpyInferenceEngine or an InferenceEngine.
+    """
+    if data_dir is None:
+        data_dir = default_data_dir()
+    if backend is None:
+        if os.path.exists(os.path.join(data_dir, NUMPY_WEIGHTS)):
+            backend = 'numpy'
+        else:
+            backend = 'tensorflow'
+    if backend == 'numpy':
+        return NumpyInferenceEngine(data_dir)
+    if backend == 'tensorflow':
+        return InferenceEngine(data_dir)
+    raise ValueError("Unknown backend {}".format(backend))
+
+
+def get_engine():
+    """ Returns the process-wide inference engine, creating it on first use.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(BACKEND)
+    return _engine
+
+
+def reload_engine():
+    """ Hook for when a new checkpoint or exported weights have been dropped
+        into hooperhub/data/.
+        Returns:
+            The path of the checkpoint that is now being served.
+    """
+    path = get_engine().reload()
+    # tags decoded by the old model may differ from the new one
+    get_query_cache().clear_tags()
+    return path
@@ -0,0 +1,298 @@
+import json
+import random
+import threading
+
+from collections import deque
+from itertools import product
+
+from hooperhub.util import artifacts, data_utils
+
+
+# condition groups of phrases.json whose keys are tags
+CONDITION_GROUPS = ['home_or_away', 'start_or_bench', 'win_or_loss',
+                    'playoffs', 'dates']
+
+
+def expand_phrase(phrase, phrases):
+    """ Expands a phrase from phrases.json into every word sequence it can
+        produce, the way generate_data.py flattens phrases. A list in the
+        phrase is a choice of alternatives and <NAME> chooses from the
+        top-level list NAME.
+        Args:
+            phrase: A list of words, choices and <NAME> references.
+            phrases: The parsed phrases.json.
+        Returns:
+            A list of word tuples.
+    """
+    slots = []
+    for word in phrase:
+        if type(word) == list:
+            slots.append(word)
+        elif word.startswith('<') and word.endswith('>'):
+            slots.append(phrases[word[1:-1]])
+        else:
+            slots.append([word])
+    return [tuple(' '.join(choice).split()) for choice in product(*slots)]
+
+
+class Gazetteer(object):
+    """ A deterministic tagger for queries made up entirely of the phrases,
+        player names and team names that generate_data.py builds training
+        examples from. Every phrase is stored in a word trie, and a sentence
+        is tagged only when it splits into known phrases in exactly one way,
+        no phrase could carry more than one tag and no tag repeats. Anything
+        else is left to the seq2seq model, including sentences that ask for
+        a stat from untrained_stats, which the model has no tag for yet and
+        whose unknown words the Lexer drops (so "median points" would look
+        like "points").
+    """
+
+    def __init__(self, phrases, players, teams, target_tags=None):
+        """ Creates the Gazetteer.
+            Args:
+                phrases: The parsed phrases.json.
+                players: A dictionary mapping player id's to names.
+                teams: A dictionary mapping team id's to an (abbreviation,
+                    names) pair.
+                target_tags: The set of IOB tags the model can produce. Phrases
+                    whose tags are not in it are skipped.
+        """
+        self._trie = {}
+        self.target_tags = target_tags
+        self.phrase_count = 0
+        for group in CONDITION_GROUPS:
+            for tag, values in phrases[group].items():
+                if tag in ('NONE', 'DATE'):
+                    continue
+                for value in values:
+                    for words in expand_phrase(value, phrases):
+                        self._add(words, tag)
+        # a bare date placeholder is tagged as itself
+        for value in phrases['dates'].get('DATE', []):
+            for words in expand_phrase(value, phrases):
+                self._add(words, words[0])
+        for tag, values in phrases['stats'].items():
+            for value in values:
+                for words in expand_phrase(value, phrases):
+                    self._add(words, tag)
+        # phrases of stats that are not in the training grammar yet
+        self._untrained = {}
+        for values in phrases.get('untrained_stats', {}).values():
+            for value in values:
+                for words in expand_phrase(value, phrases):
+                    node = self._untrained
+                    for word in words:
+                        node = node.setdefault(word, {})
+                    node[None] = True
+        for name in players.values():
+            self._add(tuple(name.split()), 'PLAYER')
+        for team_id, (_, names) in teams.items():
+            tag = 'OPP-{}'.format(team_id)
+            for value in phrases['opp']['OPP']:
+                for prefix in expand_phrase(value[:1], phrases):
+                    for name in names:
+                        self._add(prefix + tuple(name.split()), tag)
+
+        self._lock = threading.Lock()
+        self.shadow_rate = 0.0
+        self.query_count = 0
+        self.covered_count = 0
+        self.shadow_count = 0
+        self.agree_count = 0
+        self.disagreements = deque(maxlen=20)
+
+
+    @classmethod
+    def from_files(cls):
+        """ Creates a Gazetteer from phrases.json, players.pkl and teams.pkl
+            in tools/synthetic_data.
+        """
+        with open(data_utils.PHRASES_PATH, 'r') as f:
+            phrases = json.load(f)
+        target_tags = set(artifacts.id2target())
+        return cls(phrases, artifacts.players(), artifacts.teams(),
+                   target_tags)
+
+
+    def _add(self, words, tag):
+        """ Adds a phrase to the trie. A phrase reached by more than one tag
+            keeps all of them and is later treated as ambiguous.
+        """
+        if not words:
+            return
+        if self.target_tags is not None:
+            iob = ['B-' + tag] + ['I-' + tag]*(len(words)-1)
+            if not all(t in self.target_tags for t in iob):
+                return
+        node = self._trie
+        for word in words:
+            node = node.setdefault(word, {})
+        tags = node.setdefault(None, set())
+        if tag not in tags:
+            tags.add(tag)
+            self.phrase_count += 1
+
+
+    def _matches(self, words, start):
+        """ Yields the end index and tags of every phrase starting at start.
+        """
+        node = self._trie
+        for end in range(start, len(words)):
+            node = node.get(words[end])
+            if node is None:
+                return
+            if None in node:
+                yield end + 1, node[None]
+
+
+    def has_untrained_stat(self, words):
+        """ Returns:
+                True if the words contain a phrase of untrained_stats.
+        """
+        for start in range(len(words)):
+            node = self._untrained
+            for word in words[start:]:
+                node = node.get(word)
+                if node is None:
+                    break
+                if None in node:
+                    return True
+        return False
+
+
+    def segment(self, words):
+        """ Splits a sentence into known phrases.
+            Args:
+                words: A list of words.
+            Returns:
+                A list of (start, end, tags) segments if the sentence splits
+                into phrases in exactly one way, otherwise None.
+        """
+        s_len = len(words)
+        # ways[i] is the number of splits of words[i:], capped at 2
+        ways = [0] * s_len + [1]
+        nxt = [None] * s_len
+        for i in range(s_len-1, -1, -1):
+            for end, tags in self._matches(words, i):
+                if ways[end]:
+                    ways[i] = min(ways[i] + ways[end], 2)
+                    nxt[i] = (end, tags)
+        if ways[0] != 1:
+            return None
+        segments = []
+        i = 0
+        while i < s_len:
+            end, tags = nxt[i]
+            segments.append((i, end, tags))
+            i = end
+        return segments
+
+
+    def tag(self, words, raw_words=None):
+        """ Tags a sentence without running the model.
+            Args:
+                words: The vocabulary words of the sentence, as in
+                    Lexer.sentence_txt.
+                raw_words: The words of the sentence before words that are
+                    not in the vocabulary were dropped.
+            Returns:
+                A list with one IOB tag per word, or None when the sentence
+                cannot be tagged with confidence.
+        """
+        segments = None
+        if raw_words is None or not self.has_untrained_stat(raw_words):
+            segments = self.segment(words)
+        tags = None
+        if segments is not None:
+            seen = set()
+            tags = []
+            for start, end, phrase_tags in segments:
+                if len(phrase_tags) != 1:
+                    tags = None
+                    break
+                tag = next(iter(phrase_tags))
+                if tag in seen:
+                    tags = None
+                    break
+                seen.add(tag)
+                tags.extend(['B-' + tag] + ['I-' + tag]*(end-start-1))
+        with self._lock:
+            self.query_count += 1
+            if tags is not None:
+                self.covered_count += 1
+        return tags
+
+
+    def should_shadow(self):
+        """ Returns:
+                True if a tagged sentence should also be run through the
+                model to measure agreement, according to shadow_rate.
+        """
+        return self.shadow_rate > 0 and random.random() < self.shadow_rate
+
+
+    def record_shadow(self, words, tags, model_tags):
+        """ Records whether the model agreed with the tags of a sentence.
+            Args:
+                words: The vocabulary words of the sentence.
+                tags: The tags from the Gazetteer.
+                model_tags: The tags decoded by the model.
+        """
+        with self._lock:
+            self.shadow_count += 1
+            if list(tags) == list(model_tags):
+                self.agree_count += 1
+            else:
+                self.disagreements.append((list(words), tags, model_tags))
+
+
+    def stats(self):
+        """ Returns:
+                A dictionary with the number of sentences seen, how many were
+                tagged without the model and the fraction of shadowed
+                sentences where the model agreed.
+        """
+        with self._lock:
+            return {
+                'queries': self.query_count,
+                'covered': self.covered_count,
+                'coverage': (self.covered_count / self.query_count
+                             if self.query_count else 0.0),
+                'shadowed': self.shadow_count,
+                'agreement': (self.agree_count / self.shadow_count
+                              if self.shadow_count else 0.0)
+            }
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+# set to False to send every sentence to the model
+ENABLED = True
+
+
+def configure_gazetteer(enabled=True, shadow_rate=0.0):
+    """ Turns the fast path on or off and sets the fraction of tagged
+        sentences that are also decoded by the model to measure agreement.
+        Returns:
+            The process-wide Gazetteer, or None when it is disabled.
+    """
+    global ENABLED
+    ENABLED = enabled
+    gazetteer = get_gazetteer()
+    if gazetteer is not None:
+        gazetteer.shadow_rate = shadow_rate
+    return gazetteer
+
+
+def get_gazetteer():
+    """ Returns the process-wide Gazetteer, creating it on first use, or None
+        when the fast path is disabled.
+    """
+    global _gazetteer
+    if not ENABLED:
+        return None
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer.from_files()
+    return _gazetteer
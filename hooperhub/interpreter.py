@@ -1,9 +1,31 @@
 import os
-import pickle
+import uuid
 import datetime
+import functools
 import psycopg2 as psql
 
-from hooperhub.util import EntityTable, Calculator
+from collections import OrderedDict
+from hooperhub.util import EntityTable, rollups
+from hooperhub.util.calculator import (STATS, STAT_RECIPES, calculate_row,
+                                       calculate_rows)
+from hooperhub.util.columnar import (get_columnar_store, parse_column,
+                                     column_sql, row_text_types,
+                                     GAME_LIST_COLUMNS, game_list_query,
+                                     group_query, group_rows,
+                                     last_games_query, game_log_query,
+                                     game_values_from_rows, rolling_series)
+from hooperhub.util.connection_pool import get_pool
+from hooperhub.util.leaderboard import get_leaderboard
+from hooperhub.util.lookup_index import get_lookup_index
+from hooperhub.util.query_cache import get_query_cache
+
+
+# how a grouping dimension is shown among the condition entities
+GROUP_NAMES = {'season': "Season",
+               'month': "Month",
+               'opponent': "Opponent",
+               'home': "Home/Away",
+               'playoff_rd': "Playoff round"}
 
 
 class Interpreter(object):
@@ -12,6 +34,35 @@ class Interpreter(object):
         Calculator object to quantify the statistics that were queried.
     """
 
+    _base_query = """ 
+        SELECT ({cols}) FROM performance WHERE {conds};
+        """
+    # run_batch joins one typed VALUES row per EntityTable; unset
+    # conditions are NULL and match every game
+    _batch_row = ("(%s::integer, %s::integer, %s::boolean, "
+                  "%s::integer, %s::boolean, %s::boolean, "
+                  "%s::integer, %s::integer, %s::date, %s::date)")
+    _batch_query = """
+        SELECT f.idx, {cols}
+        FROM (VALUES {values}) AS f(idx, player_id, playoff, win, home,
+                                   started, team, opp, start_date,
+                                   end_date)
+        LEFT JOIN performance p ON
+            p.player_id=f.player_id AND
+            p.game_date>f.start_date AND p.game_date<f.end_date AND
+            (CASE WHEN f.playoff THEN p.playoff_rd>0
+                  ELSE p.playoff_rd=0 END) AND
+            (f.win IS NULL OR (f.win>0 AND p.win_margin>0) OR
+                              (f.win<0 AND p.win_margin<0)) AND
+            (f.home IS NULL OR p.home=f.home) AND
+            (f.started IS NULL OR p.started=f.started) AND
+            (f.team IS NULL OR p.team=f.team) AND
+            (f.opp IS NULL OR p.opp=f.opp)
+        GROUP BY f.idx
+        ORDER BY f.idx;
+        """
+
+
     def __init__(self,
                 entity_table,
                 stat_path,
@@ -23,56 +74,75 @@ class Interpreter(object):
             Args:
                 entity_table: an EntityTable object containing all queried
                     statistics and conditions of the query.
+                stat_path: the path of the old stat_recipes artifact. It is
+                    no longer read, since the recipes are compiled from
+                    STAT_DEFINITIONS.
                 PG_HOST: the PostgreSQL hostname of the DB.
                 PG_PORT: the PostgreSQL port number of the DB.
                 PG_DBNAME: the PostgreSQL dbname of the DB.
                 PG_USER: the PostgreSQL username of the DB.
         """
         self._entity_table = entity_table
-
-        # from settings.py
-        self.conn = psql.connect(host = PG_HOST,
-                                 port = PG_PORT,
-                                 dbname  = PG_DBNAME,
-                                 user = PG_USER)
+        self._player_id = None
+
+        # from settings.py; connections come from a process-wide pool
+        self._pool = get_pool((PG_HOST, PG_PORT, PG_DBNAME, PG_USER),
+                              functools.partial(psql.connect,
+                                                host = PG_HOST,
+                                                port = PG_PORT,
+                                                dbname  = PG_DBNAME,
+                                                user = PG_USER))
+        self.conn = self._pool.acquire()
         self.cursor = self.conn.cursor()
+        # player and team lookups are answered from memory
+        self._index = get_lookup_index()
 
         # stat_recipes maps stat entities with needed elements to calculate
         # it. e.g. PPG entity would match with [fg, fg3, and ft]
-        stat_recipes_path = stat_path
-        self.stat_recipes = pickle.load(open(stat_recipes_path, 'rb'))
-
-        self._base_query = """ 
-            SELECT ({cols}) FROM performance WHERE {conds};
-            """
+        self.stat_recipes = STAT_RECIPES
 
 
     def close_psql_connection(self):
-        """ Closes the PostgreSQL cursor and connection.
+        """ Closes the PostgreSQL cursor and returns the connection to the
+            pool.
         """
+        if self.conn is None:
+            return
         self.cursor.close()
-        self.conn.close()
+        self._pool.release(self.conn)
+        self.conn = None
 
 
     def _get_player_id(self, player_name):
-        """ Selects the player_id for a given player's name.
+        """ Looks up the player_id for a given player's name in the
+            LookupIndex, falling back to the player table.
             Args:
                 player_name: The name of the player in the EntityTable
             Returns:
                 The player id associated with given player name
         """
+        self._index.refresh_if_stale(self.cursor)
+        player_id = self._index.player_id(player_name)
+        if player_id is not None:
+            return player_id
+        # fall back to the table for players added since the last refresh
         select_p_id_query = """ SELECT player_id FROM player WHERE name=%s; """
         self.cursor.execute(select_p_id_query, (player_name,))
         return self.cursor.fetchone()[0]
 
 
     def _get_team_abbr(self, team_id):
-        """ Selects the team_abbr with the associated team_id
+        """ Looks up the team_abbr with the associated team_id in the
+            LookupIndex, falling back to the team table.
             Args:
                 team_id: The team id to be queried
             Returns:
                 The team's abbreviation with given team id
         """
+        self._index.refresh_if_stale(self.cursor)
+        team_abbr = self._index.team_abbr(team_id)
+        if team_abbr is not None:
+            return team_abbr
         select_team_abbr_query = """ SELECT abbr FROM team WHERE 
                                         team_id=%s; """
         self.cursor.execute(select_team_abbr_query, (team_id,))
@@ -97,29 +167,35 @@ class Interpreter(object):
         return columns
 
 
-    def _aggregate_conditions(self):
+    def _aggregate_conditions(self, entity_table=None):
         """ Function that forms the condition strings and collects all
             condition tokens for interpretation.
+            Args:
+                entity_table: The EntityTable to read the conditions from.
+                    Defaults to the Interpreter's own.
             Returns:
                 A dictionary of token names with their given values and a
                 string containing the end of the PostgreSQL query that will
                 be executed to retrieve the requested statistics.
 
         """
+        if entity_table is None:
+            entity_table = self._entity_table
         cond_tok = {}
         cond_str = ""
 
         # mandate that a player_name entity exists or raise exception
-        if not self._entity_table.player_name:
+        if not entity_table.player_name:
             raise KeyError
-        player_name = self._entity_table.player_name
+        player_name = entity_table.player_name
         cond_tok["Player"] = player_name
         player_id = self._get_player_id(player_name)
+        self._player_id = player_id
         cond_str += "player_id={plyr_id}".format(plyr_id = player_id)
 
         # playoff_rd condition
         playoff_str = " AND playoff_rd"
-        if self._entity_table.playoff_rd == 0:
+        if entity_table.playoff_rd == 0:
             playoff_str += "=0"
         else:
             cond_tok["Playoffs?"] = "Yes"
@@ -127,9 +203,9 @@ class Interpreter(object):
         cond_str += playoff_str
 
         # game_won condition
-        if self._entity_table.game_won != None:
+        if entity_table.game_won != None:
             game_won_str = " AND win_margin"
-            if self._entity_table.game_won:
+            if entity_table.game_won:
                 cond_tok["Win/Loss"] = "Win"
                 game_won_str += ">0"
             else:
@@ -138,9 +214,9 @@ class Interpreter(object):
             cond_str += game_won_str
 
         # home_game condition
-        if self._entity_table.home_game != None:
+        if entity_table.home_game != None:
             home_game_str = " AND home="
-            if self._entity_table.home_game:
+            if entity_table.home_game:
                 cond_tok["Home/Away"] = "Home"
                 home_game_str += "true"
             else:
@@ -149,9 +225,9 @@ class Interpreter(object):
             cond_str += home_game_str
 
         # started_game condition
-        if self._entity_table.started_game != None:
+        if entity_table.started_game != None:
             started_game_str = " AND started="
-            if self._entity_table.started_game:
+            if entity_table.started_game:
                 cond_tok["Started?"] = "Yes"
                 started_game_str += "true"
             else:
@@ -160,51 +236,87 @@ class Interpreter(object):
             cond_str += started_game_str
 
         # played_for condition
-        if self._entity_table.played_for:
-            team_id = self._entity_table.played_for
+        if entity_table.played_for:
+            team_id = entity_table.played_for
             team_abbr = self._get_team_abbr(team_id)
             cond_tok["Played for"] = team_abbr
             cond_str += " AND team={}".format(str(team_id))
 
         # played_against condition
-        if self._entity_table.played_against:
-            opp_team_id = self._entity_table.played_against
+        if entity_table.played_against:
+            opp_team_id = entity_table.played_against
             opp_team_abbr = self._get_team_abbr(opp_team_id)
             cond_tok["Played against"] = opp_team_abbr
             cond_str += " AND opp={}".format(str(opp_team_id))
 
         # date condition
-        if self._entity_table.start_date != datetime.date(1946,11,8):
-            cond_tok["After"] = str(self._entity_table.start_date)
-        if self._entity_table.end_date != datetime.date.today():
-            cond_tok["Before"] = str(self._entity_table.end_date)
+        if entity_table.start_date != datetime.date(1946,11,8):
+            cond_tok["After"] = str(entity_table.start_date)
+        if entity_table.end_date != datetime.date.today():
+            cond_tok["Before"] = str(entity_table.end_date)
         cond_str += " AND game_date>%s AND game_date<%s"
 
-        start_year = self._entity_table.start_date.year
-        end_year = self._entity_table.end_date.year
+        start_year = entity_table.start_date.year
+        end_year = entity_table.end_date.year
         if (end_year-start_year == 1 and
-            self._entity_table.start_date.month == 10 and
-            self._entity_table.start_date.day == 1 and
-            self._entity_table.end_date.month == 7 and
-            self._entity_table.end_date.day == 1):
+            entity_table.start_date.month == 10 and
+            entity_table.start_date.day == 1 and
+            entity_table.end_date.month == 7 and
+            entity_table.end_date.day == 1):
             if "After" in cond_tok:
                 del cond_tok["After"]
             if "Before" in cond_tok:
                 del cond_tok["Before"]
             cond_tok["Season"] = str(end_year)
 
+        if entity_table.group_by:
+            cond_tok["Grouped by"] = GROUP_NAMES[entity_table.group_by]
+        if entity_table.last_games:
+            cond_tok["Last games"] = str(entity_table.last_games)
+        if entity_table.rolling_window:
+            cond_tok["Rolling window"] = "{} games".format(
+                                         entity_table.rolling_window)
+
         return cond_tok, cond_str
 
-    def __call__(self):
-        """ The "main" function of the Interpreter.
-        Args:
-            entity_table: a EntityTable object that contains all of entities 
-                that were parsed by the Lexer.
-        Returns:
-            A dictionary containing all of the parsed entities and a dictionary
-            containing calculated results, all contained in a 2-tuple.
+
+    def _query_db(self, columns, conditions_str):
+        """ Selects the needed columns from the performance table.
+            Args:
+                columns: A list of the needed columns.
+                conditions_str: The condition string from
+                    _aggregate_conditions.
+            Returns:
+                A dictionary mapping each column to its queried value.
+        """
+        query = self._base_query.format(cols = ','.join(map(column_sql,
+                                                            columns)),
+                                        conds = conditions_str)
+        start_date = self._entity_table.start_date
+        end_date = self._entity_table.end_date
+        self.cursor.execute(query, (start_date, end_date))
+        return self._parse_row(columns, self.cursor.fetchone()[0])
+
+
+    def _parse_row(self, columns, res):
+        """ Reads the single value selected by _base_query, which is the raw
+            value for one column and the row as text for several.
+            Returns:
+                A dictionary mapping each column to its queried value.
         """
-        stat_entities = self._entity_table.get_stats()
+        if type(res) != str:
+            results = (res,)
+        else:
+            results = eval(res)
+        return dict(zip(columns, results))
+
+
+    def _get_stat_entities(self, entity_table):
+        """ Returns:
+                The stats queried in entity_table, or the default statistics
+                if it has none.
+        """
+        stat_entities = entity_table.get_stats()
 
         # add default statistics if none exist
         if stat_entities == []:
@@ -213,30 +325,555 @@ class Interpreter(object):
                                   'avg_reb',
                                   'avg_ast',
                                   'game_count'])
+        return stat_entities
 
-        # retrieve required columns for the query
-        columns = ','.join(self._get_needed_columns(stat_entities))
 
-        # create the condition string and a dictionary of all the conditions
-        condition_entitys, conditions_str = self._aggregate_conditions()
+    def _calculate(self, stat_entities, rudimentary_stats, strict=True):
+        """ Passes the query results into a Calculator.
+            Args:
+                stat_entities: The stats to calculate.
+                rudimentary_stats: The query results.
+                strict: A boolean that when false gives None for a stat that
+                    cannot be calculated, e.g. from a group of games where a
+                    column is NULL, instead of raising.
+            Returns:
+                A dictionary mapping each stat to its calculated value.
+        """
+        return calculate_row(stat_entities, rudimentary_stats, strict)
 
-        query = self._base_query.format(cols = columns, conds = conditions_str)
-        start_date = self._entity_table.start_date
-        end_date = self._entity_table.end_date
-        self.cursor.execute(query, (start_date, end_date))
-        res = self.cursor.fetchone()[0]
-        if type(res) != str:
-            results = (res,)
+
+    def _query_groups(self, entity_table, columns, conditions_str):
+        """ Selects the needed columns for every group of
+            entity_table.group_by in one grouped query.
+            Returns:
+                A list of (group, rudimentary_stats) pairs ordered by group.
+        """
+        query = group_query(columns, conditions_str, entity_table.group_by)
+        self.cursor.execute(query, (entity_table.start_date,
+                                    entity_table.end_date))
+        return group_rows(columns, self.cursor.fetchall())
+
+
+    def _group_label(self, group_by, group):
+        """ Returns:
+                The name of a group in a series, e.g. '2016' for a season or
+                'BOS' for an opponent.
+        """
+        if group is None:
+            return "Unknown"
+        if group_by == 'season':
+            return str(group)
+        if group_by == 'month':
+            return group.strftime('%Y-%m')
+        if group_by == 'opponent':
+            return self._get_team_abbr(group) or str(group)
+        if group_by == 'home':
+            return "Home" if group else "Away"
+        return "Round {}".format(group) if group else "Regular season"
+
+
+    def _series(self, group_by, stat_entities, groups):
+        """ Calculates the stats of every group in one vectorized pass.
+            Returns:
+                An OrderedDict mapping each group label to its calculated
+                results, in group order.
+        """
+        calculated = calculate_rows(stat_entities,
+                                    [stats for _, stats in groups],
+                                    strict=False)
+        series = OrderedDict()
+        for (group, _), result_entitys in zip(groups, calculated):
+            series[self._group_label(group_by, group)] = result_entitys
+        return series
+
+
+    def _interpret_groups(self, entity_table, stat_entities, columns,
+                          conditions_str):
+        """ Breaks a query down by entity_table.group_by, from the columnar
+            store when one is loaded and otherwise in one grouped query.
+            Returns:
+                The series of calculated results from _series.
+        """
+        store = get_columnar_store()
+        if store is not None:
+            groups = store.query_groups(self._player_id, entity_table,
+                                        columns, entity_table.group_by)
         else:
-            results = eval(res)
-        # pass all of the query results into a Calculator
-        result_entitys = {}
-        rudimentary_stats = dict(zip(columns.split(','), results))
-        calc = Calculator(rudimentary_stats)
+            groups = self._query_groups(entity_table, columns, conditions_str)
+        return self._series(entity_table.group_by, stat_entities, groups)
+
+
+    def _interpret_last(self, entity_table, stat_entities, columns,
+                        conditions_str):
+        """ Aggregates only the last entity_table.last_games matching games,
+            reading them backwards from the latest one.
+            Returns:
+                A dictionary mapping each stat to its calculated value.
+        """
+        store = get_columnar_store()
+        if store is not None:
+            rudimentary_stats = store.query_last(self._player_id,
+                                                 entity_table,
+                                                 columns,
+                                                 entity_table.last_games)
+        else:
+            query = last_games_query(columns, conditions_str,
+                                     entity_table.last_games)
+            self.cursor.execute(query, (entity_table.start_date,
+                                        entity_table.end_date))
+            rudimentary_stats = self._parse_row(columns,
+                                                self.cursor.fetchone()[0])
+        return self._calculate(stat_entities, rudimentary_stats)
+
+
+    def _interpret_rolling(self, entity_table, stat_entities, columns,
+                           conditions_str):
+        """ Computes the stats over every window of
+            entity_table.rolling_window consecutive matching games from one
+            scan of the player's games.
+            Returns:
+                An OrderedDict mapping the date of the last game of each
+                window to its calculated results, in date order.
+        """
+        store = get_columnar_store()
+        if store is not None:
+            dates, values = store.game_values(self._player_id, entity_table,
+                                              columns)
+        else:
+            self.cursor.execute(game_log_query(columns, conditions_str),
+                                (entity_table.start_date,
+                                 entity_table.end_date))
+            dates, values = game_values_from_rows(columns,
+                                                  self.cursor.fetchall())
+        return self._rolling_results(entity_table, stat_entities, columns,
+                                     dates, values)
+
+
+    def _rolling_results(self, entity_table, stat_entities, columns, dates,
+                         values):
+        """ Calculates the stats of every rolling window of the games in one
+            vectorized pass.
+            Returns:
+                An OrderedDict mapping the date of the last game of each
+                window to its calculated results, in date order.
+        """
+        windows = rolling_series(dates, values, columns,
+                                 entity_table.rolling_window)
+        calculated = calculate_rows(stat_entities,
+                                    [stats for _, stats in windows],
+                                    strict=False)
+        series = OrderedDict()
+        for (date, _), result_entitys in zip(windows, calculated):
+            series[str(date)] = result_entitys
+        return series
+
+
+    def _interpret_special(self, entity_table, stat_entities, columns,
+                           conditions_str):
+        """ Interprets a rolling window, a breakdown or a last games query,
+            which take precedence in that order.
+            Returns:
+                The calculated results, or None for a plain query.
+        """
+        if entity_table.rolling_window:
+            return self._interpret_rolling(entity_table, stat_entities,
+                                           columns, conditions_str)
+        if entity_table.group_by:
+            return self._interpret_groups(entity_table, stat_entities,
+                                          columns, conditions_str)
+        if entity_table.last_games:
+            return self._interpret_last(entity_table, stat_entities,
+                                        columns, conditions_str)
+        return None
+
+
+    def _leader_conditions(self, entity_table):
+        """ Reads the conditions of a leaderboard query, which can only
+            filter by season, playoffs and home or away games.
+            Returns:
+                A dictionary of token names with their given values and the
+                keyword filters of LeaderboardIndex.ranking().
+        """
+        if (entity_table.game_won is not None or
+            entity_table.started_game is not None or
+            entity_table.played_for or entity_table.played_against):
+            raise ValueError("Leaderboards only filter by season, playoffs "
+                             "and home or away games")
+        cond_tok = {"Leaders": str(entity_table.leaders)}
+        filters = {'playoff': entity_table.playoff_rd != 0,
+                   'home': entity_table.home_game,
+                   'min_games': entity_table.min_games or 1}
+
+        start_date, end_date = entity_table.start_date, entity_table.end_date
+        if (end_date.year-start_date.year == 1 and
+            (start_date.month, start_date.day) == (10, 1) and
+            (end_date.month, end_date.day) == (7, 1)):
+            cond_tok["Season"] = str(end_date.year)
+            filters['season'] = start_date.year
+        elif (start_date != datetime.date(1946,11,8) or
+              end_date != datetime.date.today()):
+            raise ValueError("Leaderboards are for a season or careers")
+        else:
+            filters['season'] = None
+
+        if filters['playoff']:
+            cond_tok["Playoffs?"] = "Yes"
+        if entity_table.home_game is not None:
+            cond_tok["Home/Away"] = "Home" if entity_table.home_game \
+                                    else "Away"
+        if entity_table.min_games:
+            cond_tok["Minimum games"] = str(entity_table.min_games)
+        return cond_tok, filters
+
+
+    def _rank_leaders(self, entity_table, stat_entities, filters):
+        """ Reads the top entity_table.leaders players in each stat from
+            the LeaderboardIndex.
+            Returns:
+                An OrderedDict mapping each stat label to an OrderedDict of
+                the leaders' names and formatted values, best first.
+        """
+        leaderboard = get_leaderboard()
+        result_entitys = OrderedDict()
         for stat in stat_entities:
-            result_pair = calc.calculate(stat)
-            result_entitys.update([result_pair])
+            definition = STATS[stat]
+            leaders = OrderedDict()
+            for player_id, value in leaderboard.top(stat,
+                                                    entity_table.leaders,
+                                                    **filters):
+                name = self._index.player_name(player_id) or str(player_id)
+                leaders[name] = definition.formatter(value)
+            result_entitys[definition.label] = leaders
+        return result_entitys
+
+
+    def _interpret_leaders(self, entity_table, stat_entities):
+        """ Ranks the league in each stat from the LeaderboardIndex, which
+            is reloaded from performance_rollup when it is stale.
+            Returns:
+                The condition tokens and the leaders from _rank_leaders.
+        """
+        condition_entitys, filters = self._leader_conditions(entity_table)
+        get_leaderboard().refresh_if_stale(self.cursor)
+        self._index.refresh_if_stale(self.cursor)
+        return condition_entitys, self._rank_leaders(entity_table,
+                                                     stat_entities, filters)
+
+
+    def _game_entry(self, row):
+        """ Turns a row of GAME_LIST_COLUMNS into a game log entry, with
+            the date as text and the teams as abbreviations.
+        """
+        entry = OrderedDict(zip(GAME_LIST_COLUMNS, row))
+        entry['game_date'] = str(entry['game_date'])
+        for col in ('team', 'opp'):
+            if entry[col] is not None:
+                entry[col] = self._get_team_abbr(entry[col]) or entry[col]
+        return entry
+
+
+    def _game_key(self, after):
+        """ Returns:
+                A (game_date, player_id) key given as a pair of a date or
+                its text and an id.
+        """
+        game_date, player_id = after
+        if isinstance(game_date, str):
+            game_date = datetime.datetime.strptime(game_date,
+                                                   '%Y-%m-%d').date()
+        return game_date, int(player_id)
+
+
+    def game_log(self, after=None, limit=None, page_size=500):
+        """ Lists the games behind the EntityTable's aggregate in
+            (game_date, player_id) order, streaming them from a named
+            server-side cursor page_size rows at a time, so that a career
+            long log is never held in memory. The key of the last game of
+            one page is where the next page starts. The connection stays
+            in use until the generator is exhausted or closed.
+            Args:
+                after: The (game_date, player_id) of the last game already
+                    listed, or None to start from the first game.
+                limit: The maximum number of games, or None for all.
+                page_size: The number of rows fetched per round trip.
+            Yields:
+                An OrderedDict of the columns of each game and its points.
+        """
+        entity_table = self._entity_table
+        condition_entitys, conditions_str = self._aggregate_conditions()
+        if after is not None:
+            after = self._game_key(after)
+
+        store = get_columnar_store()
+        if store is not None:
+            for row in store.game_list(self._player_id, entity_table, after,
+                                       limit, entity_table.min_points):
+                yield self._game_entry(row)
+            return
+
+        query = game_list_query(conditions_str, after is not None, limit,
+                                entity_table.min_points)
+        params = [entity_table.start_date, entity_table.end_date]
+        if after is not None:
+            params.extend(after)
+        cursor = self.conn.cursor(name='game_log_{}'.format(uuid.uuid4().hex))
+        cursor.itersize = page_size
+        try:
+            cursor.execute(query, params)
+            for row in cursor:
+                yield self._game_entry(row)
+        finally:
+            cursor.close()
+
+
+    def _game_log_conditions(self):
+        """ Returns:
+                The condition tokens of a game log query.
+        """
+        condition_entitys, _ = self._aggregate_conditions()
+        condition_entitys["Game log"] = "Yes"
+        if self._entity_table.min_points is not None:
+            condition_entitys["Minimum points"] = str(
+                self._entity_table.min_points)
+        return condition_entitys
 
+
+    def __call__(self):
+        """ The "main" function of the Interpreter.
+        Args:
+            entity_table: a EntityTable object that contains all of entities 
+                that were parsed by the Lexer.
+        Returns:
+            A dictionary containing all of the parsed entities and a dictionary
+            containing calculated results, all contained in a 2-tuple. When
+            the EntityTable has a group_by or rolling_window, the results are
+            an OrderedDict mapping each group or window to its dictionary of
+            calculated results. When it asks for leaders, they map each stat
+            to the leading players and their values. When it asks for a game
+            log, the results are the game_log() generator, which is not
+            cached.
+        """
+        if self._entity_table.game_log:
+            return self._game_log_conditions(), self.game_log()
+
+        # repeated queries are answered from the process-wide QueryCache
+        cache = get_query_cache()
+        cache_key = self._entity_table.key()
+        cached = cache.get_result(cache_key)
+        if cached is not None:
+            return cached
+
+        stat_entities = self._get_stat_entities(self._entity_table)
+
+        # league leaders are ranked in memory and need no player
+        if self._entity_table.leaders:
+            result = self._interpret_leaders(self._entity_table,
+                                             stat_entities)
+            cache.put_result(cache_key, result)
+            return result
+
+        # retrieve required columns for the query
+        columns = list(self._get_needed_columns(stat_entities))
+
+        # create the condition string and a dictionary of all the conditions
+        condition_entitys, conditions_str = self._aggregate_conditions()
+
+        # breakdowns and game windows are computed in a single pass
+        result_entitys = self._interpret_special(self._entity_table,
+                                                 stat_entities,
+                                                 columns,
+                                                 conditions_str)
+        if result_entitys is not None:
+            cache.put_result(cache_key, (condition_entitys, result_entitys))
+            return condition_entitys, result_entitys
+
+        # answer from the in-process columnar store when one is loaded
+        store = get_columnar_store()
+        rudimentary_stats = None
+        if store is not None:
+            rudimentary_stats = store.query(self._player_id,
+                                            self._entity_table,
+                                            columns)
+        # otherwise add up the player's split rollups when the date range
+        # falls on their boundaries, e.g. season and career queries
+        elif rollups.ENABLED:
+            rudimentary_stats = rollups.query_rollups(self.cursor,
+                                                      self._player_id,
+                                                      self._entity_table,
+                                                      columns)
+        if rudimentary_stats is None:
+            rudimentary_stats = self._query_db(columns, conditions_str)
+
+        result_entitys = self._calculate(stat_entities, rudimentary_stats)
+
+        cache.put_result(cache_key, (condition_entitys, result_entitys))
         return condition_entitys, result_entitys
 
 
+    def _batch_filter(self, entity_table):
+        """ Returns:
+                The row of the batch filter list for entity_table, holding
+                None for the conditions it leaves unset.
+        """
+        win = None
+        if entity_table.game_won is not None:
+            win = 1 if entity_table.game_won else -1
+        return (self._player_id,
+                entity_table.playoff_rd != 0,
+                win,
+                entity_table.home_game,
+                entity_table.started_game,
+                entity_table.played_for or None,
+                entity_table.played_against or None,
+                entity_table.start_date,
+                entity_table.end_date)
+
+
+    def _query_db_batch(self, columns, filters):
+        """ Selects the needed columns for many condition sets in one query.
+            The condition sets are joined to the performance table as a
+            VALUES list, and a LEFT JOIN keeps sets that match no games.
+            Args:
+                columns: A list of the needed columns.
+                filters: A list of rows from _batch_filter.
+            Returns:
+                A list with a dictionary mapping each column to its queried
+                value for every row of filters, in order.
+        """
+        selects = []
+        for column in columns:
+            if parse_column(column)[0] == 'count':
+                # count(*) would count the NULL row of an unmatched filter
+                selects.append("count(p.player_id)")
+            else:
+                selects.append(column_sql(column, 'p.'))
+        values = ', '.join([self._batch_row] * len(filters))
+        query = self._batch_query.format(cols = ', '.join(selects),
+                                         values = values)
+        params = []
+        for i, row in enumerate(filters):
+            params.extend((i,) + row)
+        self.cursor.execute(query, params)
+        results = [None] * len(filters)
+        for row in self.cursor.fetchall():
+            results[row[0]] = dict(zip(columns, row[1:]))
+        return results
+
+
+    def run_batch(self, entity_tables):
+        """ Interprets many EntityTables, e.g. for a comparison page, sending
+            every plain query that is not cached or answered in process to
+            the DB as a single statement.
+            Args:
+                entity_tables: A list of EntityTable objects.
+            Returns:
+                A list with, for each EntityTable in order, the 2-tuple that
+                calling an Interpreter on it returns, or the exception raised
+                while interpreting it. One bad item does not fail the others.
+        """
+        cache = get_query_cache()
+        store = get_columnar_store()
+        results = [None] * len(entity_tables)
+        # (index, cache key, stat entities, columns, condition tokens) per
+        # item left for the DB, and the filter row for each of them
+        pending = []
+        filters = []
+        # (index, cache key, stat entities, condition tokens, query results)
+        # per item whose stats are left to calculate
+        queried = []
+        for i, entity_table in enumerate(entity_tables):
+            try:
+                cache_key = entity_table.key()
+                cached = cache.get_result(cache_key)
+                if cached is not None:
+                    results[i] = cached
+                    continue
+                if entity_table.game_log:
+                    raise ValueError("Game logs are streamed with game_log()")
+                stat_entities = self._get_stat_entities(entity_table)
+                if entity_table.leaders:
+                    results[i] = self._interpret_leaders(entity_table,
+                                                         stat_entities)
+                    cache.put_result(cache_key, results[i])
+                    continue
+                columns = list(self._get_needed_columns(stat_entities))
+                condition_entitys, conditions_str = \
+                    self._aggregate_conditions(entity_table)
+                result_entitys = self._interpret_special(entity_table,
+                                                         stat_entities,
+                                                         columns,
+                                                         conditions_str)
+                if result_entitys is not None:
+                    results[i] = (condition_entitys, result_entitys)
+                    cache.put_result(cache_key, results[i])
+                    continue
+                if store is not None:
+                    rudimentary_stats = store.query(self._player_id,
+                                                    entity_table,
+                                                    columns)
+                    queried.append((i, cache_key, stat_entities,
+                                    condition_entitys, rudimentary_stats))
+                    continue
+                pending.append((i, cache_key, stat_entities, columns,
+                                condition_entitys))
+                filters.append(self._batch_filter(entity_table))
+            except Exception as e:
+                results[i] = e
+
+        rows = []
+        if pending:
+            columns = sorted(set(c for item in pending for c in item[3]))
+            try:
+                rows = self._query_db_batch(columns, filters)
+            except Exception as e:
+                self.conn.rollback()
+                for item in pending:
+                    results[item[0]] = e
+        for (i, cache_key, stat_entities, item_columns, condition_entitys), \
+                row in zip(pending, rows):
+            rudimentary_stats = {c: row[c] for c in item_columns}
+            # a single queried column keeps its SQL type, but several are
+            # parsed from the row text
+            if len(item_columns) > 1:
+                rudimentary_stats = row_text_types(rudimentary_stats)
+            queried.append((i, cache_key, stat_entities, condition_entitys,
+                            rudimentary_stats))
+
+        self._calculate_batch(queried, results, cache)
+        return results
+
+
+    def _calculate_batch(self, queried, results, cache):
+        """ Calculates the stats of the batch items in one vectorized pass
+            per set of stats, and caches them.
+            Args:
+                queried: (index, cache key, stat entities, condition tokens,
+                    query results) tuples.
+                results: The list of batch results to fill in.
+                cache: The QueryCache.
+        """
+        by_stats = OrderedDict()
+        for item in queried:
+            by_stats.setdefault(tuple(item[2]), []).append(item)
+        for stat_entities, items in by_stats.items():
+            try:
+                calculated = calculate_rows(stat_entities,
+                                            [item[4] for item in items])
+            except Exception:
+                # one bad item does not fail the others
+                calculated = []
+                for item in items:
+                    try:
+                        calculated.append(calculate_row(stat_entities,
+                                                        item[4]))
+                    except Exception as e:
+                        calculated.append(e)
+            for (i, cache_key, _, condition_entitys, _), result_entitys in \
+                    zip(items, calculated):
+                if isinstance(result_entitys, Exception):
+                    results[i] = result_entitys
+                    continue
+                results[i] = (condition_entitys, result_entitys)
+                # the key from before _get_stat_entities filled in default
+                # stats, which is the one the next lookup uses
+                cache.put_result(cache_key, results[i])
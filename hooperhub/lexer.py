@@ -1,23 +1,337 @@
-import os
-import re
-import pickle
+import json
 import datetime
 
-import tensorflow as tf
-
-from dateutil import parser
 from collections import defaultdict
 from datetime import datetime, timedelta
 
-from hooperhub.seq2seq_model import Seq2SeqModel
-from hooperhub.util import EntityTable, data_utils
+from hooperhub.batcher import get_batcher
+from hooperhub.gazetteer import get_gazetteer
+from hooperhub.util import EntityTable, artifacts, data_utils
+from hooperhub.util.date_extractor import extract_dates
+from hooperhub.util.query_cache import get_query_cache
+
+
+def _group_by_phrases():
+    """ Returns:
+            A dictionary mapping each phrase that asks for a breakdown, as a
+            tuple of words, to the EntityTable.group_by it sets.
+    """
+    phrases = {}
+    for word, group_by in [('season', 'season'), ('year', 'season'),
+                           ('month', 'month'), ('opponent', 'opponent'),
+                           ('team', 'opponent'), ('round', 'playoff_rd')]:
+        for prefix in ('by', 'per', 'each', 'every'):
+            phrases[(prefix, word)] = group_by
+        phrases[(word, 'by', word)] = group_by
+    for versus in ('vs', 'versus', 'against'):
+        for each in ('each', 'every'):
+            for word in ('opponent', 'team'):
+                phrases[(versus, each, word)] = 'opponent'
+    # 'by team' would read as the team played for
+    del phrases[('by', 'team')]
+    phrases[('monthly',)] = 'month'
+    for joiner in ('and', 'vs', 'versus', 'or'):
+        phrases[('home', joiner, 'away')] = 'home'
+    phrases[('home/away',)] = 'home'
+    return phrases
+
+
+GROUP_BY_PHRASES = _group_by_phrases()
+MAX_GROUP_BY_PHRASE = max(len(p) for p in GROUP_BY_PHRASES)
+
+
+def extract_group_by(words):
+    """ Finds a phrase such as "by season" or "home and away" that asks for
+        a breakdown and removes it, so the tagger does not read it as a
+        condition.
+        Args:
+            words: The words of the sentence.
+        Returns:
+            The remaining words and the group_by of the last phrase found, or
+            None.
+    """
+    remaining = []
+    group_by = None
+    i = 0
+    while i < len(words):
+        for n in range(min(MAX_GROUP_BY_PHRASE, len(words)-i), 0, -1):
+            phrase = tuple(words[i:i+n])
+            if phrase in GROUP_BY_PHRASES:
+                group_by = GROUP_BY_PHRASES[phrase]
+                i += n
+                break
+        else:
+            remaining.append(words[i])
+            i += 1
+    return remaining, group_by
+
+
+NUMBER_WORDS = {'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+                'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11,
+                'twelve': 12, 'fifteen': 15, 'twenty': 20, 'thirty': 30,
+                'fifty': 50}
+LAST_WORDS = {'last', 'past', 'previous', 'recent'}
+GAME_WORDS = {'game', 'games'}
+ROLLING_WORDS = {'average', 'avg', 'window'}
+
+
+def _number(word):
+    """ Returns:
+            The positive integer a word spells, or None.
+    """
+    if word.isdigit() and int(word) > 0:
+        return int(word)
+    return NUMBER_WORDS.get(word)
+
+
+def extract_window(words):
+    """ Finds a phrase that limits the query to the last n games, such as
+        "last 10 games", or asks for a rolling window, such as "rolling
+        5-game" or "5 game rolling average", and removes it.
+        Args:
+            words: The words of the sentence.
+        Returns:
+            The remaining words, the number of last games or None, and the
+            rolling window size or None.
+    """
+    # split "5-game" into "5 game"
+    split = []
+    for w in words:
+        head, _, tail = w.partition('-')
+        if tail in GAME_WORDS and _number(head):
+            split.extend([head, tail])
+        else:
+            split.append(w)
+    words = split
+
+    remaining = []
+    last_games, rolling_window = None, None
+    i = 0
+    while i < len(words):
+        window = words[i:i+4]
+        # last 10 games
+        if (len(window) >= 3 and window[0] in LAST_WORDS and
+            _number(window[1]) and window[2] in GAME_WORDS):
+            last_games = _number(window[1])
+            i += 3
+        # rolling 5 game (average)
+        elif (len(window) >= 3 and window[0] == 'rolling' and
+              _number(window[1]) and window[2] in GAME_WORDS):
+            rolling_window = _number(window[1])
+            i += 3
+            if i < len(words) and words[i] in ROLLING_WORDS:
+                i += 1
+        # 5 game rolling (average)
+        elif (len(window) >= 3 and _number(window[0]) and
+              window[1] in GAME_WORDS and window[2] == 'rolling'):
+            rolling_window = _number(window[0])
+            i += 3
+            if i < len(words) and words[i] in ROLLING_WORDS:
+                i += 1
+        else:
+            remaining.append(words[i])
+            i += 1
+    return remaining, last_games, rolling_window
+
+
+LEADER_PHRASES = {('led', 'the', 'league', 'in'): 1,
+                  ('lead', 'the', 'league', 'in'): 1,
+                  ('leads', 'the', 'league', 'in'): 1,
+                  ('league', 'leader', 'in'): 1,
+                  ('league', 'leaders', 'in'): 10,
+                  ('leaders', 'in'): 10}
+TOP_WORDS = {'top'}
+# "best 3" only counts leaders when "in" follows, as in "best 3 in assists",
+# since "the best 3 point shooter" names a stat
+BEST_WORDS = {'best'}
+MINIMUM_WORDS = {'min', 'minimum'}
+
+
+def _stat_number_pairs():
+    """ Returns:
+            The (number, word) pairs that start a stat phrase of
+            phrases.json, such as ('3', 'point') or ('10', 'assist'). A
+            number followed by its word is part of a stat, not a count.
+    """
+    with open(data_utils.PHRASES_PATH, 'r') as f:
+        phrases = json.load(f)
+
+    def alternatives(part):
+        parts = part if isinstance(part, list) else [part]
+        words = []
+        for p in parts:
+            if p.startswith('<') and p.endswith('>'):
+                words.extend(alternatives(phrases[p[1:-1]]))
+            else:
+                words.append(p)
+        return words
+
+    pairs = set()
+    for group in ('stats', 'untrained_stats'):
+        for stat_phrases in phrases[group].values():
+            for phrase in stat_phrases:
+                parts = [alternatives(part) for part in phrase]
+                # "3 point" within one alternative
+                for words in (w.split() for part in parts for w in part):
+                    if len(words) > 1 and _number(words[0]):
+                        pairs.add((words[0], words[1]))
+                # ["three", "3"], ["pointer", "pointers"]
+                for first, second in zip(parts, parts[1:]):
+                    for a in first:
+                        if _number(a.split()[-1]):
+                            pairs.update((a.split()[-1], b.split()[0])
+                                         for b in second)
+    return pairs
+
+
+STAT_NUMBER_PAIRS = _stat_number_pairs()
+
+
+def extract_leaders(words):
+    """ Finds a phrase that asks for the league leaders in a stat, such as
+        "top 5 in" or "led the league in", and a qualifier such as "minimum
+        20 games" or "at least 20 games", and removes them.
+        Args:
+            words: The words of the sentence.
+        Returns:
+            The remaining words, the number of leaders or None, and the
+            minimum number of games or None.
+    """
+    remaining = []
+    leaders, min_games = None, None
+    i = 0
+    while i < len(words):
+        window = words[i:i+4]
+        for n in (4, 3, 2):
+            if tuple(window[:n]) in LEADER_PHRASES:
+                leaders = LEADER_PHRASES[tuple(window[:n])]
+                i += n
+                break
+        else:
+            # top 5, but not "top 3 point percentage"
+            if (len(window) >= 2 and window[0] in TOP_WORDS and
+                _number(window[1]) and
+                tuple(window[1:3]) not in STAT_NUMBER_PAIRS):
+                leaders = _number(window[1])
+                i += 2
+            # best 5 in
+            elif (len(window) >= 3 and window[0] in BEST_WORDS and
+                  _number(window[1]) and window[2] == 'in'):
+                leaders = _number(window[1])
+                i += 2
+            # minimum 20 games
+            elif (len(window) >= 3 and window[0] in MINIMUM_WORDS and
+                  _number(window[1]) and window[2] in GAME_WORDS):
+                min_games = _number(window[1])
+                i += 3
+            # at least 20 games
+            elif (len(window) >= 4 and window[:2] == ['at', 'least'] and
+                  _number(window[2]) and window[3] in GAME_WORDS):
+                min_games = _number(window[2])
+                i += 4
+            else:
+                remaining.append(words[i])
+                i += 1
+    return remaining, leaders, min_games
+
+
+GAME_LOG_PHRASES = {('game', 'log'), ('gamelog',), ('game', 'logs'),
+                    ('list', 'games'), ('list', 'of', 'games')}
+# these also fit average questions such as "points per game in all games",
+# so they only ask for a game log in a sentence without RATE_WORDS
+EACH_GAME_PHRASES = {('every', 'game'), ('each', 'game'), ('all', 'games')}
+RATE_WORDS = {'per', 'ppg', 'avg', 'average', 'averaged', 'averages',
+              'averaging'}
+SCORED_WORDS = {'scored', 'scoring', 'score', 'scores'}
+# these only ask for points when a points word follows the number, since
+# "had 15 rebounds" is not a points floor
+HAD_WORDS = {'had', 'dropped'}
+POINT_WORDS = {'pt', 'pts', 'point', 'points'}
+
+
+def _rate_follows(words):
+    """ Returns:
+            Whether words start with a rate such as "per game", "a game" or
+            "ppg", which makes a preceding number an average.
+    """
+    return bool(words) and (words[0] in RATE_WORDS or
+                            words[:2] in (['a', 'game'], ['a', 'night']))
+
+
+def _points_floor(words):
+    """ Returns:
+            The number of points and the number of words of a phrase such
+            as "scored 40", "had 40 points", "40+ points" or "40 or more
+            points" at the start of words, or (None, 0). A number followed
+            by a rate, as in "scored 30 points per game", is not a floor.
+    """
+    points, n = _points_phrase(words)
+    if points is None or _rate_follows(words[n:]):
+        return None, 0
+    return points, n
+
+
+def _points_phrase(words):
+    window = words[:4]
+    # scored 40 (points)
+    if len(window) >= 2 and window[0] in SCORED_WORDS and _number(window[1]):
+        n = 3 if len(window) >= 3 and window[2] in POINT_WORDS else 2
+        return _number(window[1]), n
+    # had 40 points
+    if (len(window) >= 3 and window[0] in HAD_WORDS and
+        _number(window[1]) and window[2] in POINT_WORDS):
+        return _number(window[1]), 3
+    # 40+ points
+    if (len(window) >= 2 and window[0].endswith('+') and
+        _number(window[0][:-1]) and window[1] in POINT_WORDS):
+        return _number(window[0][:-1]), 2
+    # 40 or more points
+    if (len(window) >= 4 and _number(window[0]) and
+        window[1:3] == ['or', 'more'] and window[3] in POINT_WORDS):
+        return _number(window[0]), 4
+    return None, 0
+
+
+def extract_game_log(words):
+    """ Finds a phrase that asks for the games themselves, such as "game
+        log" or "every game", and a points floor such as "scored 40", which
+        also asks for the games, and removes them. "every game" is left alone
+        in a sentence that asks for an average.
+        Args:
+            words: The words of the sentence.
+        Returns:
+            The remaining words, whether a game log was asked for and the
+            minimum number of points or None.
+    """
+    remaining = []
+    game_log, min_points = False, None
+    log_phrases = GAME_LOG_PHRASES
+    if not RATE_WORDS.intersection(words):
+        log_phrases = GAME_LOG_PHRASES | EACH_GAME_PHRASES
+    i = 0
+    while i < len(words):
+        for n in (3, 2, 1):
+            if tuple(words[i:i+n]) in log_phrases:
+                game_log = True
+                i += n
+                break
+        else:
+            points, n = _points_floor(words[i:])
+            if points is not None:
+                game_log, min_points = True, points
+                i += n
+            else:
+                remaining.append(words[i])
+                i += 1
+    return remaining, game_log, min_points
 
 
 class Lexer(object):
-    """ Responsible for creating Seq2SeqModel and running it to retrieve
-        the decoded output, which is an array of entity tags that match
-        with the given query. This also creates a EntityTable object by
-        parsing through the entity tags and mapping them to the sentence.
+    """ Responsible for running the Seq2SeqModel (through the shared
+        InferenceEngine) to retrieve the decoded output, which is an array of
+        entity tags that match with the given query. This also creates a
+        EntityTable object by parsing through the entity tags and mapping
+        them to the sentence.
     """
 
     def __init__(self, raw_sentence):
@@ -28,11 +342,16 @@ class Lexer(object):
         """
         self.dates = {"DATE-A": None, "DATE-B": None}
         self.computed_dates = []
-        vocab_path = data_utils.VOCAB_SET_PATH
-        self.vocab = pickle.load(open(vocab_path, 'rb'))
-        self.date_parser = parser.parse
+        self.group_by = None
+        self.last_games = None
+        self.rolling_window = None
+        self.leaders = None
+        self.min_games = None
+        self.game_log = False
+        self.min_points = None
+        self.vocab = artifacts.vocab_set()
         self.sentence_txt, self.sentence = self._prepare_sentence(raw_sentence.lower())
-        self.id2target = pickle.load(open(data_utils.ID2TARGET_PATH, 'rb'))
+        self.id2target = artifacts.id2target()
 
 
     def _prepare_sentence(self, raw_sentence):
@@ -51,64 +370,17 @@ class Lexer(object):
         unecessary_punctuation = {'?', '.', ',', '!', '\'s'}
         for p in unecessary_punctuation:
             raw_sentence = raw_sentence.replace(p, ' ')
-        words = raw_sentence.split()
-        s_len = len(words)
-
-        # iterate through 1-grams in words looking for mm/dd, mm/dd/yy, and·
-        # mm/dd/yyyy patterns
-        date_pattern = '^(0?[0-9]|1[0-2])/(0?[0-9]|1[0-9]|2[0-9]|3[0-1])(/(\d\d|\d\d\d\d))?$'
-        for i in range(s_len):
-            if re.match(date_pattern, words[i]):
-                if not self.dates["DATE-A"]:
-                    self.dates["DATE-A"] = self.date_parser(words[i]).date()
-                    words[i] = "DATE-A"
-                else:
-                    self.dates["DATE-B"] = self.date_parser(words[i]).date()
-                    words[i] = "DATE-B"
-
-        # iterate through 3-grams in words looking for <MONTH> <DAY> <YEAR>
-        # or <DAY> <MONTH> <YEAR> patterns
-        for i in range(s_len-2):
-            three_gram = ' '.join(words[s_len-i-3:s_len-i])
-            try:
-                date = self.date_parser(three_gram)
-                if not self.dates["DATE-A"]:
-                    self.dates["DATE-A"] = date.date()
-                    words[s_len-i-3:s_len-i] = ["DATE-A"]*3
-                else:
-                    self.dates["DATE-B"] = date.date()
-                    words[s_len-i-3:s_len-i] = ["DATE-B"]*3
-            except:
-                pass
-
-        # iterate through 2-grams in words looking for <MONTH> <DAY> patterns
-        for i in range(s_len-1):
-            two_gram = ' '.join(words[s_len-i-2:s_len-i])
-            try:
-                date = self.date_parser(two_gram)
-                if not self.dates["DATE-A"]:
-                    self.dates["DATE-A"] = date.date()
-                    words[s_len-i-2:s_len-i] = ["DATE-A"]*2
-                else:
-                    self.dates["DATE-B"] = date.date()
-                    words[s_len-i-2:s_len-i] = ["DATE-B"]*2
-            except:
-                pass
-
-        # iterate through words looking for YYYY, YY-YY, and YYYY-YY patterns
-        # and recording them as seasons
-        year_pattern1 = "^(\d\d\d\d-\d\d)$"
-        year_pattern2 = "^(\d\d-\d\d)$"
-        year_pattern3 = "^(\d\d\d\d)$"
-        for i in range(s_len):
-            if re.match(year_pattern1, words[i]):
-                self.dates["SEASON"] = int(words[i][:4])
-            elif re.match(year_pattern2, words[i]):
-                self.dates["SEASON"] = 1900 + int(words[i][:2])
-                if int(words[i][:2]) < 45:
-                    self.dates["SEASON"] += 100
-            elif re.match(year_pattern3, words[i]):
-                self.dates["SEASON"] = int(words[i])-1
+        # take out any breakdown such as "by season", any leaderboard such
+        # as "top 5 in", any game log such as "every game he scored 40" and
+        # any game window such as "last 10 games" before the dates
+        words, self.group_by = extract_group_by(raw_sentence.split())
+        words, self.leaders, self.min_games = extract_leaders(words)
+        words, self.game_log, self.min_points = extract_game_log(words)
+        words, self.last_games, self.rolling_window = extract_window(words)
+        # substitute DATE-A/DATE-B placeholders and record any season
+        words, dates = extract_dates(words)
+        self.dates.update(dates)
+        self.raw_words = words
 
         sentence = []
         last_word = ''
@@ -118,47 +390,52 @@ class Lexer(object):
                 sentence.append(w)
             last_word = w
 
-        word2id = pickle.load(open(data_utils.INPUT2ID_PATH, 'rb'))
+        word2id = artifacts.input2id()
         return sentence, data_utils.sentence_to_token_ids(sentence, word2id)
 
 
     def decode(self):
-        """ Creates a Seq2SeqModel object and runs the sentence through it.
+        """ Looks the sentence up in the process-wide QueryCache and tags it
+            on a miss.
             Returns:
                 The decoded output as a list of tags.
         """
-        tf.reset_default_graph()
-        model = Seq2SeqModel(1100,  # source_vocab_size
-                             200,   # target_vocab_size
-                             512,   # layer_size
-                             50,    # batch_size
-                             0.001, # learn_rate
-                             train=False)
-        with tf.Session() as sess:
-            data_dir = os.path.join(os.environ['HH_ROOT'],
-                                    'hooperhub/data/')
-            ckpt = tf.train.get_checkpoint_state(data_dir)
-            if ckpt and tf.train.checkpoint_exists(ckpt.model_checkpoint_path):
-                model_meta_graph = os.path.join(data_dir, 'model.ckpt.meta')
-                saver = tf.train.import_meta_graph(model_meta_graph)
-                saver.restore(sess, tf.train.latest_checkpoint(data_dir))
-                sentence_batch, sentence_len = model.get_batch([self.sentence])
-                targets = [0] * len(self.sentence)
-                target_batch, _ = model.get_batch([targets])
-                input_feed = {
-                    model.enc_inputs: sentence_batch,
-                    model.enc_inputs_len: sentence_len,
-                    model.dec_targets: target_batch
-                }
-                predict = model.make_prediction(sess, input_feed)
-                target_list = []
-                for elem in predict.T[0]:
-                    target_list.append(self.id2target[elem])
-                return target_list
-            else:
-                print("No checkpoint exists. Please run the trainer first.")
-                return None
+        cache = get_query_cache()
+        tags = cache.get_tags(self.sentence_txt)
+        if tags is None:
+            tags = self._tag()
+            if tags is not None:
+                cache.put_tags(self.sentence_txt, tags)
+        return tags
+
 
+    def _tag(self):
+        """ Tags the sentence with the Gazetteer when it is made up entirely
+            of known phrases, and otherwise runs it through the process-wide
+            InferenceEngine, which keeps the Seq2SeqModel graph and session
+            warm between queries. Sentences from concurrent callers are
+            micro-batched into a single model run by the MicroBatcher.
+            Returns:
+                The decoded output as a list of tags.
+        """
+        gazetteer = get_gazetteer()
+        tags = None
+        if gazetteer is not None:
+            tags = gazetteer.tag(self.sentence_txt, self.raw_words)
+            if tags is not None and not gazetteer.should_shadow():
+                return tags
+        try:
+            predict = get_batcher().decode(self.sentence)
+        except IOError as e:
+            print(e)
+            return tags
+        target_list = []
+        for elem in predict:
+            target_list.append(self.id2target[elem])
+        if tags is not None:
+            gazetteer.record_shadow(self.sentence_txt, tags, target_list)
+            return tags
+        return target_list
 
 
     def _read_entity(self, entity_table, entity_name, entity):
@@ -233,6 +510,16 @@ class Lexer(object):
             safety += 1
         for k,v in et_dict.items():
             self._read_entity(entity_table, k,v)
+        entity_table.group_by = self.group_by
+        entity_table.last_games = self.last_games
+        entity_table.rolling_window = self.rolling_window
+        entity_table.leaders = self.leaders
+        entity_table.min_games = self.min_games
+        entity_table.game_log = self.game_log or None
+        entity_table.min_points = self.min_points
+        # playoff rounds only exist in the playoffs
+        if self.group_by == 'playoff_rd':
+            entity_table.playoff_rd = 1
         self.computed_dates = sorted(self.computed_dates)
         if "SEASON" in self.dates:
             season = self.dates["SEASON"]
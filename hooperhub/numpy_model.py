@@ -0,0 +1,326 @@
+import numpy as np
+
+
+# names of the arrays stored in the exported .npz weight file
+WEIGHT_NAMES = [
+    'src_embed', 'tgt_embed', 'W', 'b',
+    'enc_fw_gates_w', 'enc_fw_gates_b', 'enc_fw_candidate_w', 'enc_fw_candidate_b',
+    'enc_bw_gates_w', 'enc_bw_gates_b', 'enc_bw_candidate_w', 'enc_bw_candidate_b',
+    'dec_gates_w', 'dec_gates_b', 'dec_candidate_w', 'dec_candidate_b',
+]
+# the 1-D biases are always kept at float32
+MATRIX_NAMES = [name for name in WEIGHT_NAMES if not name.endswith('b')]
+PRECISIONS = ('float32', 'float16', 'int8')
+EOS_ID = 1
+# rows of an int8 matrix widened at a time in a product, which keeps the
+# float32 temporary at about 1 MB for the 2048 column gate matrices
+WIDEN_BLOCK_ROWS = 128
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def quantize_weights(weights, precision):
+    """ Converts float32 weights to the arrays stored for a precision. int8
+        matrices are scaled per row so that the largest magnitude in each row
+        maps to 127, and the scales are stored as <name>_scale.
+        Args:
+            weights: A mapping of the names in WEIGHT_NAMES to float32 arrays.
+            precision: One of PRECISIONS.
+        Returns:
+            A dictionary of arrays that can be written with np.savez.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError("Unknown precision {}".format(precision))
+    arrays = {}
+    for name in WEIGHT_NAMES:
+        array = np.asarray(weights[name], dtype=np.float32)
+        if name not in MATRIX_NAMES or precision == 'float32':
+            arrays[name] = array
+        elif precision == 'float16':
+            arrays[name] = array.astype(np.float16)
+        else:
+            scale = np.abs(array).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            arrays[name] = np.round(array / scale[:, None]).astype(np.int8)
+            arrays[name + '_scale'] = scale.astype(np.float32)
+    return arrays
+
+
+class WeightMatrix(object):
+    """ A 2-D weight kept at float32, float16 or int8 precision. Reduced
+        precision values stay in memory as stored and are widened to float32
+        on use, a block of rows at a time. An int8 matrix has one scale per
+        row, which is applied to the inputs of a product.
+    """
+
+    def __init__(self, values, scale=None):
+        """ Creates the WeightMatrix.
+            Args:
+                values: A 2-D float32, float16 or int8 array.
+                scale: The float32 scale of each row for int8 values.
+        """
+        self.values = values
+        self.scale = scale
+
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+
+    @property
+    def nbytes(self):
+        if self.scale is None:
+            return self.values.nbytes
+        return self.values.nbytes + self.scale.nbytes
+
+
+    def row_slice(self, start, stop=None):
+        """ Returns:
+                A WeightMatrix of the rows from start up to stop.
+        """
+        scale = None if self.scale is None else self.scale[start:stop]
+        return WeightMatrix(self.values[start:stop], scale)
+
+
+    def rows(self, ids):
+        """ Looks up rows, as an embedding lookup would.
+            Args:
+                ids: An array of row indexes of any shape.
+            Returns:
+                A float32 array with one row for each index.
+        """
+        rows = self.values[ids].astype(np.float32)
+        if self.scale is not None:
+            rows *= self.scale[ids][..., None]
+        return rows
+
+
+    def widened(self):
+        """ Returns:
+                A float32 copy of a float16 or int8 WeightMatrix, with the
+                int8 row scales applied, or the matrix itself if it already is
+                float32.
+        """
+        if self.values.dtype == np.float32:
+            return self
+        values = self.values.astype(np.float32)
+        if self.scale is not None:
+            values *= self.scale[:, None]
+        return WeightMatrix(values)
+
+
+    def rmatmul(self, x):
+        """ Computes x @ W. A reduced precision matrix is widened
+            WIDEN_BLOCK_ROWS rows at a time into one reused buffer, so a
+            product never holds a float32 copy of the whole matrix.
+            Returns:
+                The float32 product.
+        """
+        if self.scale is not None:
+            x = x * self.scale
+        values = self.values
+        if values.dtype == np.float32:
+            return x @ values
+        n_rows = values.shape[0]
+        block = np.empty((min(WIDEN_BLOCK_ROWS, n_rows), values.shape[1]),
+                         dtype=np.float32)
+        product = None
+        for start in range(0, n_rows, WIDEN_BLOCK_ROWS):
+            stop = min(start + WIDEN_BLOCK_ROWS, n_rows)
+            rows = block[:stop-start]
+            np.copyto(rows, values[start:stop], casting='unsafe')
+            if product is None:
+                product = x[:, start:stop] @ rows
+            else:
+                product += x[:, start:stop] @ rows
+        return product
+
+
+class NumpyGRUCell(object):
+    """ The GRUCell from the TensorFlow 1.0 contrib library evaluated with
+        NumPy. The gate and candidate weights are split into their input and
+        state halves so that no concatenation is needed per step.
+    """
+
+    def __init__(self, gates_w, gates_b, candidate_w, candidate_b):
+        """ Creates the cell from the exported weights.
+            Args:
+                gates_w: The [input_size + num_units, 2 * num_units]
+                    WeightMatrix of the reset and update gates.
+                gates_b: The gate biases.
+                candidate_w: The [input_size + num_units, num_units]
+                    WeightMatrix of the candidate activation.
+                candidate_b: The candidate biases.
+        """
+        self.num_units = candidate_w.shape[1]
+        input_size = candidate_w.shape[0] - self.num_units
+        self.gates_wx = gates_w.row_slice(0, input_size)
+        self.gates_wh = gates_w.row_slice(input_size)
+        self.gates_b = gates_b
+        self.candidate_wx = candidate_w.row_slice(0, input_size)
+        self.candidate_wh = candidate_w.row_slice(input_size)
+        self.candidate_b = candidate_b
+
+
+    def __call__(self, inputs, state):
+        """ Runs one step of the cell.
+            Args:
+                inputs: A [batch_size, input_size] array.
+                state: A [batch_size, num_units] array.
+            Returns:
+                The new [batch_size, num_units] state, which is also the
+                cell's output.
+        """
+        gates = sigmoid(self.gates_wx.rmatmul(inputs) +
+                        self.gates_wh.rmatmul(state) + self.gates_b)
+        r, u = gates[:, :self.num_units], gates[:, self.num_units:]
+        c = np.tanh(self.candidate_wx.rmatmul(inputs) +
+                    self.candidate_wh.rmatmul(r * state) + self.candidate_b)
+        return u * state + (1 - u) * c
+
+
+class NumpySeq2SeqModel(object):
+    """ A NumPy-only copy of the inference path of Seq2SeqModel. It runs the
+        bidirectional GRU encoder and the greedy raw_rnn decoder from
+        seq2seq_model.py on weights exported from a trained checkpoint, so
+        serving does not need to import TensorFlow.
+
+        int8 matrices stay int8 in memory and are widened block by block in
+        each product, which costs some latency but never holds a float32
+        copy of the model. Converting float16 is too slow to repeat at every
+        step on CPUs without hardware support, so float16 GRU and projection
+        matrices are widened once when the model is created: a float16
+        export halves the file, but not the memory or latency of serving.
+    """
+
+    def __init__(self, weights):
+        """ Creates the model.
+            Args:
+                weights: A mapping of the names in WEIGHT_NAMES to arrays, as
+                    returned by quantize_weights. int8 matrices also need
+                    their <name>_scale arrays.
+        """
+        weights = {name: (WeightMatrix(weights[name],
+                                       weights.get(name + '_scale'))
+                          if name in MATRIX_NAMES else weights[name])
+                   for name in WEIGHT_NAMES}
+        self.precision = str(weights['W'].values.dtype)
+        if self.precision == 'float16':
+            # the embeddings stay as stored since only a few of their rows
+            # are read per query
+            weights = {name: (w.widened() if name in MATRIX_NAMES and
+                              not name.endswith('embed') else w)
+                       for name, w in weights.items()}
+        # the bytes of weights held in memory while serving
+        self.nbytes = sum(w.nbytes for w in weights.values())
+        self.src_embed = weights['src_embed']
+        self.tgt_embed = weights['tgt_embed']
+        self.W = weights['W']
+        self.b = weights['b']
+        self.enc_fw_cell = NumpyGRUCell(*[weights['enc_fw_' + n] for n in
+                                          ('gates_w', 'gates_b',
+                                           'candidate_w', 'candidate_b')])
+        self.enc_bw_cell = NumpyGRUCell(*[weights['enc_bw_' + n] for n in
+                                          ('gates_w', 'gates_b',
+                                           'candidate_w', 'candidate_b')])
+        self.dec_cell = NumpyGRUCell(*[weights['dec_' + n] for n in
+                                       ('gates_w', 'gates_b',
+                                        'candidate_w', 'candidate_b')])
+
+
+    @classmethod
+    def load(cls, path):
+        """ Loads a model from an .npz file written by the exporter.
+            Args:
+                path: Path to the .npz file.
+            Returns:
+                A NumpySeq2SeqModel.
+        """
+        with np.load(path) as npz:
+            weights = {name: npz[name] for name in npz.files}
+        return cls(weights)
+
+
+    def get_batch(self, data):
+        """ Gets a time major batch from data, like Seq2SeqModel.get_batch.
+            Args:
+                data: A 2D list of sentences.
+            Returns:
+                A time major numpy matrix and the lengths of each sentence.
+        """
+        batch_lens = np.array([len(sentence) for sentence in data],
+                              dtype=np.int32)
+        batch_major = np.zeros(shape=(len(data), max(batch_lens, default=0)),
+                               dtype=np.int32)
+        for i, sentence in enumerate(data):
+            batch_major[i, :len(sentence)] = [int(elem) for elem in sentence]
+        return batch_major.swapaxes(0, 1), batch_lens
+
+
+    def _encode(self, enc_inputs, enc_inputs_len):
+        """ Runs the forward and backward encoder cells over each sentence up
+            to its length.
+            Returns:
+                The concatenated final forward and backward states.
+        """
+        max_time, batch_sz = enc_inputs.shape
+        embedded = self.src_embed.rows(enc_inputs)
+        fw_state = np.zeros((batch_sz, self.enc_fw_cell.num_units),
+                            dtype=embedded.dtype)
+        bw_state = np.zeros((batch_sz, self.enc_bw_cell.num_units),
+                            dtype=embedded.dtype)
+        batch_idx = np.arange(batch_sz)
+        for t in range(max_time):
+            active = (t < enc_inputs_len)[:, None]
+            fw_state = np.where(active,
+                                self.enc_fw_cell(embedded[t], fw_state),
+                                fw_state)
+            # the backward cell reads each sentence in reverse within its
+            # own length, like tf.reverse_sequence
+            rev_t = np.maximum(enc_inputs_len - 1 - t, 0)
+            bw_state = np.where(active,
+                                self.enc_bw_cell(embedded[rev_t, batch_idx],
+                                                 bw_state),
+                                bw_state)
+        return np.concatenate([fw_state, bw_state], axis=1)
+
+
+    def make_prediction(self, enc_inputs, enc_inputs_len):
+        """ Makes a target prediction for a time major batch.
+            Args:
+                enc_inputs: A [max_time, batch_size] array of token id's.
+                enc_inputs_len: The length of each sentence in the batch.
+            Returns:
+                A [max_time, batch_size] array of predicted target id's.
+        """
+        max_time, batch_sz = enc_inputs.shape
+        state = self._encode(enc_inputs, enc_inputs_len)
+        _input = self.tgt_embed.rows(np.full(batch_sz, EOS_ID))
+        predictions = np.zeros((max_time, batch_sz), dtype=np.int64)
+        for t in range(max_time):
+            finished = (t >= enc_inputs_len)[:, None]
+            output = self.dec_cell(_input, state)
+            state = np.where(finished, state, output)
+            # finished elements emit zeros, so their logits are just b
+            logits = self.W.rmatmul(np.where(finished, 0, output)) + self.b
+            predictions[t] = np.argmax(logits, axis=1)
+            # the decoder feeds its prediction back through the source
+            # embedding, as loop_fn does in Seq2SeqModel
+            _input = self.src_embed.rows(predictions[t])
+        return predictions
+
+
+    def decode_batch(self, sentences):
+        """ Predicts target id's for several tokenized sentences at once.
+            Args:
+                sentences: A list of sentences, each a list of token id's.
+            Returns:
+                A list with one list of target token id's per sentence.
+        """
+        enc_inputs, enc_inputs_len = self.get_batch(sentences)
+        predict = self.make_prediction(enc_inputs, enc_inputs_len)
+        return [list(predict[:length, i])
+                for i, length in enumerate(enc_inputs_len)]
@@ -0,0 +1,140 @@
+""" Process-wide registry for the pickled artifacts used while serving """
+
+import os
+import pickle
+import threading
+
+from types import MappingProxyType
+
+from hooperhub.util import data_utils
+
+
+def freeze(obj):
+    """ Converts an unpickled artifact into an immutable view of itself so it
+        can be shared safely between Lexers and Interpreters.
+        Args:
+            obj: The unpickled object.
+        Returns:
+            A frozenset for sets, a tuple for lists and a read-only mapping for
+            dictionaries. Containers are frozen recursively.
+    """
+    if isinstance(obj, (set, frozenset)):
+        return frozenset(obj)
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(elem) for elem in obj)
+    if isinstance(obj, dict):
+        return MappingProxyType({k: freeze(v) for k,v in obj.items()})
+    return obj
+
+
+class ArtifactRegistry(object):
+    """ Loads each pickled artifact lazily, exactly once per process, and
+        hands out immutable views of it. Reloading a file builds the new view
+        completely before swapping it in, so readers either see the old or
+        the new artifact and never a partially loaded one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # maps a file path to a (file signature, frozen artifact) pair
+        self._entries = {}
+
+
+    def _signature(self, path):
+        """ Returns the modification time and size of a file, which is used to
+            detect when an artifact has changed on disk.
+        """
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+
+    def _load(self, path):
+        signature = self._signature(path)
+        with open(path, 'rb') as f:
+            artifact = freeze(pickle.load(f))
+        return signature, artifact
+
+
+    def get(self, path):
+        """ Gets the artifact stored at path, unpickling it on first use.
+            Args:
+                path: The path of the pickle file.
+            Returns:
+                An immutable view of the unpickled object.
+        """
+        entry = self._entries.get(path)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.get(path)
+                if entry is None:
+                    entry = self._load(path)
+                    self._entries[path] = entry
+        return entry[1]
+
+
+    def reload(self, path=None, force=False):
+        """ Reloads artifacts whose files have changed on disk.
+            Args:
+                path: The path of a single artifact to reload. All loaded
+                    artifacts are checked when this is None.
+                force: A boolean that when true reloads the artifacts even if
+                    their files have not changed.
+            Returns:
+                A list of the paths that were reloaded.
+        """
+        paths = [path] if path else list(self._entries)
+        reloaded = []
+        for p in paths:
+            entry = self._entries.get(p)
+            if (not force and entry is not None and
+                entry[0] == self._signature(p)):
+                continue
+            new_entry = self._load(p)
+            with self._lock:
+                self._entries[p] = new_entry
+            reloaded.append(p)
+        return reloaded
+
+
+    def clear(self):
+        """ Drops every loaded artifact so that the next get() unpickles it
+            again.
+        """
+        with self._lock:
+            self._entries = {}
+
+
+registry = ArtifactRegistry()
+
+
+def vocab_set():
+    return registry.get(data_utils.VOCAB_SET_PATH)
+
+
+def input2id():
+    return registry.get(data_utils.INPUT2ID_PATH)
+
+
+def id2target():
+    return registry.get(data_utils.ID2TARGET_PATH)
+
+
+def players():
+    return registry.get(data_utils.PLAYERS_PATH)
+
+
+def teams():
+    return registry.get(data_utils.TEAMS_PATH)
+
+
+def stat_recipes(path=data_utils.STAT_RECIPES_PATH):
+    return registry.get(path)
+
+
+def reload(force=False):
+    """ Reloads every loaded artifact that changed on disk. This is the hook to
+        call after new vocabulary or recipe files have been written.
+        Returns:
+            A list of the paths that were reloaded.
+    """
+    return registry.reload(force=force)
@@ -1,321 +1,352 @@
-import inspect
+from collections import namedtuple
 
+import numpy as np
 
-class Calculator(object):
-    """
-        Responsible for calculating statistics given the rudimentary stats
-        that were queried from the DB.
-    """
-
-    def __init__(self, rudimentary_stats):
-        self.rudimentary_stats = rudimentary_stats
-        self.members = inspect.getmembers(self)
-        self.member_names = list(map(lambda mem: mem[0], self.members))
-
-
-    def calculate(self, stat_string):
-        method_name = 'calc_' + stat_string
-        if method_name not in self.member_names:
-            raise AttributeError
-        calculation = getattr(self, method_name)
-        return calculation()
-
-
-    """  Time Played Calculations """
-
-    def calc_tot_time(self):
-        tot_secs_played = int(self.rudimentary_stats['sum(seconds)'])
-        minutes = str(tot_secs_played//60).zfill(2)
-        seconds = str(tot_secs_played%60).zfill(2)
-        tot_mmss = minutes + ' minutes, ' + seconds + ' seconds'
-        return "Total time played", tot_mmss
-
-
-    def calc_avg_time(self):
-        avg_secs_played = int(self.rudimentary_stats['avg(seconds)'])
-        minutes = str(avg_secs_played//60).zfill(2)
-        seconds = str(avg_secs_played%60).zfill(2)
-        avg_mmss = minutes + ':' + seconds
-        return "Minutes per game", avg_mmss
-
-
-    """ Game Count Calculations """
-
-    def calc_game_count(self):
-        game_plyd = str(self.rudimentary_stats['count(*)'])
-        return "Games played", game_plyd
-
-
-    """ Field Goal Calculations """
-
-    def calc_tot_fg(self):
-        tot_fg = str(self.rudimentary_stats['sum(fg)'])
-        return "Total FG", tot_fg
-
-
-    def calc_avg_fg(self):
-        avg_fg = str(round(self.rudimentary_stats['avg(fg)'], 2))
-        return "FG per game", avg_fg
-
-
-    def calc_tot_fga(self):
-        tot_fga = str(self.rudimentary_stats['sum(fga)'])
-        return "FG attempts", tot_fga
-
-
-    def calc_avg_fga(self):
-        avg_fga = str(round(self.rudimentary_stats['avg(fga)'], 2))
-        return "FG attempts per game", avg_fga
-
-
-    def calc_fg_pct(self):
-        tot_fg = self.rudimentary_stats['sum(fg)']
-        tot_fga = self.rudimentary_stats['sum(fga)']
-        fg_pct = str(round((tot_fg/tot_fga)*100, 2))+'%'
-        return "FG%", fg_pct
-
-
-    """ 2 Point Field Goal Calculations """
-
-    def calc_tot_fg2(self):
-        tot_fg = self.rudimentary_stats['sum(fg)']
-        tot_fg3 = self.rudimentary_stats['sum(fg3)']
-        tot_fg2 = str(tot_fg - tot_fg3)
-        return "Total 2-pt FG", tot_fg2
-
-
-    def calc_avg_fg2(self):
-        avg_fg = self.rudimentary_stats['avg(fg)']
-        avg_fg3 = self.rudimentary_stats['avg(fg3)']
-        avg_fg2 = str(round(avg_fg - avg_fg3, 2))
-        return "2-pt FG per game", avg_fg2
-
-
-    def calc_tot_fg2a(self):
-        tot_fga = self.rudimentary_stats['sum(fga)']
-        tot_fg3a = self.rudimentary_stats['sum(fg3a)']
-        tot_fg2a = str(tot_fga - tot_fg3a)
-        return "2-pt FG attempts", tot_fg2a
-
-
-    def calc_avg_fg2a(self):
-        avg_fga = self.rudimentary_stats['avg(fga)']
-        avg_fg3a = self.rudimentary_stats['avg(fg3a)']
-        avg_fg2a = str(round(avg_fga - avg_fg3a, 2))
-        return "2-pt FG attempts per game", avg_fg2a
-
-
-    def calc_fg2_pct(self):
-        tot_fg = self.rudimentary_stats['sum(fg)']
-        tot_fga = self.rudimentary_stats['sum(fga)']
-        tot_fg3 = self.rudimentary_stats['sum(fg3)']
-        tot_fg3a = self.rudimentary_stats['sum(fg3a)']
-        fg2_pct = str(round(((tot_fg-tot_fg3)/(tot_fga-tot_fg3a))*100, 2))+'%'
-        return "2-pt FG%", fg2_pct
-
-
-    """ 3 Point Field Goal Calculations """
-
-    def calc_tot_fg3(self):
-        tot_fg3 = str(self.rudimentary_stats['sum(fg3)'])
-        return "Total 3-pt FG", tot_fg3
 
+# A stat is a label, the aggregate columns it needs from the performance
+# table, a formula over a mapping of those columns and a formatter for the
+# formula's value. Formulas only use arithmetic, so they evaluate the same
+# way on the values of one query and on NumPy arrays of many.
+StatDefinition = namedtuple('StatDefinition',
+                            ['name', 'label', 'columns', 'formula',
+                             'formatter'])
 
-    def calc_avg_fg3(self):
-        avg_fg3 = float('%.2g' % self.rudimentary_stats['avg(fg3)'])
-        return "3-pt FG per game", avg_fg3
 
+""" Formatters """
 
-    def calc_tot_fg3a(self):
-        tot_fg3a = str(self.rudimentary_stats['sum(fg3a)'])
-        return "3-pt FG attempts", tot_fg3a
+def _rounded(value):
+    return str(round(value, 2))
 
 
-    def calc_avg_fg3a(self):
-        avg_fg3a = str(round(self.rudimentary_stats['avg(fg3a)'], 2))
-        return "3-pt FG attempts per game", avg_fg3a
+def _percent(value):
+    return str(round(value, 2))+'%'
 
 
-    def calc_fg3_pct(self):
-        tot_fg3 = self.rudimentary_stats['sum(fg3)']
-        tot_fg3a = self.rudimentary_stats['sum(fg3a)']
-        fg3_pct = str(round((tot_fg3/tot_fg3a)*100, 2))+'%'
-        return "3-pt FG%", fg3_pct
+def _mmss(value):
+    secs_played = int(value)
+    minutes = str(secs_played//60).zfill(2)
+    seconds = str(secs_played%60).zfill(2)
+    return minutes + ':' + seconds
 
 
-    """ Free Throw Calculations """
+def _minutes_seconds(value):
+    secs_played = int(value)
+    minutes = str(secs_played//60).zfill(2)
+    seconds = str(secs_played%60).zfill(2)
+    return minutes + ' minutes, ' + seconds + ' seconds'
 
-    def calc_tot_ft(self):
-        tot_ft = str(self.rudimentary_stats['sum(ft)'])
-        return "Total FT", tot_ft
 
+def _two_significant(value):
+    return float('%.2g' % value)
 
-    def calc_avg_ft(self):
-        avg_ft = str(round(self.rudimentary_stats['avg(ft)'], 2))
-        return "FT per game", avg_ft
 
+def _unformatted(value):
+    return value
 
-    def calc_tot_fta(self):
-        tot_fta = str(self.rudimentary_stats['sum(fta)'])
-        return "Total FT attempts", tot_fta
 
+""" Formulas """
 
-    def calc_avg_fta(self):
-        avg_fta = str(round(self.rudimentary_stats['avg(fta)'], 2))
-        return "FT attempts per game", avg_fta
+def _column(column):
+    return lambda s: s[column]
 
 
-    def calc_ft_pct(self):
-        tot_ft = self.rudimentary_stats['sum(ft)']
-        tot_fta = self.rudimentary_stats['sum(fta)']
-        ft_pct = str(round((tot_ft/tot_fta)*100, 2))+'%'
-        return "FT %", ft_pct
+def _fg2(agg):
+    return lambda s: s[agg+'(fg)'] - s[agg+'(fg3)']
 
 
-    """ Points Calculations """
+def _fg2a(agg):
+    return lambda s: s[agg+'(fga)'] - s[agg+'(fg3a)']
 
-    def calc_tot_pts(self):
-        tot_fg = self.rudimentary_stats['sum(fg)']
-        tot_fg3 = self.rudimentary_stats['sum(fg3)']
-        tot_ft = self.rudimentary_stats['sum(ft)']
-        tot_fg2 = tot_fg - tot_fg3
-        tot_pts = str(2*tot_fg2 + 3*tot_fg3 + tot_ft)
-        return "Total points", tot_pts
 
+def _pct(made, attempts):
+    return lambda s: (s[made]/s[attempts])*100
 
-    def calc_avg_pts(self):
-        avg_fg = self.rudimentary_stats['avg(fg)']
-        avg_fg3 = self.rudimentary_stats['avg(fg3)']
-        avg_ft = self.rudimentary_stats['avg(ft)']
-        avg_fg2 = avg_fg - avg_fg3
-        ppg = str(round(2*avg_fg2 + 3*avg_fg3 + avg_ft, 2))
-        return "PPG", ppg
 
+def _pts(s):
+    tot_fg2 = s['sum(fg)'] - s['sum(fg3)']
+    return 2*tot_fg2 + 3*s['sum(fg3)'] + s['sum(ft)']
 
-    """ Rebound Calculations """
 
-    def calc_tot_orb(self):
-        tot_orb = str(self.rudimentary_stats['sum(orb)'])
-        return "Total offensive rebounds", tot_orb
+def _ppg(s):
+    avg_fg2 = s['avg(fg)'] - s['avg(fg3)']
+    return 2*avg_fg2 + 3*s['avg(fg3)'] + s['avg(ft)']
 
 
-    def calc_avg_orb(self):
-        avg_orb = str(round(self.rudimentary_stats['avg(orb)'], 2))
-        return "Offensive rebounds per game", avg_orb
+def _ts(s):
+    tot_pts = ((s['sum(fg)']-s['sum(fg3)']) * 2 + s['sum(fg3)'] * 3 +
+               s['sum(ft)'])
+    return (tot_pts / (2*(s['sum(fga)'] + 0.44*s['sum(fta)'])))*100
 
 
-    def calc_tot_drb(self):
-        tot_drb = self.rudimentary_stats['sum(drb)']
-        return "Total defensive rebounds", tot_drb
+def _total(name, label, col, formatter=str):
+    column = 'sum({})'.format(col)
+    return StatDefinition(name, label, [column], _column(column), formatter)
 
 
-    def calc_avg_drb(self):
-        avg_drb = str(round(self.rudimentary_stats['avg(drb)'], 2))
-        return "Defensive rebounds per game", avg_drb
+def _average(name, label, col, formatter=_rounded):
+    column = 'avg({})'.format(col)
+    return StatDefinition(name, label, [column], _column(column), formatter)
 
 
-    def calc_tot_reb(self):
-        tot_orb = self.rudimentary_stats['sum(orb)']
-        tot_drb = self.rudimentary_stats['sum(drb)']
-        tot_reb = str(tot_orb + tot_drb)
-        return "Total rebounds", tot_reb
-
-
-    def calc_avg_reb(self):
-        avg_orb = self.rudimentary_stats['avg(orb)']
-        avg_drb = self.rudimentary_stats['avg(drb)']
-        rpg = str(round(avg_orb + avg_drb, 2))
-        return "Rebounds per game", rpg
-
-
-    """ Assist Calculations """
-
-    def calc_tot_ast(self):
-        tot_ast = str(self.rudimentary_stats['sum(ast)'])
-        return "Total assists", tot_ast
-
-
-    def calc_avg_ast(self):
-        avg_ast = str(round(self.rudimentary_stats['avg(ast)'], 2))
-        return "Assists per game", avg_ast
-
-
-    """ Block Calculations """
-
-    def calc_tot_blk(self):
-        tot_blk = str(self.rudimentary_stats['sum(blk)'])
-        return "Total blocks", tot_blk
-
-
-    def calc_avg_blk(self):
-        avg_blk = str(round(self.rudimentary_stats['avg(blk)'], 2))
-        return "Blocks per game", avg_blk
-
-
-    """ Steal Calculations """
-
-    def calc_tot_stl(self):
-        tot_stl = str(self.rudimentary_stats['sum(stl)'])
-        return "Total steals", tot_stl
-
-
-    def calc_avg_stl(self):
-        avg_stl = str(round(self.rudimentary_stats['avg(stl)'], 2))
-        return "Steals per game", avg_stl
-
-
-    """ Miscellaneous Calculations """
-
-    def calc_tot_tov(self):
-        tot_tov = str(self.rudimentary_stats['sum(tov)'])
-        return "Total turnovers", tot_tov
-
-
-    def calc_avg_tov(self):
-        avg_tov = str(round(self.rudimentary_stats['avg(tov)'], 2))
-        return "Turnovers per game", avg_tov
-
-
-    def calc_tot_pf(self):
-        tot_pf = str(self.rudimentary_stats['sum(pf)'])
-        return "Total fouls", tot_pf
-
-
-    def calc_avg_pf(self):
-        avg_pf = str(round(self.rudimentary_stats['avg(pf)'], 2))
-        return "Fouls per game", avg_pf
-
-
-    """ Advanced Calculations """
+def _distribution(name, label, agg, col, formatter=_rounded):
+    """ A stat read from one game-by-game distribution, e.g. the median or
+        the highest points of the player's games. 'pts' and 'reb' are the
+        derived per-game columns of columnar.DERIVED_COLUMNS.
+    """
+    column = '{}({})'.format(agg, col)
+    return StatDefinition(name, label, [column], _column(column), formatter)
+
+
+STAT_DEFINITIONS = [
+    # time played
+    _total('tot_time', "Total time played", 'seconds', _minutes_seconds),
+    _average('avg_time', "Minutes per game", 'seconds', _mmss),
+    # game count
+    StatDefinition('game_count', "Games played", ['count(*)'],
+                   _column('count(*)'), str),
+    # field goals
+    _total('tot_fg', "Total FG", 'fg'),
+    _average('avg_fg', "FG per game", 'fg'),
+    _total('tot_fga', "FG attempts", 'fga'),
+    _average('avg_fga', "FG attempts per game", 'fga'),
+    StatDefinition('fg_pct', "FG%", ['sum(fg)', 'sum(fga)'],
+                   _pct('sum(fg)', 'sum(fga)'), _percent),
+    # 2 point field goals
+    StatDefinition('tot_fg2', "Total 2-pt FG", ['sum(fg)', 'sum(fg3)'],
+                   _fg2('sum'), str),
+    StatDefinition('avg_fg2', "2-pt FG per game", ['avg(fg)', 'avg(fg3)'],
+                   _fg2('avg'), _rounded),
+    StatDefinition('tot_fg2a', "2-pt FG attempts", ['sum(fga)', 'sum(fg3a)'],
+                   _fg2a('sum'), str),
+    StatDefinition('avg_fg2a', "2-pt FG attempts per game",
+                   ['avg(fga)', 'avg(fg3a)'], _fg2a('avg'), _rounded),
+    StatDefinition('fg2_pct', "2-pt FG%",
+                   ['sum(fg)', 'sum(fga)', 'sum(fg3)', 'sum(fg3a)'],
+                   lambda s: ((s['sum(fg)']-s['sum(fg3)']) /
+                              (s['sum(fga)']-s['sum(fg3a)']))*100,
+                   _percent),
+    # 3 point field goals
+    _total('tot_fg3', "Total 3-pt FG", 'fg3'),
+    _average('avg_fg3', "3-pt FG per game", 'fg3', _two_significant),
+    _total('tot_fg3a', "3-pt FG attempts", 'fg3a'),
+    _average('avg_fg3a', "3-pt FG attempts per game", 'fg3a'),
+    StatDefinition('fg3_pct', "3-pt FG%", ['sum(fg3)', 'sum(fg3a)'],
+                   _pct('sum(fg3)', 'sum(fg3a)'), _percent),
+    # free throws
+    _total('tot_ft', "Total FT", 'ft'),
+    _average('avg_ft', "FT per game", 'ft'),
+    _total('tot_fta', "Total FT attempts", 'fta'),
+    _average('avg_fta', "FT attempts per game", 'fta'),
+    StatDefinition('ft_pct', "FT %", ['sum(ft)', 'sum(fta)'],
+                   _pct('sum(ft)', 'sum(fta)'), _percent),
+    # points
+    StatDefinition('tot_pts', "Total points",
+                   ['sum(fg)', 'sum(fg3)', 'sum(ft)'], _pts, str),
+    StatDefinition('avg_pts', "PPG", ['avg(fg)', 'avg(fg3)', 'avg(ft)'],
+                   _ppg, _rounded),
+    # rebounds
+    _total('tot_orb', "Total offensive rebounds", 'orb'),
+    _average('avg_orb', "Offensive rebounds per game", 'orb'),
+    _total('tot_drb', "Total defensive rebounds", 'drb', _unformatted),
+    _average('avg_drb', "Defensive rebounds per game", 'drb'),
+    StatDefinition('tot_reb', "Total rebounds", ['sum(orb)', 'sum(drb)'],
+                   lambda s: s['sum(orb)'] + s['sum(drb)'], str),
+    StatDefinition('avg_reb', "Rebounds per game", ['avg(orb)', 'avg(drb)'],
+                   lambda s: s['avg(orb)'] + s['avg(drb)'], _rounded),
+    # assists, blocks and steals
+    _total('tot_ast', "Total assists", 'ast'),
+    _average('avg_ast', "Assists per game", 'ast'),
+    _total('tot_blk', "Total blocks", 'blk'),
+    _average('avg_blk', "Blocks per game", 'blk'),
+    _total('tot_stl', "Total steals", 'stl'),
+    _average('avg_stl', "Steals per game", 'stl'),
+    # miscellaneous
+    _total('tot_tov', "Total turnovers", 'tov'),
+    _average('avg_tov', "Turnovers per game", 'tov'),
+    _total('tot_pf', "Total fouls", 'pf'),
+    _average('avg_pf', "Fouls per game", 'pf'),
+    # advanced
+    _total('plus_min', "+/-", 'plus_minus'),
+    _average('usg', "Usage rating", 'usg'),
+    _average('ortg', "Offensive rating", 'ortg'),
+    _average('drtg', "Defensive rating", 'drtg'),
+    StatDefinition('ts', "True Shooting",
+                   ['sum(fg)', 'sum(fg3)', 'sum(ft)', 'sum(fga)', 'sum(fta)'],
+                   _ts, _percent),
+    # distributions
+    _distribution('med_pts', "Median points", 'median', 'pts'),
+    _distribution('med_reb', "Median rebounds", 'median', 'reb'),
+    _distribution('med_ast', "Median assists", 'median', 'ast'),
+    _distribution('med_time', "Median minutes", 'median', 'seconds', _mmss),
+    _distribution('p90_pts', "90th percentile points", 'p90', 'pts'),
+    _distribution('p90_time', "90th percentile minutes", 'p90', 'seconds',
+                  _mmss),
+    _distribution('max_pts', "Career high points", 'max', 'pts', str),
+    _distribution('max_reb', "Career high rebounds", 'max', 'reb', str),
+    _distribution('max_ast', "Career high assists", 'max', 'ast', str),
+    _distribution('max_time', "Most minutes", 'max', 'seconds', _mmss),
+    _distribution('min_pts', "Fewest points", 'min', 'pts', str),
+    _distribution('games_20pts', "20-point games", 'ge20', 'pts', str),
+    _distribution('games_30pts', "30-point games", 'ge30', 'pts', str),
+    _distribution('games_40pts', "40-point games", 'ge40', 'pts', str),
+    _distribution('games_10reb', "10-rebound games", 'ge10', 'reb', str),
+    _distribution('games_10ast', "10-assist games", 'ge10', 'ast', str),
+]
+
+# compiled once: the dispatch table and the columns each stat needs
+STATS = {d.name: d for d in STAT_DEFINITIONS}
+STAT_RECIPES = {d.name: list(d.columns) for d in STAT_DEFINITIONS}
+
+
+def needed_columns(stat_names):
+    """ Returns:
+            The sorted list of aggregate columns needed for stat_names.
+    """
+    columns = set()
+    for stat in stat_names:
+        columns.update(STATS[stat].columns)
+    return sorted(columns)
+
+
+def stack_stats(rows, columns=None):
+    """ Turns many rudimentary_stats dictionaries into one array per column,
+        with NULLs as NaN.
+        Args:
+            rows: A list of rudimentary_stats dictionaries.
+            columns: The columns to stack. Defaults to those of the first row.
+        Returns:
+            A dictionary mapping each column to a float64 array.
+    """
+    if columns is None:
+        columns = list(rows[0]) if rows else []
+    return {c: np.array([np.nan if row[c] is None else float(row[c])
+                         for row in rows], dtype=np.float64)
+            for c in columns}
+
+
+def calculate_arrays(stat_names, arrays):
+    """ Evaluates stats for many rows of a query at once.
+        Args:
+            stat_names: The names of the stats to evaluate.
+            arrays: A dictionary mapping the needed columns to arrays, e.g.
+                from stack_stats().
+        Returns:
+            A dictionary mapping each stat name to an array of unformatted
+            values. Divisions by zero give inf or NaN instead of raising.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {stat: np.asarray(STATS[stat].formula(arrays), dtype=np.float64)
+                for stat in stat_names}
 
-    def calc_plus_min(self):
-        plus_min = str(self.rudimentary_stats['sum(plus_minus)'])
-        return "+/-", plus_min
 
+def _keeps_ints(definition):
+    """ Returns:
+            True if the formula of a stat gives an int when its columns are
+            ints, i.e. it does not divide.
+    """
+    # distinct values, so that no difference in a denominator is zero
+    probe = {c: i + 2 for i, c in enumerate(definition.columns)}
+    return isinstance(definition.formula(probe), int)
 
-    def calc_usg(self):
-        usg = str(round(self.rudimentary_stats['avg(usg)'], 2))
-        return "Usage rating", usg
 
+# stats whose value for a single row is an int when every column is an int
+INT_STATS = frozenset(d.name for d in STAT_DEFINITIONS if _keeps_ints(d))
 
-    def calc_ortg(self):
-        ortg = str(round(self.rudimentary_stats['avg(ortg)'], 2))
-        return "Offensive rating", ortg
 
+def calculate_row(stat_names, rudimentary_stats, strict=True):
+    """ Calculates and formats stats from the results of one query.
+        Args:
+            stat_names: The names of the stats to calculate.
+            rudimentary_stats: The query results.
+            strict: A boolean that when false gives None for a stat that
+                cannot be calculated, e.g. from a group of games where a
+                column is NULL, instead of raising.
+        Returns:
+            A dictionary mapping each stat label to its formatted value.
+    """
+    result_entitys = {}
+    calc = Calculator(rudimentary_stats)
+    for stat in stat_names:
+        try:
+            result_pair = calc.calculate(stat)
+        except (TypeError, ZeroDivisionError):
+            if strict:
+                raise
+            result_pair = (STATS[stat].label, None)
+        result_entitys.update([result_pair])
+    return result_entitys
+
+
+def calculate_rows(stat_names, rows, strict=True):
+    """ Calculates the same stats from the results of many queries, e.g. the
+        groups of a breakdown, with every formula evaluated once over arrays.
+        Each value is turned back into the type its formula gives for a
+        single row before it is formatted, so the results are those of
+        calculate_row(). Rows with values the arrays cannot hold, such as
+        NULLs or Decimals, or that divide by zero, go through calculate_row().
+        Args:
+            stat_names: The names of the stats to calculate.
+            rows: A list of rudimentary_stats dictionaries.
+            strict: As in calculate_row().
+        Returns:
+            A list with the result dictionary of each row.
+    """
+    if not rows:
+        return []
+    # per column: the values as floats and which rows hold ints and floats
+    arrays, numeric, integer = {}, {}, {}
+    for column in needed_columns(stat_names):
+        values = [row[column] for row in rows]
+        integer[column] = np.array([type(v) is int for v in values])
+        numeric[column] = integer[column] | np.array([type(v) is float
+                                                       for v in values])
+        arrays[column] = np.array([v if ok else np.nan for v, ok in
+                                   zip(values, numeric[column])],
+                                  dtype=np.float64)
+    values = calculate_arrays(stat_names, arrays)
+    # per stat: the rows calculated from the arrays and those giving ints
+    exact, ints = {}, {}
+    for stat in stat_names:
+        columns = STATS[stat].columns
+        exact[stat] = np.isfinite(values[stat])
+        ints[stat] = np.full(len(rows), stat in INT_STATS)
+        for column in columns:
+            exact[stat] &= numeric[column]
+            ints[stat] &= integer[column]
+        values[stat] = values[stat].tolist()
+
+    results = []
+    for i, row in enumerate(rows):
+        if not all(exact[stat][i] for stat in stat_names):
+            results.append(calculate_row(stat_names, row, strict))
+            continue
+        result_entitys = {}
+        for stat in stat_names:
+            definition = STATS[stat]
+            value = values[stat][i]
+            value = int(value) if ints[stat][i] else value
+            result_entitys.update([(definition.label,
+                                    definition.formatter(value))])
+        results.append(result_entitys)
+    return results
 
-    def calc_drtg(self):
-        drtg = str(round(self.rudimentary_stats['avg(drtg)'], 2))
-        return "Defensive rating", drtg
 
+class Calculator(object):
+    """
+        Responsible for calculating statistics given the rudimentary stats
+        that were queried from the DB.
+    """
 
-    def calc_ts(self):
-        tot_fg = self.rudimentary_stats['sum(fg)']
-        tot_fg3 = self.rudimentary_stats['sum(fg3)']
-        tot_ft = self.rudimentary_stats['sum(ft)']
-        tot_pts = (tot_fg-tot_fg3) * 2 + tot_fg3 * 3 + tot_ft
-        tot_fga = self.rudimentary_stats['sum(fga)']
-        tot_fta = self.rudimentary_stats['sum(fta)']
-        ts = str(round((tot_pts / (2*(tot_fga + 0.44*tot_fta)))*100, 2))+'%'
-        return "True Shooting", ts
+    def __init__(self, rudimentary_stats):
+        self.rudimentary_stats = rudimentary_stats
 
 
+    def calculate(self, stat_string):
+        """ Returns:
+                The label of the stat and its formatted value.
+        """
+        definition = STATS.get(stat_string)
+        if definition is None:
+            raise AttributeError(stat_string)
+        value = definition.formula(self.rudimentary_stats)
+        return definition.label, definition.formatter(value)
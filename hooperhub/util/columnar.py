@@ -0,0 +1,715 @@
+""" In-process columnar copy of the performance table """
+
+import re
+import datetime
+import threading
+
+import numpy as np
+
+from decimal import Decimal, localcontext, ROUND_HALF_UP
+
+
+# columns of the performance table in the order the crawler inserts them
+PERFORMANCE_COLUMNS = ['player_id', 'game_date', 'playoff_rd', 'win_margin',
+                       'home', 'team', 'opp', 'started', 'seconds', 'fg',
+                       'fga', 'fg3', 'fg3a', 'ft', 'fta', 'orb', 'drb', 'ast',
+                       'stl', 'blk', 'tov', 'pf', 'plus_minus', 'usg', 'ortg',
+                       'drtg']
+# columns used to filter a query
+FILTER_COLUMNS = ['playoff_rd', 'win_margin', 'home', 'team', 'opp',
+                  'started']
+# columns stat_recipes aggregates, and those stored as floating point
+STAT_COLUMNS = PERFORMANCE_COLUMNS[8:]
+FLOAT_COLUMNS = frozenset(['usg', 'ortg', 'drtg'])
+
+# per-game values that aggregates can read besides the stat columns, as the
+# stat columns they add up and their weights; like the SQL expression, a
+# derived value is NULL in a game where any of its columns is NULL
+DERIVED_COLUMNS = {'pts': [('fg', 2), ('fg3', 1), ('ft', 1)],
+                   'reb': [('orb', 1), ('drb', 1)]}
+# aggregates that need every value instead of a running sum: max(), min(),
+# median(), pN() for the Nth percentile and geN() for the number of games
+# with a value of at least N
+PERCENTILE_AGGREGATE = re.compile(r'^p([1-9][0-9]?)$')
+THRESHOLD_AGGREGATE = re.compile(r'^ge([0-9]+)$')
+
+# columns of a game log listing: the performance row and its points
+GAME_LIST_COLUMNS = PERFORMANCE_COLUMNS + ['pts']
+# columns read back from the store as booleans
+BOOLEAN_COLUMNS = frozenset(['home', 'started'])
+
+# columns a grouping dimension other than season and month reads
+GROUP_COLUMNS = {'opponent': 'opp', 'home': 'home', 'playoff_rd': 'playoff_rd'}
+# the expression that groups performance rows for each dimension; seasons
+# are numbered by the year they end in
+GROUP_EXPRESSIONS = {
+    'season': ("extract(year FROM game_date)::integer + "
+               "CASE WHEN extract(month FROM game_date) >= 7 THEN 1 "
+               "ELSE 0 END"),
+    'month': "date_trunc('month', game_date)::date",
+    'opponent': 'opp',
+    'home': 'home',
+    'playoff_rd': 'playoff_rd'
+}
+UNIX_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# postgres numeric division keeps at least this many significant digits
+NUMERIC_MIN_SIG_DIGITS = 16
+NUMERIC_MAX_DISPLAY_SCALE = 1000
+
+
+def parse_column(column):
+    """ Splits a stat_recipes column such as 'avg(fg3)' into ('avg', 'fg3').
+    """
+    agg, col = column.rstrip(')').split('(')
+    return agg, col
+
+
+def _percentile(agg):
+    """ Returns:
+            The percentile a distribution aggregate selects, or None.
+    """
+    if agg == 'median':
+        return 50
+    match = PERCENTILE_AGGREGATE.match(agg)
+    return int(match.group(1)) if match else None
+
+
+def _threshold(agg):
+    """ Returns:
+            The value a geN() aggregate counts games from, or None.
+    """
+    match = THRESHOLD_AGGREGATE.match(agg)
+    return int(match.group(1)) if match else None
+
+
+def is_distribution(column):
+    """ Returns:
+            True if a stat_recipes column aggregates the distribution of a
+            column, such as 'median(pts)', rather than its sum.
+    """
+    return parse_column(column)[0] not in ('sum', 'avg', 'count')
+
+
+def column_expression(col, table=''):
+    """ Returns:
+            The SQL expression of a stat or derived column, with its column
+            names prefixed by table, e.g. 'p.'.
+    """
+    terms = DERIVED_COLUMNS.get(col)
+    if terms is None:
+        return table + col
+    return '(' + '+'.join(table + c if weight == 1 else
+                          '{}*{}{}'.format(weight, table, c)
+                          for c, weight in terms) + ')'
+
+
+def column_sql(column, table=''):
+    """ Turns a stat_recipes column into the SQL aggregate that selects it,
+        e.g. 'median(pts)' into an ordered-set aggregate over the points of
+        each game.
+        Args:
+            column: A stat_recipes column.
+            table: A prefix for the column names, e.g. 'p.'.
+        Returns:
+            The SQL expression.
+    """
+    agg, col = parse_column(column)
+    if agg == 'count':
+        return column
+    expr = column_expression(col, table)
+    if agg in ('sum', 'avg', 'max', 'min'):
+        return '{}({})'.format(agg, expr)
+    percentile = _percentile(agg)
+    if percentile is not None:
+        return 'percentile_cont({:g}) WITHIN GROUP (ORDER BY {})'.format(
+               percentile / 100.0, expr)
+    threshold = _threshold(agg)
+    if threshold is not None:
+        return 'count(*) FILTER (WHERE {} >= {})'.format(expr, threshold)
+    raise ValueError("Unknown aggregate {}".format(column))
+
+
+def column_values(values, col):
+    """ Returns:
+            The array of a stat or derived column, given a dictionary that
+            maps stat columns to arrays with NULLs as NaN.
+    """
+    terms = DERIVED_COLUMNS.get(col)
+    if terms is None:
+        return values[col]
+    return sum(weight * values[c] for c, weight in terms)
+
+
+def distribution_value(agg, col, values):
+    """ Computes a distribution aggregate the way postgres does. A
+        percentile interpolates linearly between the closest values, as
+        percentile_cont() does.
+        Args:
+            agg: The aggregate of a distribution column, e.g. 'p90'.
+            col: The stat or derived column.
+            values: An array of the column's non-NULL values.
+        Returns:
+            The typed value, which is None for an empty max(), min() or
+            percentile.
+    """
+    threshold = _threshold(agg)
+    if threshold is not None:
+        return int(np.count_nonzero(values >= threshold))
+    if len(values) == 0:
+        return None
+    if agg in ('max', 'min'):
+        value = values.max() if agg == 'max' else values.min()
+        return float(value) if col in FLOAT_COLUMNS else int(value)
+    return float(np.percentile(values, _percentile(agg)))
+
+
+def row_text_types(stats):
+    """ Types the values of several columns the way the Interpreter reads
+        them back from the text of a row: numerics become floats and whole
+        double precision values become ints.
+    """
+    typed = {}
+    for k, v in stats.items():
+        if isinstance(v, Decimal):
+            v = float(v)
+        elif isinstance(v, float) and v.is_integer():
+            v = int(v)
+        typed[k] = v
+    return typed
+
+
+def _base10000(n):
+    """ Returns:
+            The weight and first digit of a non-negative integer written in
+            base 10000, the way postgres stores numerics.
+    """
+    if n == 0:
+        return 0, 0
+    weight = 0
+    while n >= 10000**(weight+1):
+        weight += 1
+    return weight, n // 10000**weight
+
+
+def numeric_avg(total, count):
+    """ Divides an integer sum by a count the way postgres computes avg() of
+        an integer column, including the scale of the numeric result.
+        Args:
+            total: The integer sum.
+            count: The number of summed values.
+        Returns:
+            A Decimal equal to what psycopg2 returns for avg().
+    """
+    weight1, first1 = _base10000(abs(total))
+    weight2, first2 = _base10000(count)
+    qweight = weight1 - weight2
+    if first1 <= first2:
+        qweight -= 1
+    rscale = NUMERIC_MIN_SIG_DIGITS - qweight * 4
+    rscale = min(max(rscale, 0), NUMERIC_MAX_DISPLAY_SCALE)
+    with localcontext() as ctx:
+        ctx.prec = rscale + 40
+        quotient = Decimal(total) / Decimal(count)
+        return quotient.quantize(Decimal(1).scaleb(-rscale),
+                                 rounding=ROUND_HALF_UP)
+
+
+def _to_float(value):
+    """ Converts a column value to float, with None becoming NaN. """
+    if value is None:
+        return np.nan
+    if isinstance(value, datetime.date):
+        return float(value.toordinal())
+    return float(value)
+
+
+class ColumnarStore(object):
+    """ Holds the performance table as one block of NumPy columns per player,
+        sorted by game_date, and answers Interpreter queries from it. Date
+        bounds are found by binary search and the split conditions of an
+        EntityTable become vectorized masks. NULLs are stored as NaN and are
+        skipped by sum() and avg(), as in SQL. Appending replaces a player's
+        block as a whole, so readers always see a consistent block.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # maps a player id to a dictionary of column arrays
+        self._blocks = {}
+        self.row_count = 0
+
+
+    @classmethod
+    def from_cursor(cls, cursor, fetch_size=10000):
+        """ Loads the whole performance table.
+            Args:
+                cursor: A DB-API cursor.
+                fetch_size: The number of rows fetched at a time.
+            Returns:
+                A ColumnarStore.
+        """
+        store = cls()
+        cursor.execute("SELECT {} FROM performance;".format(
+                       ', '.join(PERFORMANCE_COLUMNS)))
+        rows = cursor.fetchmany(fetch_size)
+        while rows:
+            store.append(rows)
+            rows = cursor.fetchmany(fetch_size)
+        return store
+
+
+    def append(self, rows):
+        """ Adds performances, e.g. games the crawler has just inserted.
+            Args:
+                rows: Sequences of values in PERFORMANCE_COLUMNS order, such
+                    as the crawler's Performance tuples.
+        """
+        by_player = {}
+        for row in rows:
+            by_player.setdefault(row[0], []).append(row)
+        for player_id, player_rows in by_player.items():
+            new = np.array([[_to_float(v) for v in row[1:]]
+                            for row in player_rows], dtype=np.float64)
+            new = new.reshape(len(player_rows), len(PERFORMANCE_COLUMNS)-1)
+            with self._lock:
+                block = self._blocks.get(player_id)
+                if block is not None:
+                    old = np.column_stack([block[c] for c in
+                                           PERFORMANCE_COLUMNS[1:]])
+                    new = np.concatenate([old, new])
+                # a stable sort keeps games on the same date in insert order
+                new = new[np.argsort(new[:, 0], kind='mergesort')]
+                block = {c: new[:, i].copy() for i, c in
+                         enumerate(PERFORMANCE_COLUMNS[1:])}
+                self._blocks[player_id] = block
+                self.row_count += len(player_rows)
+
+
+    def on_insert(self, player_id, player_name, performances):
+        """ Appends the performances the crawler has just inserted for a
+            player. This has the signature of a crawler insert listener (see
+            BBR_Crawler.add_insert_listener).
+        """
+        self.append(performances)
+
+
+    def player_ids(self):
+        return list(self._blocks)
+
+
+    def _select(self, block, entity_table):
+        """ Finds the rows of a player block that match an EntityTable.
+            Returns:
+                The (lo, hi) bounds of the date range and a boolean mask over
+                the rows within it.
+        """
+        # game_date > start_date AND game_date < end_date
+        dates = block['game_date']
+        lo = np.searchsorted(dates, entity_table.start_date.toordinal(),
+                             side='right')
+        hi = np.searchsorted(dates, entity_table.end_date.toordinal(),
+                             side='left')
+        hi = max(lo, hi)
+        mask = np.ones(hi - lo, dtype=bool)
+        playoff_rd = block['playoff_rd'][lo:hi]
+        if entity_table.playoff_rd == 0:
+            mask &= playoff_rd == 0
+        else:
+            mask &= playoff_rd > 0
+        if entity_table.game_won is not None:
+            win_margin = block['win_margin'][lo:hi]
+            mask &= (win_margin > 0) if entity_table.game_won else \
+                    (win_margin < 0)
+        if entity_table.home_game is not None:
+            mask &= block['home'][lo:hi] == float(entity_table.home_game)
+        if entity_table.started_game is not None:
+            mask &= block['started'][lo:hi] == float(entity_table.started_game)
+        if entity_table.played_for:
+            mask &= block['team'][lo:hi] == entity_table.played_for
+        if entity_table.played_against:
+            mask &= block['opp'][lo:hi] == entity_table.played_against
+        return lo, hi, mask
+
+
+    def query(self, player_id, entity_table, columns):
+        """ Computes the aggregates an Interpreter would select from the
+            performance table.
+            Args:
+                player_id: The id of the queried player.
+                entity_table: The EntityTable with the query conditions.
+                columns: A list of stat_recipes columns such as 'sum(fg)',
+                    'avg(fg3)' or 'count(*)'.
+            Returns:
+                The rudimentary_stats dictionary for the Calculator, typed as
+                the SQL path returns it: a single avg() of an integer column
+                is a Decimal, while with several columns every value is
+                parsed from the row text, so averages are floats.
+        """
+        block = self._block(player_id)
+        lo, hi, mask = self._select(block, entity_table)
+        return self._aggregate(block, np.arange(lo, hi)[mask], columns)
+
+
+    def _block(self, player_id):
+        block = self._blocks.get(player_id)
+        if block is None:
+            block = {c: np.empty(0) for c in PERFORMANCE_COLUMNS[1:]}
+        return block
+
+
+    def _aggregate(self, block, index, columns):
+        """ Aggregates the rows of a player block at the positions in index.
+            Returns:
+                The rudimentary_stats dictionary, typed as in query().
+        """
+        stats = {}
+        for column in columns:
+            agg, col = parse_column(column)
+            if agg == 'count':
+                stats[column] = len(index)
+                continue
+            values = column_values(block, col)[index]
+            values = values[~np.isnan(values)]
+            if is_distribution(column):
+                stats[column] = distribution_value(agg, col, values)
+            elif len(values) == 0:
+                stats[column] = None
+            elif col in FLOAT_COLUMNS:
+                total = sum(values.tolist())
+                stats[column] = total if agg == 'sum' else total / len(values)
+            else:
+                total = int(values.sum())
+                stats[column] = (total if agg == 'sum' else
+                                 numeric_avg(total, len(values)))
+        if len(columns) > 1:
+            stats = row_text_types(stats)
+        return stats
+
+
+    def _group_keys(self, block, group_by, index):
+        """ Returns:
+                The group of each row at the positions in index, as a list of
+                the values group_query() selects for group_by.
+        """
+        if group_by in ('season', 'month'):
+            days = block['game_date'][index].astype(np.int64) - UNIX_ORDINAL
+            dates = days.astype('datetime64[D]')
+            years = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+            months = dates.astype('datetime64[M]').astype(np.int64) % 12 + 1
+            if group_by == 'season':
+                return (years + (months >= 7)).tolist()
+            return [datetime.date(y, m, 1) for y, m in
+                    zip(years.tolist(), months.tolist())]
+        col = GROUP_COLUMNS[group_by]
+        convert = bool if col == 'home' else int
+        return [None if np.isnan(v) else convert(v)
+                for v in block[col][index].tolist()]
+
+
+    def query_groups(self, player_id, entity_table, columns, group_by):
+        """ Computes the aggregates of query() for every group of a grouping
+            dimension in one pass over the player's rows.
+            Args:
+                player_id: The id of the queried player.
+                entity_table: The EntityTable with the query conditions.
+                columns: A list of stat_recipes columns.
+                group_by: One of EntityTable.GROUP_BY.
+            Returns:
+                A list of (group, rudimentary_stats) pairs ordered by group,
+                with the NULL group last, as group_query() returns them.
+        """
+        block = self._block(player_id)
+        lo, hi, mask = self._select(block, entity_table)
+        index = np.arange(lo, hi)[mask]
+        groups = {}
+        for i, key in zip(index.tolist(),
+                          self._group_keys(block, group_by, index)):
+            groups.setdefault(key, []).append(i)
+        order = sorted(k for k in groups if k is not None)
+        if None in groups:
+            order.append(None)
+        return [(k, self._aggregate(block, np.array(groups[k], dtype=np.int64),
+                                    columns))
+                for k in order]
+
+
+    def query_last(self, player_id, entity_table, columns, n):
+        """ Computes the aggregates of query() over only the last n games
+            that match entity_table.
+        """
+        block = self._block(player_id)
+        lo, hi, mask = self._select(block, entity_table)
+        return self._aggregate(block, np.arange(lo, hi)[mask][-n:], columns)
+
+
+    def game_values(self, player_id, entity_table, columns):
+        """ Returns:
+                The dates of the games that match entity_table in order, and
+                a dictionary mapping the stat column of each of columns to
+                its float64 array of values over those games, as the rows of
+                game_log_query() give them to game_values_from_rows().
+        """
+        block = self._block(player_id)
+        lo, hi, mask = self._select(block, entity_table)
+        index = np.arange(lo, hi)[mask]
+        dates = [datetime.date.fromordinal(int(d))
+                 for d in block['game_date'][index].tolist()]
+        return dates, {col: block[col][index]
+                       for col in stat_columns(columns)}
+
+
+    def game_list(self, player_id, entity_table, after=None, limit=None,
+                  min_points=None):
+        """ Lists the games that match entity_table, as game_list_query()
+            does, without copying the player's block.
+            Args:
+                player_id: The id of the queried player.
+                entity_table: The EntityTable with the query conditions.
+                after: The (game_date, player_id) key of the last game
+                    already listed, or None to start from the first game.
+                limit: The maximum number of games, or None for all.
+                min_points: Only list games with at least this many points.
+            Yields:
+                A tuple of GAME_LIST_COLUMNS values per game, typed as
+                psycopg2 returns them.
+        """
+        block = self._block(player_id)
+        lo, hi, mask = self._select(block, entity_table)
+        index = np.arange(lo, hi)[mask]
+        if after is not None and player_id <= after[1]:
+            # games on the key's date come before it
+            index = index[block['game_date'][index] > after[0].toordinal()]
+        elif after is not None:
+            index = index[block['game_date'][index] >= after[0].toordinal()]
+        points = column_values(block, 'pts')
+        if min_points is not None:
+            index = index[points[index] >= min_points]
+        if limit is not None:
+            index = index[:limit]
+        for i in index.tolist():
+            row = [player_id,
+                   datetime.date.fromordinal(int(block['game_date'][i]))]
+            for col in PERFORMANCE_COLUMNS[2:]:
+                value = block[col][i]
+                if np.isnan(value):
+                    row.append(None)
+                elif col in BOOLEAN_COLUMNS:
+                    row.append(bool(value))
+                elif col in FLOAT_COLUMNS:
+                    row.append(float(value))
+                else:
+                    row.append(int(value))
+            row.append(None if np.isnan(points[i]) else int(points[i]))
+            yield tuple(row)
+
+
+def stat_columns(columns):
+    """ Returns:
+            The sorted stat columns read by the aggregates in columns,
+            including those that derived columns add up.
+    """
+    cols = set()
+    for agg, col in map(parse_column, columns):
+        if agg != 'count':
+            cols.update(c for c, _ in DERIVED_COLUMNS.get(col, [(col, 1)]))
+    return sorted(cols)
+
+
+def last_games_query(columns, conditions_str, n):
+    """ Builds the query that selects columns, as the Interpreter's base query
+        does, over only the last n matching games.
+        Returns:
+            The query, which takes the start and end date as parameters.
+    """
+    return """
+        SELECT ({cols}) FROM (SELECT * FROM performance WHERE {conds}
+                              ORDER BY game_date DESC LIMIT {n}) last_games;
+        """.format(cols = ','.join(column_sql(c) for c in columns),
+                   conds = conditions_str, n = int(n))
+
+
+def game_log_query(columns, conditions_str):
+    """ Builds the query that selects, game by game in date order, the stat
+        columns that columns aggregate.
+        Returns:
+            The query, which takes the start and end date as parameters.
+    """
+    return """
+        SELECT game_date{cols} FROM performance WHERE {conds}
+        ORDER BY game_date;
+        """.format(cols = ''.join(', ' + c for c in stat_columns(columns)),
+                   conds = conditions_str)
+
+
+# lets each page of a player's game log start at its key instead of
+# scanning the games before it
+CREATE_GAME_LIST_INDEX = """
+    CREATE INDEX IF NOT EXISTS performance_player_game_idx
+    ON performance (player_id, game_date);
+    """
+
+
+def game_list_query(conditions_str, after=False, limit=None,
+                    min_points=None):
+    """ Builds the query that lists the matching games with every column
+        and their points, ordered by the (game_date, player_id) key, so that
+        each page starts right after the key of the last game listed. A
+        player plays at most one game a day, so the key is unique.
+        Args:
+            conditions_str: The condition string from the Interpreter.
+            after: A boolean that when true selects only games after a key.
+            limit: The maximum number of games, or None for all.
+            min_points: Only list games with at least this many points.
+        Returns:
+            The query, which takes the start and end date and, when after is
+            true, the game_date and player_id of the key as parameters.
+    """
+    conds = conditions_str
+    if after:
+        conds += " AND (game_date, player_id) > (%s, %s)"
+    if min_points is not None:
+        conds += " AND {} >= {}".format(column_expression('pts'),
+                                       int(min_points))
+    return """
+        SELECT {cols}, {pts} FROM performance WHERE {conds}
+        ORDER BY game_date, player_id{limit};
+        """.format(cols = ', '.join(PERFORMANCE_COLUMNS),
+                   pts = column_expression('pts'),
+                   conds = conds,
+                   limit = '' if limit is None else
+                           ' LIMIT {}'.format(int(limit)))
+
+
+def game_values_from_rows(columns, rows):
+    """ Turns the rows of game_log_query() into what game_values() returns.
+    """
+    dates = [row[0] for row in rows]
+    values = {}
+    for i, col in enumerate(stat_columns(columns)):
+        values[col] = np.array([_to_float(row[i+1]) for row in rows],
+                               dtype=np.float64)
+    return dates, values
+
+
+def rolling_series(dates, values, columns, size):
+    """ Computes the aggregates in columns over every window of size
+        consecutive games. Each sum or average is the difference of two
+        running sums, so it is O(games) however long the window. Distribution
+        aggregates such as 'median(pts)' look at every game of each window.
+        Args:
+            dates: The dates of the games in order.
+            values: A dictionary mapping stat columns to arrays over those
+                games, with NULLs as NaN, e.g. from game_values().
+            columns: A list of stat_recipes columns.
+            size: The number of games in a window.
+        Returns:
+            A list of (date of the last game, rudimentary_stats) pairs, one
+            per window, typed as ColumnarStore.query() types them.
+    """
+    n = len(dates)
+    if n < size:
+        return []
+    # running sums and non-NULL counts with a leading zero, so that a
+    # window ending at game j sums to running[j+1] - running[j+1-size]
+    windows = {}
+    distributions = {}
+    for column in columns:
+        agg, col = parse_column(column)
+        if agg == 'count':
+            continue
+        if is_distribution(column):
+            vals = column_values(values, col)
+            windows_of_col = (vals[j:j+size] for j in range(n-size+1))
+            distributions[column] = [
+                distribution_value(agg, col, window[~np.isnan(window)])
+                for window in windows_of_col]
+            continue
+        if col in windows:
+            continue
+        vals = column_values(values, col)
+        present = ~np.isnan(vals)
+        filled = np.where(present, vals, 0.0)
+        if col not in FLOAT_COLUMNS:
+            filled = filled.astype(np.int64)
+        totals = np.concatenate([[0], np.cumsum(filled)])
+        counts = np.concatenate([[0], np.cumsum(present)])
+        windows[col] = ((totals[size:] - totals[:-size]).tolist(),
+                        (counts[size:] - counts[:-size]).tolist())
+
+    series = []
+    for w in range(n - size + 1):
+        stats = {}
+        for column in columns:
+            agg, col = parse_column(column)
+            if agg == 'count':
+                stats[column] = size
+                continue
+            if column in distributions:
+                stats[column] = distributions[column][w]
+                continue
+            total, count = windows[col][0][w], windows[col][1][w]
+            if count == 0:
+                stats[column] = None
+            elif agg == 'sum':
+                stats[column] = total
+            elif col in FLOAT_COLUMNS:
+                stats[column] = total / count
+            else:
+                stats[column] = numeric_avg(total, count)
+        if len(columns) > 1:
+            stats = row_text_types(stats)
+        series.append((dates[w + size - 1], stats))
+    return series
+
+
+def group_query(columns, conditions_str, group_by):
+    """ Builds the query that aggregates columns over the performance rows
+        matching conditions_str for each group of group_by.
+        Returns:
+            The query, which takes the start and end date as parameters.
+    """
+    return """
+        SELECT {grp}, {cols} FROM performance WHERE {conds}
+        GROUP BY 1 ORDER BY 1 NULLS LAST;
+        """.format(grp = GROUP_EXPRESSIONS[group_by],
+                   cols = ', '.join(column_sql(c) for c in columns),
+                   conds = conditions_str)
+
+
+def group_rows(columns, rows):
+    """ Types the rows of group_query() as query() does.
+        Returns:
+            A list of (group, rudimentary_stats) pairs.
+    """
+    series = []
+    for row in rows:
+        stats = dict(zip(columns, row[1:]))
+        if len(columns) > 1:
+            stats = row_text_types(stats)
+        series.append((row[0], stats))
+    return series
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def load_columnar_store(cursor):
+    """ Loads the performance table and makes the Interpreters answer from
+        it instead of querying PostgreSQL.
+        Returns:
+            The new ColumnarStore.
+    """
+    global _store
+    store = ColumnarStore.from_cursor(cursor)
+    with _store_lock:
+        _store = store
+    return store
+
+
+def get_columnar_store():
+    """ Returns the process-wide ColumnarStore, or None if it has not been
+        loaded.
+    """
+    return _store
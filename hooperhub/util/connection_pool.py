@@ -0,0 +1,304 @@
+""" Thread-safe pool of DB-API connections shared by the Interpreters """
+
+import threading
+
+from collections import deque
+from contextlib import contextmanager
+from time import monotonic
+
+
+class PoolTimeout(Exception):
+    """ Raised when no connection becomes available in time. """
+    pass
+
+
+def ping(conn):
+    """ The default health check, which runs SELECT 1 on the connection.
+        Returns:
+            True if the connection is usable.
+    """
+    if getattr(conn, 'closed', False):
+        return False
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1;")
+        cursor.fetchone()
+        cursor.close()
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+class ConnectionPool(object):
+    """ Keeps between min_size and max_size open connections and hands them
+        out one caller at a time. Callers wait when every connection is in
+        use. A connection that has sat idle for health_interval seconds is
+        checked before it is handed out, and idle connections above min_size
+        are closed after max_idle seconds.
+    """
+
+    def __init__(self,
+                 connect,
+                 min_size=1,
+                 max_size=10,
+                 timeout=30.0,
+                 max_idle=300.0,
+                 health_interval=30.0,
+                 health_check=ping):
+        """ Creates the ConnectionPool and opens min_size connections.
+            Args:
+                connect: A function with no arguments that opens a DB-API
+                    connection, e.g. a partial of psycopg2.connect.
+                min_size: The number of connections kept open while idle.
+                max_size: The maximum number of open connections.
+                timeout: Seconds acquire() waits for a free connection.
+                max_idle: Seconds before an idle connection above min_size
+                    is closed.
+                health_interval: Seconds a connection may sit idle before it
+                    is checked again on checkout.
+                health_check: A function that takes a connection and returns
+                    whether it is usable.
+        """
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= "
+                             "max_size and max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.health_interval = health_interval
+        self.health_check = health_check
+
+        self._cond = threading.Condition(threading.Lock())
+        # idle (connection, last used) pairs, most recently used last
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+
+        self.acquire_count = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeout_count = 0
+        self.created_count = 0
+        self.discarded_count = 0
+        self.reaped_count = 0
+
+        for _ in range(min_size):
+            conn = self._open()
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, monotonic()))
+
+
+    def _open(self):
+        conn = self._connect()
+        with self._cond:
+            self.created_count += 1
+        return conn
+
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+    def acquire(self, timeout=None):
+        """ Takes a connection from the pool, opening a new one if none are
+            idle and the pool is below max_size.
+            Args:
+                timeout: Seconds to wait for a connection. Defaults to the
+                    pool's timeout.
+            Returns:
+                A DB-API connection that must be given back with release().
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = monotonic()
+        deadline = start + timeout
+        waited = False
+        while True:
+            conn, last_used = None, None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("The connection pool is closed.")
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        self.timeout_count += 1
+                        raise PoolTimeout("No connection available after "
+                                          "{:.1f}s.".format(timeout))
+                    waited = True
+                    self._cond.wait(remaining)
+                self._in_use += 1
+
+            if conn is None:
+                try:
+                    conn = self._open()
+                except Exception:
+                    self._forget()
+                    raise
+            elif (monotonic() - last_used >= self.health_interval and
+                  not self.health_check(conn)):
+                # replace the broken connection and try again
+                self._close(conn)
+                self._forget(discarded=True)
+                continue
+
+            wait = monotonic() - start
+            with self._cond:
+                self.acquire_count += 1
+                if waited:
+                    self.wait_count += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+            return conn
+
+
+    def _forget(self, discarded=False):
+        """ Drops an in-use slot for a connection that was closed or never
+            opened.
+        """
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            if discarded:
+                self.discarded_count += 1
+            self._cond.notify()
+
+
+    def release(self, conn, discard=False):
+        """ Gives a connection back to the pool. Any open transaction is
+            rolled back, and a connection that cannot be rolled back is
+            closed instead of being reused.
+            Args:
+                conn: A connection from acquire().
+                discard: A boolean that when true closes the connection.
+        """
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        if discard or self._closed:
+            self._close(conn)
+            self._forget(discarded=discard)
+        else:
+            with self._cond:
+                self._in_use -= 1
+                self._idle.append((conn, monotonic()))
+                self._cond.notify()
+        self.reap_idle()
+
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """ Context manager that acquires a connection and releases it on
+            exit. A connection broken by an error fails its rollback in
+            release() and is discarded there.
+        """
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+
+    def reap_idle(self):
+        """ Closes connections above min_size that have been idle for longer
+            than max_idle. This runs on every release.
+            Returns:
+                The number of connections closed.
+        """
+        now = monotonic()
+        reaped = []
+        with self._cond:
+            # the oldest idle connections are at the front
+            while (self._idle and self._size > self.min_size and
+                   now - self._idle[0][1] >= self.max_idle):
+                reaped.append(self._idle.popleft()[0])
+                self._size -= 1
+            self.reaped_count += len(reaped)
+        for conn in reaped:
+            self._close(conn)
+        return len(reaped)
+
+
+    def close(self):
+        """ Closes every idle connection and refuses new acquires. Connections
+            that are in use are closed when they are released.
+        """
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close(conn)
+
+
+    def stats(self):
+        """ Returns:
+                A dictionary with the pool size, the number of connections in
+                use and idle, utilization as the fraction of max_size in use,
+                acquire and wait counts, the mean and max wait in
+                milliseconds, and the number of timeouts and of connections
+                created, discarded and reaped.
+        """
+        with self._cond:
+            return {
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+                'utilization': self._in_use / self.max_size,
+                'acquires': self.acquire_count,
+                'waits': self.wait_count,
+                'avg_wait_ms': (self.wait_total / self.acquire_count * 1e3
+                                if self.acquire_count else 0.0),
+                'max_wait_ms': self.wait_max * 1e3,
+                'timeouts': self.timeout_count,
+                'created': self.created_count,
+                'discarded': self.discarded_count,
+                'reaped': self.reaped_count
+            }
+
+
+# sizes used for pools created by get_pool
+MIN_SIZE = 1
+MAX_SIZE = 10
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, connect):
+    """ Returns the process-wide pool for a database, creating it on first
+        use.
+        Args:
+            key: A hashable description of the database, such as its host,
+                port, name and user.
+            connect: A function with no arguments that opens a connection to
+                it.
+        Returns:
+            The ConnectionPool for key.
+    """
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(connect, MIN_SIZE, MAX_SIZE)
+                _pools[key] = pool
+    return pool
@@ -18,6 +18,14 @@ INPUT2ID_PATH = os.path.join(PROJECT_ROOT, 'hooperhub/data/pkl/input2id.pkl')
 TARGET2ID_PATH = os.path.join(PROJECT_ROOT, 'hooperhub/data/pkl/target2id.pkl')
 ID2INPUT_PATH = os.path.join(PROJECT_ROOT, 'hooperhub/data/pkl/id2input.pkl')
 ID2TARGET_PATH = os.path.join(PROJECT_ROOT, 'hooperhub/data/pkl/id2target.pkl')
+STAT_RECIPES_PATH = os.path.join(PROJECT_ROOT,
+                                 'hooperhub/data/pkl/stat_recipes.pkl')
+
+# phrase grammar and dictionaries used to generate the training data
+PHRASES_PATH = os.path.join(PROJECT_ROOT,
+                            'tools/synthetic_data/phrases.json')
+PLAYERS_PATH = os.path.join(PROJECT_ROOT, 'tools/synthetic_data/players.pkl')
+TEAMS_PATH = os.path.join(PROJECT_ROOT, 'tools/synthetic_data/teams.pkl')
 
 TRAINING_INPUT_PATH = os.path.join(PROJECT_ROOT,
                                    'hooperhub/data/training.in')
@@ -0,0 +1,353 @@
+""" Date and season recognition used by the Lexer before tagging.
+
+    Every word is classified once against precompiled patterns and lookup
+    tables, and 3-gram and 2-gram windows are then resolved from those
+    classes. The resolution rules follow dateutil's parser (month names,
+    ordinals, day/month/year ordering, two digit years and weekdays), which
+    the Lexer used to call on every n-gram with exceptions for control flow.
+    Times of day such as "3pm" or "30 minutes" are not treated as dates; they
+    never carried a date and only resolved to today.
+"""
+
+import re
+
+from calendar import monthrange
+from datetime import date, timedelta
+
+
+# mm/dd, mm/dd/yy and mm/dd/yyyy
+DATE_PATTERN = re.compile(r'^(0?[0-9]|1[0-2])/(0?[0-9]|1[0-9]|2[0-9]|3[0-1])'
+                          r'(?:/(\d\d|\d\d\d\d))?$')
+# YYYY-YY, YY-YY and YYYY season patterns
+LONG_SEASON_PATTERN = re.compile(r'^\d\d\d\d-\d\d$')
+SHORT_SEASON_PATTERN = re.compile(r'^\d\d-\d\d$')
+YEAR_PATTERN = re.compile(r'^\d\d\d\d$')
+# plain numbers and ordinals such as 3rd or 22nd
+NUMBER_PATTERN = re.compile(r'^(\d{1,4})(?:st|nd|rd|th)?$')
+
+MONTHS = {
+    'jan': 1, 'january': 1,
+    'feb': 2, 'february': 2,
+    'mar': 3, 'march': 3,
+    'apr': 4, 'april': 4,
+    'may': 5,
+    'jun': 6, 'june': 6,
+    'jul': 7, 'july': 7,
+    'aug': 8, 'august': 8,
+    'sep': 9, 'sept': 9, 'september': 9,
+    'oct': 10, 'october': 10,
+    'nov': 11, 'november': 11,
+    'dec': 12, 'december': 12,
+}
+WEEKDAYS = {
+    'mon': 0, 'monday': 0,
+    'tue': 1, 'tuesday': 1,
+    'wed': 2, 'wednesday': 2,
+    'thu': 3, 'thursday': 3,
+    'fri': 4, 'friday': 4,
+    'sat': 5, 'saturday': 5,
+    'sun': 6, 'sunday': 6,
+}
+# words that may sit between date parts without breaking the date
+JUMP_WORDS = frozenset(['-', '/', "'", ';', 'at', 'on', 'and', 'ad', 't',
+                        'of', 'st', 'nd', 'rd', 'th'])
+
+# word classes
+NUMBER, MONTH, WEEKDAY, JUMP, WORD, COMPOUND = range(6)
+COMPOUND_PATTERN = re.compile(r'^([a-z0-9]+)([-/])([a-z0-9]+)(?:\2([a-z0-9]+))?$')
+
+
+def classify_part(part):
+    """ Classifies one part of a hyphenated or slashed word such as 16-17 or
+        feb-3.
+        Returns:
+            A (class, value, century_specified, width) tuple, or None.
+    """
+    if part.isdigit():
+        return (NUMBER, int(part), len(part) > 2, len(part))
+    if part in MONTHS:
+        return (MONTH, MONTHS[part], False, 0)
+    return None
+
+
+def classify(word):
+    """ Classifies a word for date resolution.
+        Args:
+            word: A lowercase word from the sentence.
+        Returns:
+            A (class, value, century_specified, width) tuple, or None when the
+            word cannot be part of a date. Numbers carry their digit count as
+            the width. The value of a COMPOUND word is a tuple of its
+            classified parts followed by the separator.
+    """
+    if word in JUMP_WORDS:
+        return (JUMP, word, False, 0)
+    if word in MONTHS:
+        return (MONTH, MONTHS[word], False, 0)
+    if word in WEEKDAYS:
+        return (WEEKDAY, WEEKDAYS[word], False, 0)
+    match = NUMBER_PATTERN.match(word)
+    if match:
+        digits = match.group(1)
+        value = int(digits)
+        return (NUMBER, value, value > 100, len(digits))
+    if word.isalpha():
+        return (WORD, word, False, 0)
+    match = COMPOUND_PATTERN.match(word)
+    if match:
+        first, sep, second, third = match.groups()
+        parts = [classify_part(first), classify_part(second)]
+        if third is not None:
+            parts.append(classify_part(third))
+        # a month may only be the first or second part and may not follow
+        # another month, and the last of three parts must be a number
+        if (None not in parts and
+            (parts[0][0] == NUMBER or parts[1][0] == NUMBER) and
+            (len(parts) == 2 or parts[2][0] == NUMBER)):
+            return (COMPOUND, (tuple(parts), sep), False, 0)
+    return None
+
+
+def convert_year(year, century_specified, today):
+    """ Expands two digit years to the century closest to today. """
+    if year < 100 and not century_specified:
+        year += today.year // 100 * 100
+        if abs(year - today.year) >= 50:
+            if year < today.year:
+                year += 100
+            else:
+                year -= 100
+    return year
+
+
+def is_time(value, width):
+    """ Checks whether an HH or HHMM number is a valid time of day. """
+    if width == 4:
+        return value // 100 < 24 and value % 100 < 60
+    return value < 24
+
+
+def resolve_ymd(ymd, month_idx):
+    """ Decides which of up to three values are the year, month and day.
+        Args:
+            ymd: A list of numbers and month values in sentence order.
+            month_idx: The index of the value that came from a month name,
+                or -1 if there was none.
+        Returns:
+            A (year, month, day) tuple where missing parts are None.
+    """
+    year, month, day = None, None, None
+    if len(ymd) > 3:
+        raise ValueError("More than three YMD values")
+    if len(ymd) == 1 or (month_idx != -1 and len(ymd) == 2):
+        ymd = list(ymd)
+        if month_idx != -1:
+            month = ymd.pop(month_idx)
+        if ymd:
+            if ymd[0] > 31:
+                year = ymd[0]
+            else:
+                day = ymd[0]
+    elif len(ymd) == 2:
+        if ymd[0] > 31:
+            year, month = ymd
+        elif ymd[1] > 31:
+            month, year = ymd
+        else:
+            month, day = ymd
+    elif len(ymd) == 3:
+        if month_idx == 0:
+            month, day, year = ymd
+        elif month_idx == 1:
+            if ymd[0] > 31:
+                year, month, day = ymd
+            else:
+                day, month, year = ymd
+        elif month_idx == 2:
+            if ymd[1] > 31:
+                day, year, month = ymd
+            else:
+                year, day, month = ymd
+        elif ymd[0] > 31:
+            year, month, day = ymd
+        elif ymd[0] > 12:
+            day, month, year = ymd
+        else:
+            month, day, year = ymd
+    return year, month, day
+
+
+def resolve_window(classes, today):
+    """ Resolves a window of classified words into a date.
+        Args:
+            classes: A list of word classes from classify().
+            today: The date used to fill in missing parts.
+        Returns:
+            A date object, or None if the window is not a date.
+    """
+    ymd = []
+    month_idx = -1
+    century_specified = False
+    weekday = None
+
+    def add_parts(parts):
+        nonlocal month_idx, century_specified
+        for part_kind, part_value, part_century, _ in parts:
+            if part_kind == MONTH:
+                if month_idx != -1:
+                    return False
+                month_idx = len(ymd)
+            ymd.append(part_value)
+            century_specified = century_specified or part_century
+        return True
+
+    i = 0
+    while i < len(classes):
+        cls = classes[i]
+        if cls is None or cls[0] == WORD:
+            return None
+        kind, value, century, width = cls
+        if kind == NUMBER and len(ymd) == 3 and width in (2, 4):
+            # a fourth number reads as a time of day, which is dropped
+            if not is_time(value, width):
+                return None
+        elif kind == NUMBER:
+            ymd.append(value)
+            century_specified = century_specified or century
+        elif kind == COMPOUND:
+            parts, sep = value
+            first = parts[0]
+            if (len(ymd) == 3 and first[0] == NUMBER and
+                first[3] in (2, 4)):
+                # a time of day followed by a timezone offset
+                if (sep != '-' or len(parts) > 2 or parts[1][0] != NUMBER or
+                    not is_time(first[1], first[3])):
+                    return None
+            elif not add_parts(parts):
+                return None
+        elif kind == MONTH:
+            if month_idx != -1:
+                return None
+            ymd.append(value)
+            month_idx = len(ymd) - 1
+            # in <MONTH> of <WORD> the word is skipped, or read as the year
+            # when it is a number
+            following = classes[i+1:i+3]
+            if (len(following) == 2 and following[0] is not None and
+                following[0][:2] == (JUMP, 'of') and following[1] is not None):
+                kind, value = following[1][:2]
+                rest = ()
+                if kind == COMPOUND:
+                    # only the first part of the word is read as the year
+                    rest = value[0][1:]
+                    kind, value = value[0][0][:2]
+                if kind == NUMBER:
+                    ymd.append(convert_year(value, False, today))
+                    century_specified = True
+                if not add_parts(rest):
+                    return None
+                i += 3
+                continue
+        elif kind == WEEKDAY:
+            weekday = value
+        i += 1
+    if not ymd and weekday is None:
+        return None
+    try:
+        year, month, day = resolve_ymd(ymd, month_idx)
+        if year is not None:
+            year = convert_year(year, century_specified, today)
+        year = today.year if year is None else year
+        month = today.month if month is None else month
+        if day is None:
+            # fall back to the end of the month for short months
+            d = date(year, month, min(today.day, monthrange(year, month)[1]))
+        else:
+            d = date(year, month, day)
+    except ValueError:
+        return None
+    if weekday is not None and not day:
+        d += timedelta(days=(weekday - d.weekday()) % 7)
+    return d
+
+
+def parse_numeric_date(word, today):
+    """ Parses a mm/dd, mm/dd/yy or mm/dd/yyyy word.
+        Returns:
+            A date object, or None if the word is not a valid date.
+    """
+    match = DATE_PATTERN.match(word)
+    if not match:
+        return None
+    month, day, year = match.groups()
+    try:
+        if year is None:
+            return date(today.year, int(month), int(day))
+        return date(convert_year(int(year), len(year) > 2, today),
+                    int(month), int(day))
+    except ValueError:
+        return None
+
+
+def parse_season(word):
+    """ Parses a YYYY-YY, YY-YY or YYYY season word.
+        Returns:
+            The year the season started in, or None.
+    """
+    if LONG_SEASON_PATTERN.match(word):
+        return int(word[:4])
+    if SHORT_SEASON_PATTERN.match(word):
+        season = 1900 + int(word[:2])
+        if int(word[:2]) < 45:
+            season += 100
+        return season
+    if YEAR_PATTERN.match(word):
+        return int(word) - 1
+    return None
+
+
+def extract_dates(words, today=None):
+    """ Finds dates and seasons in a sentence and replaces the words of each
+        date with its DATE-A or DATE-B placeholder. The first date found is
+        DATE-A and any later date overwrites DATE-B. Numeric dates are found
+        first, then 3-word and 2-word dates from the end of the sentence
+        backwards, and finally seasons among the words that are left.
+        Args:
+            words: A list of lowercase words.
+            today: The date used to fill in missing date parts. Defaults to
+                date.today().
+        Returns:
+            The list of words with placeholders substituted and a dictionary
+            with the DATE-A and DATE-B dates, plus SEASON if one was found.
+    """
+    if today is None:
+        today = date.today()
+    words = list(words)
+    dates = {"DATE-A": None, "DATE-B": None}
+
+    def record(d):
+        key = "DATE-B" if dates["DATE-A"] else "DATE-A"
+        dates[key] = d
+        return key
+
+    for i, word in enumerate(words):
+        if '/' in word:
+            d = parse_numeric_date(word, today)
+            if d:
+                words[i] = record(d)
+
+    classes = [classify(word) for word in words]
+    s_len = len(words)
+    for n in (3, 2):
+        for end in range(s_len, n-1, -1):
+            d = resolve_window(classes[end-n:end], today)
+            if d:
+                words[end-n:end] = [record(d)]*n
+                classes[end-n:end] = [None]*n
+
+    for word in words:
+        season = parse_season(word)
+        if season is not None:
+            dates["SEASON"] = season
+
+    return words, dates
@@ -8,6 +8,15 @@ class EntityTable(object):
         stored in this class.
     """
 
+    # entities that decide the result of a query, in the order used by key()
+    KEY_FIELDS = ['stats', 'player_name', 'playoff_rd', 'start_date',
+                  'end_date', 'game_won', 'home_game', 'started_game',
+                  'played_for', 'played_against', 'group_by', 'last_games',
+                  'rolling_window', 'leaders', 'min_games', 'game_log',
+                  'min_points']
+    # dimensions a query can be broken down by into a series
+    GROUP_BY = ['season', 'month', 'opponent', 'home', 'playoff_rd']
+
     def __init__(self):
         """ Creates a EntityTable object and sets some defaults.
         """
@@ -24,6 +33,19 @@ class EntityTable(object):
         self._entity_dict['started_game'] = None
         self._entity_dict['played_for'] = None
         self._entity_dict['played_against'] = None
+        self._entity_dict['group_by'] = None
+        # only the last n matching games, or a series over every window of
+        # n consecutive games
+        self._entity_dict['last_games'] = None
+        self._entity_dict['rolling_window'] = None
+        # rank the top n players in the league instead of one player, out of
+        # those with at least min_games games
+        self._entity_dict['leaders'] = None
+        self._entity_dict['min_games'] = None
+        # list the matching games one by one instead of aggregating them,
+        # optionally only those with at least min_points points
+        self._entity_dict['game_log'] = None
+        self._entity_dict['min_points'] = None
 
 
     def __iter__(self):
@@ -32,6 +54,15 @@ class EntityTable(object):
                 yield k, v
 
 
+    def key(self):
+        """ Returns:
+                A hashable tuple of the entities in KEY_FIELDS. EntityTables
+                with equal keys make the same query.
+        """
+        return tuple(tuple(self._entity_dict[k]) if k == 'stats'
+                     else self._entity_dict[k] for k in self.KEY_FIELDS)
+
+
     def get_stats(self):
         return self._entity_dict['stats']
 
@@ -142,3 +173,83 @@ class EntityTable(object):
         self._entity_dict['played_against'] = value
 
 
+    @property
+    def group_by(self):
+        return self._entity_dict['group_by']
+
+
+    @group_by.setter
+    def group_by(self, value):
+        if value is not None and value not in self.GROUP_BY:
+            raise ValueError("Cannot group by {}".format(value))
+        self._entity_dict['group_by'] = value
+
+
+    @property
+    def last_games(self):
+        return self._entity_dict['last_games']
+
+
+    @last_games.setter
+    def last_games(self, value):
+        if value is not None and value < 1:
+            raise ValueError("last_games must be positive")
+        self._entity_dict['last_games'] = value
+
+
+    @property
+    def rolling_window(self):
+        return self._entity_dict['rolling_window']
+
+
+    @rolling_window.setter
+    def rolling_window(self, value):
+        if value is not None and value < 1:
+            raise ValueError("rolling_window must be positive")
+        self._entity_dict['rolling_window'] = value
+
+
+    @property
+    def leaders(self):
+        return self._entity_dict['leaders']
+
+
+    @leaders.setter
+    def leaders(self, value):
+        if value is not None and value < 1:
+            raise ValueError("leaders must be positive")
+        self._entity_dict['leaders'] = value
+
+
+    @property
+    def min_games(self):
+        return self._entity_dict['min_games']
+
+
+    @min_games.setter
+    def min_games(self, value):
+        if value is not None and value < 1:
+            raise ValueError("min_games must be positive")
+        self._entity_dict['min_games'] = value
+
+
+    @property
+    def game_log(self):
+        return self._entity_dict['game_log']
+
+
+    @game_log.setter
+    def game_log(self, value):
+        self._entity_dict['game_log'] = value
+
+
+    @property
+    def min_points(self):
+        return self._entity_dict['min_points']
+
+
+    @min_points.setter
+    def min_points(self, value):
+        if value is not None and value < 0:
+            raise ValueError("min_points cannot be negative")
+        self._entity_dict['min_points'] = value
@@ -0,0 +1,271 @@
+""" League-wide leaderboards built from the split rollups """
+
+import threading
+
+import numpy as np
+
+from time import monotonic
+
+from hooperhub.util.calculator import STATS, calculate_arrays
+from hooperhub.util.columnar import (STAT_COLUMNS, FLOAT_COLUMNS, parse_column,
+                                     is_distribution)
+from hooperhub.util.rollups import FIND_ROLLUP_VERSION, SELECT_ROLLUP_VERSION
+
+
+# stats where the lowest value leads the league
+LOWER_IS_BETTER = frozenset(['drtg'])
+
+# stats that divide totals, so their values are not whole numbers
+RATIO_STATS = frozenset(['fg_pct', 'fg2_pct', 'fg3_pct', 'ft_pct', 'ts'])
+
+SELECT_PLAYER_SPLITS = """
+    SELECT season, in_window, playoff, home, player_id,
+           sum(games)::bigint, {aggregates}
+    FROM performance_rollup
+    GROUP BY 1, 2, 3, 4, 5;
+    """.format(aggregates=', '.join(
+                   'sum(sum_{0})::float8, sum(n_{0})::bigint'.format(c)
+                   for c in STAT_COLUMNS))
+
+
+def rankable(stat):
+    """ Returns:
+            True if a stat can be computed from rollup totals, which
+            distribution stats such as 'med_pts' cannot.
+    """
+    return not any(map(is_distribution, STATS[stat].columns))
+
+
+def _is_integer_stat(stat):
+    """ Returns:
+            True if a stat only adds up totals of integer columns, so its
+            league-wide values are whole numbers.
+    """
+    if stat in RATIO_STATS:
+        return False
+    return all(parse_column(c)[0] in ('sum', 'count') and
+               parse_column(c)[1] not in FLOAT_COLUMNS
+               for c in STATS[stat].columns)
+
+
+class LeaderboardIndex(object):
+    """ Ranks every player in the league by any stat for a season or a
+        career, in the playoffs or the regular season and at home, away or
+        both. The index holds each player's totals per season and split from
+        performance_rollup as NumPy arrays, so a leaderboard is a masked
+        bincount and one vectorized evaluation of the stat, and never scans
+        the performance table. Rankings are kept until the next refresh, which
+        reloads everything every refresh_interval seconds, after mark_stale()
+        or as soon as rollup_version shows that another process, such as the
+        crawler, has changed the rollups.
+    """
+
+    def __init__(self, refresh_interval=600.0):
+        """ Creates an empty LeaderboardIndex.
+            Args:
+                refresh_interval: Seconds before the index is considered
+                    stale and reloaded by refresh_if_stale().
+        """
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        # the rollup_version the splits were read at, or None if the
+        # database has no rollup_version
+        self.version = None
+        self._splits = None
+        # maps (stat, season, playoff, home, min_games) to the player ids and
+        # values of a full ranking
+        self._rankings = {}
+
+
+    @property
+    def stale(self):
+        loaded_at = self._loaded_at
+        return (loaded_at is None or
+                monotonic() - loaded_at >= self.refresh_interval)
+
+
+    def refresh(self, cursor):
+        """ Reloads the per-player splits from performance_rollup.
+            Args:
+                cursor: A DB-API cursor.
+        """
+        version = None
+        cursor.execute(FIND_ROLLUP_VERSION)
+        if cursor.fetchone()[0] is not None:
+            cursor.execute(SELECT_ROLLUP_VERSION)
+            version = cursor.fetchone()[0]
+        cursor.execute(SELECT_PLAYER_SPLITS)
+        self.load(cursor.fetchall(), version)
+
+
+    def load(self, rows, version=None):
+        """ Replaces the index with the rows of SELECT_PLAYER_SPLITS, read
+            at the given rollup_version.
+        """
+        n = len(rows)
+        width = 6 + 2*len(STAT_COLUMNS)
+        columns = list(zip(*rows)) if rows else [()] * width
+        splits = {
+            'season': np.array(columns[0], dtype=np.int64).reshape(n),
+            'in_window': np.array(columns[1], dtype=bool).reshape(n),
+            'playoff': np.array(columns[2], dtype=bool).reshape(n),
+            'home': np.array(columns[3], dtype=np.int64).reshape(n),
+            'player_id': np.array(columns[4], dtype=np.int64).reshape(n),
+            'games': np.array(columns[5], dtype=np.float64).reshape(n)
+        }
+        for i, col in enumerate(STAT_COLUMNS):
+            splits['sum_' + col] = np.array(columns[6 + 2*i],
+                                            dtype=np.float64).reshape(n)
+            splits['n_' + col] = np.array(columns[7 + 2*i],
+                                          dtype=np.float64).reshape(n)
+        with self._lock:
+            self._splits = splits
+            self._rankings = {}
+            self._loaded_at = monotonic()
+            self.version = version
+
+
+    def outdated(self, version):
+        """ Marks the index stale if the rollups have changed since it was
+            loaded.
+            Args:
+                version: The current rollup_version.
+            Returns:
+                True if the index is stale.
+        """
+        if version != self.version:
+            self.mark_stale()
+        return self.stale
+
+
+    def refresh_if_stale(self, cursor):
+        """ Reloads the index if it is stale or the rollups have changed,
+            which costs one single-row query when they have not.
+            Returns:
+                True if the index was reloaded.
+        """
+        if not self.stale:
+            if self.version is None:
+                return False
+            cursor.execute(SELECT_ROLLUP_VERSION)
+            if not self.outdated(cursor.fetchone()[0]):
+                return False
+        self.refresh(cursor)
+        return True
+
+
+    def mark_stale(self):
+        """ Makes the next refresh_if_stale() reload the index, e.g. after
+            performances were inserted in this process.
+        """
+        with self._lock:
+            self._loaded_at = None
+
+
+    def _player_totals(self, splits, season, playoff, home):
+        """ Adds up each player's splits that match the filters.
+            Returns:
+                The player ids, and a dictionary mapping the aggregate
+                columns of stat_recipes to arrays over those players.
+        """
+        mask = splits['playoff'] == playoff
+        if season is not None:
+            mask &= (splits['season'] == season) & splits['in_window']
+        if home is not None:
+            mask &= splits['home'] == (1 if home else 0)
+        player_ids, players = np.unique(splits['player_id'][mask],
+                                        return_inverse=True)
+        size = len(player_ids)
+
+        def total(name):
+            return np.bincount(players, weights=splits[name][mask],
+                               minlength=size)
+
+        games = total('games')
+        arrays = {'count(*)': games}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for col in STAT_COLUMNS:
+                sums, counts = total('sum_' + col), total('n_' + col)
+                arrays['sum({})'.format(col)] = np.where(counts > 0, sums,
+                                                         np.nan)
+                arrays['avg({})'.format(col)] = sums / counts
+        return player_ids, arrays
+
+
+    def ranking(self, stat, season=None, playoff=False, home=None,
+                min_games=1):
+        """ Ranks every qualified player by a stat.
+            Args:
+                stat: The name of a stat in STAT_DEFINITIONS.
+                season: The year the season starts in, or None for careers.
+                playoff: A boolean that when true ranks playoff games.
+                home: True or False to only count home or away games.
+                min_games: The number of games a player needs to qualify.
+            Returns:
+                The player ids and their values, best first.
+        """
+        if not rankable(stat):
+            raise ValueError("{} cannot be ranked from the rollups".format(
+                             stat))
+        key = (stat, season, playoff, home, min_games)
+        ranked = self._rankings.get(key)
+        if ranked is not None:
+            return ranked
+        splits = self._splits
+        if splits is None:
+            raise KeyError("The leaderboard has not been loaded.")
+        player_ids, arrays = self._player_totals(splits, season, playoff,
+                                                 home)
+        values = calculate_arrays([stat], arrays)[stat]
+        qualified = np.isfinite(values) & (arrays['count(*)'] >= min_games)
+        player_ids, values = player_ids[qualified], values[qualified]
+        order = np.argsort(values if stat in LOWER_IS_BETTER else -values,
+                           kind='mergesort')
+        ranked = (player_ids[order], values[order])
+        with self._lock:
+            if self._splits is splits:
+                self._rankings[key] = ranked
+        return ranked
+
+
+    def top(self, stat, k=10, **filters):
+        """ Returns:
+                A list of the (player id, value) pairs of the k leaders in a
+                stat, taking the filters of ranking().
+        """
+        player_ids, values = self.ranking(stat, **filters)
+        integer = _is_integer_stat(stat)
+        return [(int(p), int(v) if integer else float(v))
+                for p, v in zip(player_ids[:k].tolist(), values[:k].tolist())]
+
+
+    def precompute(self, stats=None, min_games=1):
+        """ Ranks the players in every season and over careers for each stat
+            with the default splits, so that those leaderboards are answered
+            from memory.
+        """
+        splits = self._splits
+        if splits is None:
+            return
+        seasons = [None] + sorted(set(splits['season'].tolist()))
+        for stat in stats or sorted(filter(rankable, STATS)):
+            for season in seasons:
+                for playoff in (False, True):
+                    self.ranking(stat, season, playoff, min_games=min_games)
+
+
+_leaderboard = None
+_leaderboard_lock = threading.Lock()
+
+
+def get_leaderboard():
+    """ Returns the process-wide LeaderboardIndex, creating it on first use.
+        It is empty until it is first refreshed with a cursor.
+    """
+    global _leaderboard
+    if _leaderboard is None:
+        with _leaderboard_lock:
+            if _leaderboard is None:
+                _leaderboard = LeaderboardIndex()
+    return _leaderboard
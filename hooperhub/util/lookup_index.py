@@ -0,0 +1,163 @@
+""" In-process index of the player and team tables """
+
+import threading
+
+from time import monotonic
+
+
+SELECT_PLAYERS = """ SELECT player_id, name FROM player; """
+SELECT_TEAMS = """ SELECT team_id, abbr FROM team; """
+
+
+class LookupIndex(object):
+    """ Maps player names to player ids and team ids to abbreviations (and
+        back) so that interpreting a query needs no lookup round trips. The
+        player and team tables are small and rarely change, so the index is
+        reloaded in full every refresh_interval seconds or after mark_stale().
+        A reload builds new dictionaries and swaps them in at once, so readers
+        never see a partially loaded index.
+    """
+
+    def __init__(self, refresh_interval=3600.0):
+        """ Creates an empty LookupIndex.
+            Args:
+                refresh_interval: Seconds before the index is considered
+                    stale and reloaded by refresh_if_stale().
+        """
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        # (exact names, casefolded names, team id -> abbr, abbr -> team id,
+        # player id -> name)
+        self._maps = ({}, {}, {}, {}, {})
+
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+
+    def refresh(self, cursor):
+        """ Reloads the index from the player and team tables.
+            Args:
+                cursor: A DB-API cursor to read the tables with.
+        """
+        cursor.execute(SELECT_PLAYERS)
+        players = cursor.fetchall()
+        cursor.execute(SELECT_TEAMS)
+        teams = cursor.fetchall()
+        self.load(players, teams)
+
+
+    def load(self, players, teams):
+        """ Replaces the index with the rows of SELECT_PLAYERS and
+            SELECT_TEAMS, e.g. when they were fetched asynchronously.
+        """
+        exact, folded = {}, {}
+        ambiguous = set()
+        for player_id, name in players:
+            exact[name] = player_id
+            key = name.casefold()
+            if key in folded and folded[key] != player_id:
+                ambiguous.add(key)
+            folded[key] = player_id
+        # names that only differ by case are left to the exact lookup
+        for key in ambiguous:
+            del folded[key]
+        team_abbrs = {team_id: abbr for team_id, abbr in teams}
+        team_ids = {abbr.casefold(): team_id for team_id, abbr in teams}
+        names = {player_id: name for player_id, name in players}
+
+        with self._lock:
+            self._maps = (exact, folded, team_abbrs, team_ids, names)
+            self._loaded_at = monotonic()
+
+
+    @property
+    def stale(self):
+        """ True if the index was never loaded, was marked stale or is older
+            than refresh_interval.
+        """
+        loaded_at = self._loaded_at
+        return (loaded_at is None or
+                monotonic() - loaded_at >= self.refresh_interval)
+
+
+    def refresh_if_stale(self, cursor):
+        """ Reloads the index if it is stale.
+            Returns:
+                True if the index was reloaded.
+        """
+        if not self.stale:
+            return False
+        self.refresh(cursor)
+        return True
+
+
+    def mark_stale(self):
+        """ Makes the next refresh_if_stale() reload the index, e.g. after the
+            crawler has added players or teams.
+        """
+        with self._lock:
+            self._loaded_at = None
+
+
+    def player_id(self, player_name):
+        """ Returns:
+                The id of the player with the given name, matched exactly and
+                then without regard to case, or None.
+        """
+        exact, folded = self._maps[0], self._maps[1]
+        player_id = exact.get(player_name)
+        if player_id is None:
+            player_id = folded.get(player_name.casefold())
+        return player_id
+
+
+    def player_name(self, player_id):
+        """ Returns:
+                The name of the player with the given id, or None.
+        """
+        return self._maps[4].get(player_id)
+
+
+    def team_abbr(self, team_id):
+        """ Returns:
+                The abbreviation of the team with the given id, or None.
+        """
+        return self._maps[2].get(team_id)
+
+
+    def team_id(self, team_abbr):
+        """ Returns:
+                The id of the team with the given abbreviation in any case,
+                or None.
+        """
+        return self._maps[3].get(team_abbr.casefold())
+
+
+    def add_team(self, team_id, team_abbr):
+        """ Adds a team that was just inserted into the team table. """
+        with self._lock:
+            exact, folded, team_abbrs, team_ids, names = self._maps
+            team_abbrs = dict(team_abbrs)
+            team_ids = dict(team_ids)
+            team_abbrs[team_id] = team_abbr
+            team_ids[team_abbr.casefold()] = team_id
+            self._maps = (exact, folded, team_abbrs, team_ids, names)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_lookup_index():
+    """ Returns the process-wide LookupIndex, creating it on first use. It
+        is empty until it is first refreshed with a cursor.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LookupIndex()
+    return _index
@@ -0,0 +1,228 @@
+""" Two-level cache for repeated queries """
+
+import threading
+
+from collections import OrderedDict
+from time import monotonic
+
+from hooperhub.util.entity_table import EntityTable
+
+
+class LRUCache(object):
+    """ A thread-safe mapping with a bounded number of entries. The least
+        recently used entry is evicted when the cache is full, and entries
+        older than ttl seconds are treated as missing.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300.0, clock=monotonic):
+        """ Creates the LRUCache.
+            Args:
+                max_entries: The maximum number of entries kept. A cache with
+                    no entries stores nothing.
+                ttl: The number of seconds an entry stays valid, or None for
+                    no expiry.
+                clock: A function returning the current time in seconds.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # maps a key to an (expiry time, value) pair, oldest use first
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def get(self, key, default=None):
+        """ Gets the value stored for key and marks it as recently used.
+            Returns:
+                The value, or default if the key is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires, value = entry
+            if expires is not None and expires <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+
+    def put(self, key, value):
+        """ Stores a value, evicting the least recently used entries if the
+            cache is full.
+        """
+        if self.max_entries <= 0:
+            return
+        expires = None if self.ttl is None else self._clock() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+    def invalidate(self, predicate):
+        """ Removes every entry whose key satisfies predicate.
+            Returns:
+                The number of entries removed.
+        """
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+    def stats(self):
+        """ Returns:
+                A dictionary with the size of the cache, its hit and miss
+                counts, the hit rate and the number of evicted and expired
+                entries.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+class QueryCache(object):
+    """ Caches the two expensive steps of answering a query. The tag cache
+        maps the normalized sentence (the vocabulary words left after
+        Lexer._prepare_sentence) to its decoded tags; dates are replaced by
+        placeholders before tagging, so the tags do not depend on them. The
+        result cache maps EntityTable.key() to the pair returned by
+        Interpreter.__call__.
+    """
+
+    def __init__(self,
+                 max_tags=4096,
+                 tag_ttl=3600.0,
+                 max_results=1024,
+                 result_ttl=300.0):
+        """ Creates the QueryCache.
+            Args:
+                max_tags: The maximum number of sentences in the tag cache.
+                tag_ttl: Seconds a cached list of tags stays valid.
+                max_results: The maximum number of results in the result
+                    cache.
+                result_ttl: Seconds a cached result stays valid.
+        """
+        self.tags = LRUCache(max_tags, tag_ttl)
+        self.results = LRUCache(max_results, result_ttl)
+
+
+    def get_tags(self, sentence_txt):
+        """ Returns:
+                A list of tags for the sentence words, or None on a miss.
+        """
+        tags = self.tags.get(tuple(sentence_txt))
+        return None if tags is None else list(tags)
+
+
+    def put_tags(self, sentence_txt, tags):
+        self.tags.put(tuple(sentence_txt), tuple(tags))
+
+
+    def get_result(self, key):
+        """ Args:
+                key: The EntityTable.key() of the query.
+            Returns:
+                A copy of the cached (condition_entitys, result_entitys)
+                pair, or None on a miss.
+        """
+        result = self.results.get(key)
+        if result is None:
+            return None
+        return result[0].copy(), result[1].copy()
+
+
+    def put_result(self, key, result):
+        self.results.put(key, (result[0].copy(), result[1].copy()))
+
+
+    def invalidate_player(self, player_name):
+        """ Drops every cached result about a player. Names are compared
+            casefolded, as LookupIndex resolves them, so results cached for
+            "lebron james" are dropped for "LeBron James".
+            Returns:
+                The number of results removed.
+        """
+        idx = EntityTable.KEY_FIELDS.index('player_name')
+        folded = player_name.casefold()
+        return self.results.invalidate(
+            lambda key: key[idx] is not None and
+                        key[idx].casefold() == folded)
+
+
+    def on_insert(self, player_id, player_name, performances):
+        """ Drops the cached results about a player after new performances
+            were inserted for them. This has the signature of a crawler insert
+            listener (see BBR_Crawler.add_insert_listener).
+            Returns:
+                The number of results removed.
+        """
+        return self.invalidate_player(player_name)
+
+
+    def clear_tags(self):
+        """ Drops every cached list of tags, e.g. after a new model has been
+            loaded.
+        """
+        self.tags.clear()
+
+
+    def stats(self):
+        return {'tags': self.tags.stats(), 'results': self.results.stats()}
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def configure_query_cache(max_tags=4096,
+                          tag_ttl=3600.0,
+                          max_results=1024,
+                          result_ttl=300.0):
+    """ Replaces the process-wide QueryCache. Sizes of 0 turn a level off.
+        Returns:
+            The new QueryCache.
+    """
+    global _query_cache
+    with _query_cache_lock:
+        _query_cache = QueryCache(max_tags, tag_ttl, max_results, result_ttl)
+    return _query_cache
+
+
+def get_query_cache():
+    """ Returns the process-wide QueryCache, creating it on first use. """
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryCache()
+    return _query_cache
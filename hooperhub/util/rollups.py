@@ -0,0 +1,277 @@
+""" Pre-aggregated split rollups of the performance table """
+
+import os
+import datetime
+
+from hooperhub.util.columnar import (PERFORMANCE_COLUMNS, STAT_COLUMNS,
+                                     FLOAT_COLUMNS, numeric_avg, parse_column,
+                                     is_distribution, row_text_types)
+
+
+# set HH_ROLLUPS=1 once performance_rollup has been built
+ENABLED = os.environ.get('HH_ROLLUPS', '0') == '1'
+
+# a row of performance_rollup aggregates every game of a player that shares
+# these values
+ROLLUP_KEY = ['player_id', 'season', 'in_window', 'playoff', 'home',
+              'started', 'win', 'opp']
+
+CREATE_ROLLUP_TABLE = """
+    CREATE TABLE IF NOT EXISTS performance_rollup (
+        player_id integer NOT NULL,
+        season integer NOT NULL,
+        in_window boolean NOT NULL,
+        playoff boolean NOT NULL,
+        home smallint NOT NULL,
+        started smallint NOT NULL,
+        win smallint NOT NULL,
+        opp integer NOT NULL,
+        games bigint NOT NULL,
+        first_game date NOT NULL,
+        last_game date NOT NULL,
+        {stat_columns},
+        PRIMARY KEY ({key})
+    );
+    """.format(stat_columns=',\n        '.join(
+                   'sum_{0} {1} NOT NULL DEFAULT 0, '
+                   'n_{0} bigint NOT NULL DEFAULT 0'.format(
+                       c, 'float8' if c in FLOAT_COLUMNS else 'bigint')
+                   for c in STAT_COLUMNS),
+               key=', '.join(ROLLUP_KEY))
+
+AGGREGATE_COLUMNS = (['games', 'first_game', 'last_game'] +
+                     ['{}_{}'.format(agg, c) for c in STAT_COLUMNS
+                      for agg in ('sum', 'n')])
+
+UPSERT_ROLLUP = """
+    INSERT INTO performance_rollup ({columns}) VALUES ({values})
+    ON CONFLICT ({key}) DO UPDATE SET
+        games = r.games + EXCLUDED.games,
+        first_game = LEAST(r.first_game, EXCLUDED.first_game),
+        last_game = GREATEST(r.last_game, EXCLUDED.last_game),
+        {sums};
+    """.replace('performance_rollup', 'performance_rollup AS r', 1).format(
+        columns=', '.join(ROLLUP_KEY + AGGREGATE_COLUMNS),
+        values=', '.join(['%s'] * (len(ROLLUP_KEY) + len(AGGREGATE_COLUMNS))),
+        key=', '.join(ROLLUP_KEY),
+        sums=',\n        '.join('{0} = r.{0} + EXCLUDED.{0}'.format(c)
+                                for c in AGGREGATE_COLUMNS[3:]))
+
+# a single row counting the changes to performance_rollup, so that query
+# servers in other processes can tell that their leaderboards are out of date
+CREATE_ROLLUP_VERSION = """
+    CREATE TABLE IF NOT EXISTS rollup_version (
+        id boolean PRIMARY KEY DEFAULT true CHECK (id),
+        version bigint NOT NULL DEFAULT 0
+    );
+    INSERT INTO rollup_version DEFAULT VALUES ON CONFLICT DO NOTHING;
+    """
+
+FIND_ROLLUP_VERSION = "SELECT to_regclass('rollup_version');"
+
+SELECT_ROLLUP_VERSION = "SELECT version FROM rollup_version;"
+
+BUMP_ROLLUP_VERSION = "UPDATE rollup_version SET version = version + 1;"
+
+# the season keys below are computed in SQL exactly as season_key() does
+REBUILD_ROLLUPS = """
+    INSERT INTO performance_rollup ({columns})
+    SELECT player_id, season,
+           game_date > make_date(season, 10, 1) AND
+           game_date < make_date(season+1, 7, 1),
+           playoff_rd > 0,
+           CASE WHEN home THEN 1 WHEN NOT home THEN 0 ELSE -1 END,
+           CASE WHEN started THEN 1 WHEN NOT started THEN 0 ELSE -1 END,
+           CASE WHEN win_margin > 0 THEN 1 WHEN win_margin < 0 THEN -1
+                ELSE 0 END,
+           opp,
+           count(*), min(game_date), max(game_date),
+           {aggregates}
+    FROM (SELECT *, CASE WHEN extract(month FROM game_date) >= 7
+                         THEN extract(year FROM game_date)::integer
+                         ELSE extract(year FROM game_date)::integer - 1
+                    END AS season
+          FROM performance) p
+    GROUP BY 1, 2, 3, 4, 5, 6, 7, 8;
+    """.format(columns=', '.join(ROLLUP_KEY + AGGREGATE_COLUMNS),
+               aggregates=',\n           '.join(
+                   'coalesce(sum({0}), 0), count({0})'.format(c)
+                   for c in STAT_COLUMNS))
+
+
+def season_key(game_date):
+    """ Buckets a game by season. Seasons run from July 1 to June 30, and a
+        game is in the season window when Oct 1 < game_date < Jul 1, which
+        are the bounds the Lexer gives a season query.
+        Returns:
+            The year the season starts in and whether the game is in its
+            window.
+    """
+    season = game_date.year if game_date.month >= 7 else game_date.year - 1
+    in_window = (datetime.date(season, 10, 1) < game_date <
+                 datetime.date(season+1, 7, 1))
+    return season, in_window
+
+
+def _flag(value):
+    """ Encodes a nullable boolean as 1, 0 or -1. """
+    if value is None:
+        return -1
+    return 1 if value else 0
+
+
+def _number(value, col):
+    """ Converts a scraped stat, which may be an empty string, to a number
+        or None.
+    """
+    if value is None or value == '':
+        return None
+    return float(value) if col in FLOAT_COLUMNS else int(value)
+
+
+def rollup_groups(performances):
+    """ Aggregates performances into rollup rows.
+        Args:
+            performances: Sequences of values in PERFORMANCE_COLUMNS order,
+                such as the crawler's Performance tuples.
+        Returns:
+            A dictionary mapping each rollup key tuple to a dictionary of its
+            AGGREGATE_COLUMNS.
+    """
+    idx = {c: i for i, c in enumerate(PERFORMANCE_COLUMNS)}
+    groups = {}
+    for p in performances:
+        game_date = p[idx['game_date']]
+        season, in_window = season_key(game_date)
+        win_margin = p[idx['win_margin']]
+        win = 0
+        if win_margin is not None and int(win_margin) != 0:
+            win = 1 if int(win_margin) > 0 else -1
+        key = (p[idx['player_id']], season, in_window,
+               int(p[idx['playoff_rd']]) > 0, _flag(p[idx['home']]),
+               _flag(p[idx['started']]), win, p[idx['opp']])
+        group = groups.get(key)
+        if group is None:
+            group = {c: 0 for c in AGGREGATE_COLUMNS}
+            group['first_game'] = group['last_game'] = game_date
+            groups[key] = group
+        group['games'] += 1
+        group['first_game'] = min(group['first_game'], game_date)
+        group['last_game'] = max(group['last_game'], game_date)
+        for col in STAT_COLUMNS:
+            value = _number(p[idx[col]], col)
+            if value is not None:
+                group['sum_' + col] += value
+                group['n_' + col] += 1
+    return groups
+
+
+def upsert_rollups(cursor, performances):
+    """ Adds performances to performance_rollup and bumps rollup_version.
+        Call this in the same transaction that inserts them into performance.
+        Returns:
+            The number of rollup rows written.
+    """
+    groups = rollup_groups(performances)
+    for key, group in groups.items():
+        cursor.execute(UPSERT_ROLLUP,
+                       list(key) + [group[c] for c in AGGREGATE_COLUMNS])
+    if groups:
+        cursor.execute(BUMP_ROLLUP_VERSION)
+    return len(groups)
+
+
+def rebuild_rollups(cursor):
+    """ Creates performance_rollup if needed and rebuilds it from the whole
+        performance table.
+    """
+    cursor.execute(CREATE_ROLLUP_TABLE)
+    cursor.execute(CREATE_ROLLUP_VERSION)
+    cursor.execute("TRUNCATE performance_rollup;")
+    cursor.execute(REBUILD_ROLLUPS)
+    cursor.execute(BUMP_ROLLUP_VERSION)
+
+
+def ensure_rollups(cursor):
+    """ Builds performance_rollup from the performance table if it does not
+        exist yet, and rollup_version for rollups built before it existed.
+        Returns:
+            True if the table was built.
+    """
+    cursor.execute(CREATE_ROLLUP_VERSION)
+    cursor.execute("SELECT to_regclass('performance_rollup');")
+    if cursor.fetchone()[0] is not None:
+        return False
+    rebuild_rollups(cursor)
+    return True
+
+
+def query_rollups(cursor, player_id, entity_table, columns):
+    """ Computes the aggregates an Interpreter would select from performance
+        by adding up the player's rollup rows. This only works when no
+        rollup row has games both inside and outside the date range, which
+        holds for career queries and for ranges on season boundaries.
+        Distribution aggregates such as 'median(pts)' cannot be added up.
+        Args:
+            cursor: A DB-API cursor.
+            player_id: The id of the queried player.
+            entity_table: The EntityTable with the query conditions.
+            columns: A list of stat_recipes columns.
+        Returns:
+            The rudimentary_stats dictionary, typed as the SQL path returns
+            it, or None when the query cannot be answered from the rollups.
+    """
+    if entity_table.played_for or any(map(is_distribution, columns)):
+        return None
+    conds = ["player_id=%s", "playoff=%s",
+             "last_game>%s", "first_game<%s"]
+    start_date, end_date = entity_table.start_date, entity_table.end_date
+    params = [player_id, entity_table.playoff_rd != 0, start_date, end_date]
+    if entity_table.game_won is not None:
+        conds.append("win=%s")
+        params.append(1 if entity_table.game_won else -1)
+    if entity_table.home_game is not None:
+        conds.append("home=%s")
+        params.append(_flag(entity_table.home_game))
+    if entity_table.started_game is not None:
+        conds.append("started=%s")
+        params.append(_flag(entity_table.started_game))
+    if entity_table.played_against:
+        conds.append("opp=%s")
+        params.append(entity_table.played_against)
+
+    selects = ["bool_and(first_game>%s AND last_game<%s)",
+               "coalesce(sum(games), 0)::bigint"]
+    params = [start_date, end_date] + params
+    parsed = [parse_column(c) for c in columns]
+    for agg, col in parsed:
+        if agg != 'count':
+            cast = 'float8' if col in FLOAT_COLUMNS else 'bigint'
+            selects.append("sum(sum_{})::{}".format(col, cast))
+            selects.append("coalesce(sum(n_{}), 0)::bigint".format(col))
+    cursor.execute("SELECT {} FROM performance_rollup WHERE {};".format(
+                   ', '.join(selects), ' AND '.join(conds)), params)
+    row = cursor.fetchone()
+    # a rollup row straddles one of the date bounds
+    if row[0] is False:
+        return None
+
+    stats = {}
+    games = row[1]
+    values = iter(row[2:])
+    for column, (agg, col) in zip(columns, parsed):
+        if agg == 'count':
+            stats[column] = games
+            continue
+        total, n = next(values), next(values)
+        if n == 0:
+            stats[column] = None
+        elif agg == 'sum':
+            stats[column] = total
+        elif col in FLOAT_COLUMNS:
+            stats[column] = total / n
+        else:
+            stats[column] = numeric_avg(total, n)
+    if len(columns) > 1:
+        stats = row_text_types(stats)
+    return stats
@@ -9,11 +9,14 @@ import sys
 
 from prettytable import PrettyTable
 
+from hooperhub.engine import get_engine
 from hooperhub.lexer import Lexer
 from hooperhub.util import EntityTable
 
 
 if __name__ == '__main__':
+    # load the graph and checkpoint once before taking queries
+    get_engine().load()
     sys.stdout.write("Enter your query below ([q/Q] to quit)\n")
     sys.stdout.write("> ")
     sys.stdout.flush()
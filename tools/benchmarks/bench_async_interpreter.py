@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+""" Compares requests/sec of the Interpreter, answering one request at a
+    time on a worker thread, with the AsyncInterpreter keeping up to
+    --concurrency requests in flight on a single event loop. Both answer the
+    same random EntityTables from a local PostgreSQL, with the result cache
+    turned off.
+"""
+
+import os
+import sys
+import random
+import asyncio
+import argparse
+
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.environ.get('HH_ROOT', '.'))
+from hooperhub.async_interpreter import AsyncInterpreter, create_async_pool
+from hooperhub.interpreter import Interpreter
+from hooperhub.util import EntityTable, data_utils
+from hooperhub.util.query_cache import configure_query_cache
+
+from columnar_parity import random_entity_table
+
+
+def run_sync(entity_tables, args):
+    """ Returns:
+            The number of requests per second and of failed requests.
+    """
+    failed = 0
+    start = timer()
+    for et in entity_tables:
+        interp = Interpreter(et, data_utils.STAT_RECIPES_PATH,
+                             args.host, args.port, args.dbname, args.user)
+        try:
+            interp()
+        except Exception:
+            failed += 1
+        finally:
+            interp.close_psql_connection()
+    return len(entity_tables) / (timer() - start), failed
+
+
+async def run_async(entity_tables, args):
+    """ Returns:
+            The number of requests per second and of failed requests.
+    """
+    pool = create_async_pool(args.host, args.port, args.dbname, args.user,
+                             max_size=args.max_size)
+    in_flight = asyncio.Semaphore(args.concurrency)
+
+    async def request(et):
+        async with in_flight:
+            await AsyncInterpreter(et, data_utils.STAT_RECIPES_PATH, pool)()
+
+    # open the pool's connections before timing
+    await asyncio.gather(*[request(et) for et in
+                           entity_tables[:args.max_size]],
+                         return_exceptions=True)
+    start = timer()
+    results = await asyncio.gather(*[request(et) for et in entity_tables],
+                                   return_exceptions=True)
+    elapsed = timer() - start
+    pool.close()
+    failed = sum(isinstance(r, Exception) for r in results)
+    return len(entity_tables) / elapsed, failed
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--host', type = str, default = 'localhost')
+    arg_parser.add_argument('--port', type = int, default = 5432)
+    arg_parser.add_argument('--dbname', type = str, default = 'hooperhub')
+    arg_parser.add_argument('--user', type = str, default = 'postgres')
+    arg_parser.add_argument('--requests',
+                            type = int,
+                            default = 500,
+                            help = "number of random EntityTables")
+    arg_parser.add_argument('--concurrency',
+                            type = int,
+                            default = 32,
+                            help = "requests in flight on the event loop")
+    arg_parser.add_argument('--max_size',
+                            type = int,
+                            default = 8,
+                            help = "maximum async pool size")
+    arg_parser.add_argument('--seed', type = int, default = 0)
+    args = arg_parser.parse_args()
+    rng = random.Random(args.seed)
+
+    # every request must reach the database
+    configure_query_cache(max_results=0)
+
+    probe = Interpreter(EntityTable(), data_utils.STAT_RECIPES_PATH,
+                        args.host, args.port, args.dbname, args.user)
+    probe.cursor.execute("SELECT name FROM player;")
+    names = [row[0] for row in probe.cursor.fetchall()]
+    probe.close_psql_connection()
+    entity_tables = [random_entity_table(rng.choice(names), rng)
+                     for _ in range(args.requests)]
+
+    sync_rps, sync_failed = run_sync(entity_tables, args)
+    loop = asyncio.get_event_loop()
+    async_rps, async_failed = loop.run_until_complete(
+        run_async(entity_tables, args))
+    print("Requests:     {}".format(args.requests))
+    print("Sync:         {:.0f} requests/s ({} failed)".format(
+          sync_rps, sync_failed))
+    print("Async (x{}):  {:.0f} requests/s ({} failed)".format(
+          args.concurrency, async_rps, async_failed))
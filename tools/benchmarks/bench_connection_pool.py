@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+""" Compares opening a connection per request, as the Interpreter used to,
+    with drawing connections from a ConnectionPool. Runs against a local
+    PostgreSQL when --dsn is given and otherwise against sqlite3 standing in
+    for the DB-API driver, with an artificial handshake delay.
+"""
+
+import os
+import sys
+import sqlite3
+import argparse
+import functools
+import threading
+
+from time import sleep
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.environ.get('HH_ROOT', '.'))
+from hooperhub.util.connection_pool import ConnectionPool
+
+
+def standin_connect(delay):
+    """ Opens an in-memory sqlite3 connection after sleeping for delay
+        seconds, standing in for the TCP and auth setup of PostgreSQL.
+    """
+    sleep(delay)
+    return sqlite3.connect(':memory:', check_same_thread=False)
+
+
+def run_query(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1;")
+    cursor.fetchone()
+    cursor.close()
+
+
+def run_threads(target, threads, requests):
+    """ Runs target requests times spread over threads.
+        Returns:
+            The number of requests per second.
+    """
+    per_thread = requests // threads
+    def worker():
+        for _ in range(per_thread):
+            target()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = timer()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return per_thread * threads / (timer() - start)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--dsn',
+                            type = str,
+                            default = None,
+                            help = "psycopg2 connection string, e.g. "
+                                   "'dbname=hooperhub user=postgres'")
+    arg_parser.add_argument('--connect_delay_ms',
+                            type = float,
+                            default = 20.0,
+                            help = "handshake delay of the sqlite3 stand-in")
+    arg_parser.add_argument('--threads',
+                            type = int,
+                            default = 8,
+                            help = "number of concurrent clients")
+    arg_parser.add_argument('--requests',
+                            type = int,
+                            default = 400,
+                            help = "total number of queries")
+    arg_parser.add_argument('--max_size',
+                            type = int,
+                            default = 4,
+                            help = "maximum pool size")
+    args = arg_parser.parse_args()
+
+    if args.dsn:
+        import psycopg2
+        connect = functools.partial(psycopg2.connect, args.dsn)
+    else:
+        connect = functools.partial(standin_connect,
+                                    args.connect_delay_ms / 1000.0)
+
+    def unpooled():
+        conn = connect()
+        run_query(conn)
+        conn.close()
+
+    pool = ConnectionPool(connect, min_size=1, max_size=args.max_size)
+    def pooled():
+        with pool.connection() as conn:
+            run_query(conn)
+
+    unpooled_qps = run_threads(unpooled, args.threads, args.requests)
+    pooled_qps = run_threads(pooled, args.threads, args.requests)
+    print("Connect per request: {:.0f} queries/s".format(unpooled_qps))
+    print("Pooled:              {:.0f} queries/s".format(pooled_qps))
+    print("Pool stats:")
+    for k, v in sorted(pool.stats().items()):
+        print("  {}: {}".format(k, round(v, 3) if isinstance(v, float) else v))
+    pool.close()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+""" Benchmarks the compiled date extractor used by the Lexer against the
+    dateutil n-gram probing it replaced, and reports where they disagree.
+"""
+
+import os
+import re
+import sys
+import argparse
+
+from timeit import default_timer as timer
+from dateutil import parser
+
+sys.path.insert(0, os.environ.get('HH_ROOT', '.'))
+from hooperhub.util.date_extractor import extract_dates
+
+
+SAMPLE_QUERIES = [
+    "lebron james points per game 2016-17",
+    "how many assists did chris paul have after march 3 2017",
+    "stephen curry 3 point percentage before 12/25/2016",
+    "kevin durant rebounds against the spurs in the playoffs",
+    "russell westbrook triple doubles on the road in 2017",
+    "james harden free throws between 11/1 and 12/1",
+    "kawhi leonard steals per game since january 1st",
+    "anthony davis blocks at home 15-16",
+    "damian lillard points in wins after feb 14",
+    "karl-anthony towns rebounds off the bench",
+    "giannis antetokounmpo total points from october 25 2016 to april 12 2017",
+    "demar derozan shooting percentage on 3rd of march",
+    "kyle lowry assists versus boston in 2015-16",
+    "john wall turnovers per game before the 20th of december",
+    "isaiah thomas points in the 4th quarter",
+    "klay thompson three pointers on 12/5/16",
+    "jimmy butler minutes per game in losses",
+    "draymond green plus minus after 1/15/2017 at home",
+    "paul george field goal percentage 2014",
+    "gordon hayward true shooting since nov 2016",
+    "kemba walker points per game after the all star break",
+    "andre drummond offensive rebounds on march 10",
+    "rudy gobert blocks in 16-17 playoffs",
+    "dwyane wade points before 2 1 2017",
+    "carmelo anthony usage rating between jan 5 and jan 25",
+]
+
+
+def legacy_extract_dates(raw_sentence):
+    """ The date and season handling from Lexer._prepare_sentence before the
+        compiled extractor. Kept here only as a baseline.
+    """
+    dates = {"DATE-A": None, "DATE-B": None}
+    date_parser = parser.parse
+    words = raw_sentence.split()
+    s_len = len(words)
+
+    date_pattern = '^(0?[0-9]|1[0-2])/(0?[0-9]|1[0-9]|2[0-9]|3[0-1])(/(\d\d|\d\d\d\d))?$'
+    for i in range(s_len):
+        if re.match(date_pattern, words[i]):
+            if not dates["DATE-A"]:
+                dates["DATE-A"] = date_parser(words[i]).date()
+                words[i] = "DATE-A"
+            else:
+                dates["DATE-B"] = date_parser(words[i]).date()
+                words[i] = "DATE-B"
+
+    for i in range(s_len-2):
+        three_gram = ' '.join(words[s_len-i-3:s_len-i])
+        try:
+            date = date_parser(three_gram)
+            if not dates["DATE-A"]:
+                dates["DATE-A"] = date.date()
+                words[s_len-i-3:s_len-i] = ["DATE-A"]*3
+            else:
+                dates["DATE-B"] = date.date()
+                words[s_len-i-3:s_len-i] = ["DATE-B"]*3
+        except:
+            pass
+
+    for i in range(s_len-1):
+        two_gram = ' '.join(words[s_len-i-2:s_len-i])
+        try:
+            date = date_parser(two_gram)
+            if not dates["DATE-A"]:
+                dates["DATE-A"] = date.date()
+                words[s_len-i-2:s_len-i] = ["DATE-A"]*2
+            else:
+                dates["DATE-B"] = date.date()
+                words[s_len-i-2:s_len-i] = ["DATE-B"]*2
+        except:
+            pass
+
+    year_pattern1 = "^(\d\d\d\d-\d\d)$"
+    year_pattern2 = "^(\d\d-\d\d)$"
+    year_pattern3 = "^(\d\d\d\d)$"
+    for i in range(s_len):
+        if re.match(year_pattern1, words[i]):
+            dates["SEASON"] = int(words[i][:4])
+        elif re.match(year_pattern2, words[i]):
+            dates["SEASON"] = 1900 + int(words[i][:2])
+            if int(words[i][:2]) < 45:
+                dates["SEASON"] += 100
+        elif re.match(year_pattern3, words[i]):
+            dates["SEASON"] = int(words[i])-1
+
+    return words, dates
+
+
+def time_extractor(extract, queries, repeat):
+    """ Returns:
+            The mean time per query in microseconds.
+    """
+    start = timer()
+    for _ in range(repeat):
+        for q in queries:
+            extract(q)
+    return (timer() - start) / (repeat * len(queries)) * 1e6
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--queries',
+                            type = str,
+                            default = None,
+                            help = "file with one query per line (defaults "
+                                   "to a built-in sample)")
+    arg_parser.add_argument('--repeat',
+                            type = int,
+                            default = 50,
+                            help = "number of passes over the queries")
+    args = arg_parser.parse_args()
+
+    queries = SAMPLE_QUERIES
+    if args.queries:
+        with open(args.queries, 'r') as f:
+            queries = [line.strip().lower() for line in f if line.strip()]
+
+    mismatches = []
+    for q in queries:
+        legacy = legacy_extract_dates(q)
+        compiled = extract_dates(q.split())
+        if legacy != compiled:
+            mismatches.append((q, legacy, compiled))
+
+    legacy_us = time_extractor(legacy_extract_dates, queries, args.repeat)
+    compiled_us = time_extractor(lambda q: extract_dates(q.split()),
+                                 queries, args.repeat)
+
+    print("Queries:            {}".format(len(queries)))
+    print("dateutil n-grams:   {:.1f} us/query".format(legacy_us))
+    print("compiled extractor: {:.1f} us/query".format(compiled_us))
+    print("Speedup:            {:.1f}x".format(legacy_us / compiled_us))
+    print("Agreement:          {}/{}".format(len(queries) - len(mismatches),
+                                             len(queries)))
+    for q, legacy, compiled in mismatches:
+        print("  Mismatch: {}".format(q))
+        print("    dateutil: {}".format(legacy))
+        print("    compiled: {}".format(compiled))
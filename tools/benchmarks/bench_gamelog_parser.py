@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+""" Benchmarks the single-pass gamelog parser used by the crawler against the
+    BeautifulSoup scraping it replaced on saved gamelog pages (e.g. the
+    crawler's page cache unpacked, or pages saved for local_site.py), and
+    reports the seasons on which their performance rows differ.
+"""
+
+import os
+import sys
+import bs4
+import argparse
+
+from timeit import default_timer as timer
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.environ.get('HH_ROOT', '.'),
+                                'tools/crawler'))
+from gamelog import parse_season, scrape_statline
+
+
+def legacy_get_stat(stat_name, game_row):
+    stat = game_row.find('td', {'data-stat': stat_name})
+    if stat != None:
+        stat = stat.string
+    return stat
+
+
+class _LegacyRow(object):
+    """ Gives scrape_statline the per-stat find() lookups of the old crawler.
+    """
+
+    def __init__(self, game_row):
+        self.game_row = game_row
+
+
+    def get(self, stat_name):
+        return legacy_get_stat(stat_name, self.game_row)
+
+
+def legacy_get_playoff_teams(post_season_soup):
+    rd = 1
+    prev_team = ''
+    playoff_dict = defaultdict(int)
+    for game_row in post_season_soup.findAll('tr'):
+        opponent = game_row.find('td', {'data-stat': 'opp_id'})
+        if not opponent:
+            continue
+        opponent = opponent.string
+        if opponent != prev_team:
+            playoff_dict[opponent] = rd
+            rd += 1
+            prev_team = opponent
+    return playoff_dict
+
+
+def legacy_scrape_gamelog(player_id, soup, advanced=False):
+    """ BBR_Crawler.scrape_gamelog before the single-pass parser. Kept here
+        only as a baseline.
+    """
+    gl_data = []
+
+    reg_season_div_id = 'all_pgl_basic'
+    post_season_div_id = 'all_pgl_basic_playoffs'
+    if advanced:
+        reg_season_div_id = 'all_pgl_advanced'
+        post_season_div_id = 'all_pgl_advanced_playoffs'
+
+    reg_season_div = soup.find('div', id=reg_season_div_id)
+    if reg_season_div:
+        reg_season_table = reg_season_div.find('tbody')
+        for game_row in reg_season_table.findAll('tr', id=True):
+            gl_data.append(scrape_statline(player_id,
+                                           _LegacyRow(game_row),
+                                           defaultdict(int),
+                                           advanced))
+
+    post_season_div = soup.find('div', id=post_season_div_id)
+    if post_season_div:
+        post_season_text = post_season_div.find(
+                           text = lambda t: isinstance(t, bs4.Comment))
+        post_season_soup = bs4.BeautifulSoup(post_season_text,
+                                             'html.parser')
+        post_season_table = post_season_soup.find('tbody')
+        post_season_dict = legacy_get_playoff_teams(post_season_table)
+        for game_row in post_season_table.findAll('tr', id=True):
+            gl_data.append(scrape_statline(player_id,
+                                           _LegacyRow(game_row),
+                                           post_season_dict,
+                                           advanced))
+
+    return gl_data
+
+
+def legacy_parse_season(player_id, basic_html, adv_html):
+    basic_data = legacy_scrape_gamelog(player_id,
+                                       bs4.BeautifulSoup(basic_html,
+                                                         'html.parser'))
+    adv_data = legacy_scrape_gamelog(player_id,
+                                     bs4.BeautifulSoup(adv_html,
+                                                       'html.parser'),
+                                     advanced=True)
+    return list(map(lambda x,y: x+y, basic_data, adv_data))
+
+
+def find_seasons(pages_dir):
+    """ Returns:
+            A list of (name, basic_html, adv_html) for every saved
+            .../gamelog/<season> page that has a matching
+            .../gamelog-advanced/<season> page.
+    """
+    seasons = []
+    for root, _, files in os.walk(pages_dir):
+        if os.path.basename(root) != 'gamelog':
+            continue
+        adv_root = os.path.join(os.path.dirname(root), 'gamelog-advanced')
+        for name in sorted(files):
+            adv_path = os.path.join(adv_root, name)
+            if not os.path.isfile(adv_path):
+                continue
+            with open(os.path.join(root, name), 'rb') as f:
+                basic_html = f.read()
+            with open(adv_path, 'rb') as f:
+                adv_html = f.read()
+            seasons.append((os.path.join(root, name), basic_html, adv_html))
+    return seasons
+
+
+def time_parser(parse, seasons, repeat):
+    """ Returns:
+            The number of seasons parsed per second and the number of rows
+            per parse of all seasons.
+    """
+    rows = 0
+    start = timer()
+    for _ in range(repeat):
+        rows = 0
+        for _, basic_html, adv_html in seasons:
+            rows += len(parse(1, basic_html, adv_html))
+    return repeat * len(seasons) / (timer() - start), rows
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--pages',
+                            type = str,
+                            required = True,
+                            help = "directory of saved pages, laid out like "
+                                   "the site's URLs")
+    arg_parser.add_argument('--repeat',
+                            type = int,
+                            default = 3,
+                            help = "number of passes over the pages")
+    args = arg_parser.parse_args()
+
+    seasons = find_seasons(args.pages)
+    if not seasons:
+        sys.exit("No gamelog/gamelog-advanced page pairs in "+args.pages)
+
+    mismatches = [name for name, basic_html, adv_html in seasons
+                  if legacy_parse_season(1, basic_html, adv_html)
+                  != parse_season(1, basic_html, adv_html)]
+
+    legacy_rate, rows = time_parser(legacy_parse_season, seasons, args.repeat)
+    rate, _ = time_parser(parse_season, seasons, args.repeat)
+    row_scale = rows / len(seasons)
+
+    print("Seasons:            {} ({} rows)".format(len(seasons), rows))
+    print("BeautifulSoup:      {:.1f} seasons/s, {:.0f} rows/s".format(
+          legacy_rate, legacy_rate * row_scale))
+    print("single-pass parser: {:.1f} seasons/s, {:.0f} rows/s".format(
+          rate, rate * row_scale))
+    print("Speedup:            {:.1f}x".format(rate / legacy_rate))
+    print("Agreement:          {}/{}".format(len(seasons) - len(mismatches),
+                                             len(seasons)))
+    for name in mismatches:
+        print("  Mismatch: {}".format(name))
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+""" Measures how often the Gazetteer fast path can tag a query, how often its
+    tags match the reference tags, and how much faster it is than the model.
+    Queries are drawn from the same generator as the training data.
+"""
+
+import os
+import io
+import sys
+import ast
+import argparse
+
+from contextlib import redirect_stdout
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.environ.get('HH_ROOT', '.'))
+sys.path.insert(0, os.path.join(os.environ.get('HH_ROOT', '.'),
+                                'tools/synthetic_data'))
+from hooperhub.gazetteer import Gazetteer
+from hooperhub.engine import create_engine
+from hooperhub.util import artifacts, data_utils
+
+import generate_data
+
+
+def generate_examples(num_examples):
+    """ Runs generate_data.py and keeps the words and tags the Lexer would
+        pass to the tagger, dropping out-of-vocabulary and repeated words.
+        Returns:
+            A list of (words, tags) pairs.
+    """
+    out = io.StringIO()
+    with redirect_stdout(out):
+        for _ in range(num_examples):
+            generate_data.generate_example()
+    vocab = artifacts.vocab_set()
+    examples = []
+    for line in out.getvalue().splitlines():
+        queries, tags = map(ast.literal_eval, line.split('\t'))
+        words, kept_tags = [], []
+        last_word = ''
+        for w, t in zip(queries, tags):
+            if w in vocab and last_word != w:
+                words.append(w)
+                kept_tags.append(t)
+            last_word = w
+        examples.append((words, kept_tags))
+    return examples
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--num_examples',
+                            type = int,
+                            default = 5000,
+                            help = "number of generated queries")
+    arg_parser.add_argument('--model',
+                            action = 'store_true',
+                            help = "also time the model on the fallback path")
+    args = arg_parser.parse_args()
+
+    start = timer()
+    gazetteer = Gazetteer.from_files()
+    build_ms = (timer() - start) * 1e3
+    examples = generate_examples(args.num_examples)
+
+    start = timer()
+    results = [gazetteer.tag(words) for words, _ in examples]
+    gazetteer_us = (timer() - start) / len(examples) * 1e6
+
+    covered = [(r, gold) for r, (_, gold) in zip(results, examples)
+               if r is not None]
+    agreed = sum(r == gold for r, gold in covered)
+    print("Phrases:        {} (built in {:.0f} ms)".format(
+          gazetteer.phrase_count, build_ms))
+    print("Queries:        {}".format(len(examples)))
+    print("Coverage:       {:.1%}".format(len(covered) / len(examples)))
+    print("Agreement:      {:.2%} of covered queries".format(
+          agreed / len(covered) if covered else 0.0))
+    print("Gazetteer:      {:.1f} us/query".format(gazetteer_us))
+
+    if args.model:
+        engine = create_engine()
+        word2id = artifacts.input2id()
+        sentences = [data_utils.sentence_to_token_ids(words, word2id)
+                     for words, _ in examples if words]
+        engine.load()
+        start = timer()
+        for s in sentences:
+            engine.decode(s)
+        model_us = (timer() - start) / len(sentences) * 1e6
+        print("Model:          {:.1f} us/query".format(model_us))
+        print("Speedup:        {:.0f}x on covered queries".format(
+              model_us / gazetteer_us))
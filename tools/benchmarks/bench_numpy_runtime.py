@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+""" Compares the NumPy runtime with the TensorFlow InferenceEngine: cold
+    start time, per-query and batched latency, and whether both backends
+    predict the same tags. Export the weights first with
+    hooperhub/bin/export_weights.py.
+"""
+
+import os
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+import sys
+import argparse
+import subprocess
+
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.environ.get('HH_ROOT', '.'))
+from hooperhub.engine import create_engine
+from hooperhub.lexer import Lexer
+
+from bench_date_extractor import SAMPLE_QUERIES
+
+
+STARTUP_SNIPPET = """
+import os, sys
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+sys.path.insert(0, {root!r})
+from hooperhub.engine import create_engine
+create_engine({backend!r}, {data_dir!r}).load()
+"""
+
+
+def time_startup(backend, data_dir):
+    """ Times a fresh interpreter importing and loading a backend.
+        Returns:
+            The wall time in seconds, or None if the backend failed to load.
+    """
+    snippet = STARTUP_SNIPPET.format(root=os.environ.get('HH_ROOT', '.'),
+                                     backend=backend,
+                                     data_dir=data_dir)
+    start = timer()
+    proc = subprocess.run([sys.executable, '-c', snippet],
+                          stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL)
+    elapsed = timer() - start
+    return elapsed if proc.returncode == 0 else None
+
+
+def time_latency(engine, sentences, batch_size, repeat):
+    """ Returns:
+            The mean single-sentence latency and the mean per-sentence cost
+            when decoding in batches of batch_size, both in milliseconds.
+    """
+    start = timer()
+    for _ in range(repeat):
+        for s in sentences:
+            engine.decode(s)
+    single_ms = (timer() - start) / (repeat * len(sentences)) * 1e3
+    start = timer()
+    for _ in range(repeat):
+        for i in range(0, len(sentences), batch_size):
+            engine.decode_batch(sentences[i:i+batch_size])
+    batch_ms = (timer() - start) / (repeat * len(sentences)) * 1e3
+    return single_ms, batch_ms
+
+
+def load_engine(backend, data_dir):
+    try:
+        engine = create_engine(backend, data_dir)
+        engine.load()
+        return engine
+    except (ImportError, IOError) as e:
+        print("{} backend unavailable: {}".format(backend, e))
+        return None
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--data_dir',
+                            type = str,
+                            default = os.path.join(os.environ.get('HH_ROOT', '.'),
+                                                   'hooperhub/data/'),
+                            help = "directory with the checkpoint and model.npz")
+    arg_parser.add_argument('--queries',
+                            type = str,
+                            default = None,
+                            help = "file with one query per line (defaults "
+                                   "to a built-in sample)")
+    arg_parser.add_argument('--batch_size',
+                            type = int,
+                            default = 16,
+                            help = "sentences per batched decode")
+    arg_parser.add_argument('--repeat',
+                            type = int,
+                            default = 5,
+                            help = "number of passes over the queries")
+    args = arg_parser.parse_args()
+
+    queries = SAMPLE_QUERIES
+    if args.queries:
+        with open(args.queries, 'r') as f:
+            queries = [line.strip() for line in f if line.strip()]
+    # queries with no vocabulary words have nothing to decode
+    pairs = [(q, Lexer(q).sentence) for q in queries]
+    queries = [q for q, s in pairs if s]
+    sentences = [s for _, s in pairs if s]
+
+    engines = {}
+    for backend in ('numpy', 'tensorflow'):
+        startup = time_startup(backend, args.data_dir)
+        engine = load_engine(backend, args.data_dir)
+        if engine is None:
+            continue
+        engines[backend] = engine
+        single_ms, batch_ms = time_latency(engine, sentences,
+                                           args.batch_size, args.repeat)
+        print("{}:".format(backend))
+        if startup is not None:
+            print("  cold start:        {:.2f} s".format(startup))
+        print("  single decode:     {:.2f} ms/query".format(single_ms))
+        print("  batched decode:    {:.2f} ms/query (batch of {})".format(
+              batch_ms, args.batch_size))
+
+    if len(engines) == 2:
+        np_preds = engines['numpy'].decode_batch(sentences)
+        tf_preds = engines['tensorflow'].decode_batch(sentences)
+        mismatches = [(q, a, b) for q, a, b in zip(queries, np_preds, tf_preds)
+                      if list(map(int, a)) != list(map(int, b))]
+        print("Agreement:           {}/{}".format(
+              len(sentences) - len(mismatches), len(sentences)))
+        for q, a, b in mismatches:
+            print("  Mismatch: {}".format(q))
+            print("    numpy:      {}".format(a))
+            print("    tensorflow: {}".format(b))
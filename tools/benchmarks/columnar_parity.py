@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+""" Parity suite and benchmark for the columnar stat engine. Random
+    EntityTables are answered both by the Interpreter's SQL path and by a
+    ColumnarStore loaded from the same database, and the rudimentary_stats
+    dictionaries must be identical in value and type.
+"""
+
+import os
+import sys
+import random
+import argparse
+import datetime
+
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.environ.get('HH_ROOT', '.'))
+from hooperhub.interpreter import Interpreter
+from hooperhub.util import EntityTable, data_utils
+from hooperhub.util.calculator import STAT_RECIPES
+from hooperhub.util.columnar import ColumnarStore
+
+
+def random_entity_table(player_name, rng):
+    """ Returns:
+            An EntityTable with random splits, stats and date range.
+    """
+    et = EntityTable()
+    et.player_name = player_name
+    et.playoff_rd = rng.choice([0, 0, 1])
+    et.game_won = rng.choice([None, None, True, False])
+    et.home_game = rng.choice([None, None, True, False])
+    et.started_game = rng.choice([None, None, True, False])
+    et.played_against = rng.choice([None] * 4 + list(range(1, 31)))
+    date_kind = rng.choice(['career', 'season', 'range'])
+    if date_kind == 'season':
+        season = rng.randint(2000, 2016)
+        et.start_date = datetime.date(season, 10, 1)
+        et.end_date = datetime.date(season+1, 7, 1)
+    elif date_kind == 'range':
+        et.start_date = (datetime.date(2000, 1, 1) +
+                         datetime.timedelta(days=rng.randint(0, 6000)))
+        et.end_date = (et.start_date +
+                       datetime.timedelta(days=rng.randint(1, 1000)))
+    for stat in rng.sample(sorted(STAT_RECIPES), rng.randint(1, 4)):
+        et.add_stat(stat)
+    return et
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--host', type = str, default = 'localhost')
+    arg_parser.add_argument('--port', type = int, default = 5432)
+    arg_parser.add_argument('--dbname', type = str, default = 'hooperhub')
+    arg_parser.add_argument('--user', type = str, default = 'postgres')
+    arg_parser.add_argument('--num_queries',
+                            type = int,
+                            default = 1000,
+                            help = "number of random EntityTables")
+    arg_parser.add_argument('--seed', type = int, default = 0)
+    args = arg_parser.parse_args()
+    rng = random.Random(args.seed)
+
+    probe = Interpreter(EntityTable(), data_utils.STAT_RECIPES_PATH,
+                        args.host, args.port, args.dbname, args.user)
+    start = timer()
+    store = ColumnarStore.from_cursor(probe.cursor)
+    load_s = timer() - start
+    probe.cursor.execute("SELECT name FROM player;")
+    names = [row[0] for row in probe.cursor.fetchall()]
+    probe.close_psql_connection()
+
+    sql_s, columnar_s = 0.0, 0.0
+    mismatches = []
+    for _ in range(args.num_queries):
+        et = random_entity_table(rng.choice(names), rng)
+        interp = Interpreter(et, data_utils.STAT_RECIPES_PATH,
+                             args.host, args.port, args.dbname, args.user)
+        try:
+            columns = list(interp._get_needed_columns(et.get_stats()))
+            _, conditions_str = interp._aggregate_conditions()
+            start = timer()
+            expected = interp._query_db(columns, conditions_str)
+            sql_s += timer() - start
+            start = timer()
+            got = store.query(interp._player_id, et, columns)
+            columnar_s += timer() - start
+        finally:
+            interp.close_psql_connection()
+        same = all(type(got[c]) == type(expected[c]) and got[c] == expected[c]
+                   for c in columns)
+        if not same:
+            mismatches.append((et.key(), expected, got))
+
+    print("Rows loaded:  {} in {:.1f} s".format(store.row_count, load_s))
+    print("SQL:          {:.2f} ms/query".format(
+          sql_s / args.num_queries * 1e3))
+    print("Columnar:     {:.3f} ms/query".format(
+          columnar_s / args.num_queries * 1e3))
+    print("Parity:       {}/{}".format(args.num_queries - len(mismatches),
+                                       args.num_queries))
+    for key, expected, got in mismatches[:20]:
+        print("  Mismatch: {}".format(key))
+        print("    sql:      {}".format(expected))
+        print("    columnar: {}".format(got))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+""" Parity check for the phrase extractors the Lexer runs before tagging.
+    Plain stat questions must reach the tagger with the same words as before
+    the extractors existed, i.e. with only their dates taken out, and the
+    queries that use a breakdown, leaderboard, game log or game window must
+    still be recognized.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.environ.get('HH_ROOT', '.'))
+from hooperhub.lexer import (extract_group_by, extract_leaders,
+                             extract_game_log, extract_window)
+from hooperhub.util.date_extractor import extract_dates
+
+
+# questions that none of the extractors may change
+PLAIN_QUERIES = [
+    "did kobe score 30 points per game in 2006",
+    "lebron had 25 points per game in the playoffs",
+    "kobe scored 35 ppg",
+    "kobe scored 30 a game in 2006",
+    "how many points did lebron average each game in 2016",
+    "points per game in all games",
+    "lebron james assists per game every game in 2016",
+    "kevin durant rebounds against the spurs in the playoffs",
+    "who was the best 3 point shooter in 2016",
+    "top 3 pointers made in 2016",
+    "top 3 point percentage in 2016",
+]
+
+# (question, expected extractor values) for queries that use them
+EXTRACTED_QUERIES = [
+    ("lebron points by season", {'group_by': 'season'}),
+    ("who led the league in assists in 2016", {'leaders': 1}),
+    ("top 5 in ppg minimum 40 games", {'leaders': 5, 'min_games': 40}),
+    ("best 3 in assists in 2016", {'leaders': 3}),
+    ("top 3 point percentage leaders in 2016", {'leaders': 10}),
+    ("every game lebron scored 40", {'game_log': True, 'min_points': 40}),
+    ("lebron game log 2016", {'game_log': True}),
+    ("games where kobe had 50 points", {'game_log': True, 'min_points': 50}),
+    ("curry points last 10 games", {'last_games': 10}),
+]
+
+
+def extract(sentence):
+    """ Runs the extractors in the order of Lexer._prepare_sentence.
+        Returns:
+            The words left for the tagger and a dictionary of the values
+            the extractors found.
+    """
+    values = {}
+    words, values['group_by'] = extract_group_by(sentence.split())
+    words, values['leaders'], values['min_games'] = extract_leaders(words)
+    words, values['game_log'], values['min_points'] = extract_game_log(words)
+    words, values['last_games'], values['rolling_window'] = \
+        extract_window(words)
+    words, _ = extract_dates(words)
+    return words, values
+
+
+def check():
+    """ Returns:
+            A list of (question, reason) for every question the extractors
+            handle differently than expected.
+    """
+    failures = []
+    for sentence in PLAIN_QUERIES:
+        words, values = extract(sentence)
+        expected_words, _ = extract_dates(sentence.split())
+        if words != expected_words:
+            failures.append((sentence, "words {}".format(words)))
+        found = {k: v for k, v in values.items() if v}
+        if found:
+            failures.append((sentence, "extracted {}".format(found)))
+    for sentence, expected in EXTRACTED_QUERIES:
+        _, values = extract(sentence)
+        found = {k: v for k, v in values.items() if v}
+        if found != expected:
+            failures.append((sentence, "extracted {}".format(found)))
+    return failures
+
+
+if __name__ == '__main__':
+    failures = check()
+    total = len(PLAIN_QUERIES) + len(EXTRACTED_QUERIES)
+    failed = len(set(sentence for sentence, _ in failures))
+    print("Agreement:          {}/{}".format(total - failed, total))
+    for sentence, reason in failures:
+        print("  Mismatch: {!r}: {}".format(sentence, reason))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+""" Reports tag accuracy, per-query latency and memory of the NumPy
+    runtime at each stored precision. The float32 weights exported by
+    hooperhub/bin/export_weights.py are quantized in memory for each row of
+    the report, and accuracy is measured on testing.in and testing.tgt.
+    Memory is reported as the weights held while serving and as the peak of
+    the arrays a single query allocates on top of them.
+"""
+
+import os
+import sys
+import argparse
+import tracemalloc
+
+import numpy as np
+
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.environ.get('HH_ROOT', '.'))
+from hooperhub.numpy_model import PRECISIONS, NumpySeq2SeqModel, quantize_weights
+from hooperhub.util import data_utils
+
+
+def read_pairs(source_path, target_path, limit):
+    """ Reads up to limit tokenized (source, target) pairs. """
+    pairs = []
+    with open(source_path, 'r') as source_file, \
+         open(target_path, 'r') as target_file:
+        for source_line, target_line in zip(source_file, target_file):
+            source = [int(tok) for tok in source_line.split()]
+            target = [int(tok) for tok in target_line.split()]
+            if source:
+                pairs.append((source, target))
+            if len(pairs) >= limit:
+                break
+    return pairs
+
+
+def evaluate(model, pairs, batch_size):
+    """ Returns:
+            The token accuracy and the fraction of sentences whose tags are
+            all correct.
+    """
+    correct_tokens, total_tokens, correct_sentences = 0, 0, 0
+    for i in range(0, len(pairs), batch_size):
+        batch = pairs[i:i+batch_size]
+        predictions = model.decode_batch([source for source, _ in batch])
+        for (_, target), prediction in zip(batch, predictions):
+            hits = sum(int(p) == t for p, t in zip(prediction, target))
+            correct_tokens += hits
+            total_tokens += len(target)
+            correct_sentences += (hits == len(target))
+    return correct_tokens / total_tokens, correct_sentences / len(pairs)
+
+
+def time_queries(model, sentences):
+    """ Returns:
+            The mean and 95th percentile single-query latency in
+            milliseconds.
+    """
+    latencies = []
+    for sentence in sentences:
+        start = timer()
+        model.decode_batch([sentence])
+        latencies.append((timer() - start) * 1e3)
+    return np.mean(latencies), np.percentile(latencies, 95)
+
+
+def query_memory(model, sentences):
+    """ Returns:
+            The largest peak, in bytes, of the memory allocated while
+            answering one of the sentences as a single query. Timing is
+            measured separately, since tracing slows allocations down.
+    """
+    peak = 0
+    for sentence in sentences:
+        # only the allocations made after start() are traced
+        tracemalloc.start()
+        try:
+            model.decode_batch([sentence])
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return peak
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--weights',
+                            type = str,
+                            default = os.path.join(data_utils.PROJECT_ROOT,
+                                                   'hooperhub/data/model.npz'),
+                            help = "float32 weights from export_weights.py")
+    arg_parser.add_argument('--num_examples',
+                            type = int,
+                            default = 2000,
+                            help = "number of testing pairs to evaluate")
+    arg_parser.add_argument('--num_queries',
+                            type = int,
+                            default = 200,
+                            help = "number of single queries to time")
+    arg_parser.add_argument('--batch_size',
+                            type = int,
+                            default = 50,
+                            help = "sentences per batch while evaluating")
+    args = arg_parser.parse_args()
+
+    with np.load(args.weights) as npz:
+        weights = {name: npz[name] for name in npz.files}
+    if str(weights['W'].dtype) != 'float32':
+        sys.exit("The report needs the float32 export of the weights.")
+    pairs = read_pairs(data_utils.TESTING_INPUT_PATH,
+                       data_utils.TESTING_TARGET_PATH,
+                       args.num_examples)
+    sentences = [source for source, _ in pairs[:args.num_queries]]
+
+    print("{:<10}{:>12}{:>12}{:>12}{:>12}{:>12}{:>12}".format(
+          'precision', 'weights MB', 'query MB', 'token acc', 'query acc',
+          'mean ms', 'p95 ms'))
+    for precision in PRECISIONS:
+        model = NumpySeq2SeqModel(quantize_weights(weights, precision))
+        token_acc, sentence_acc = evaluate(model, pairs, args.batch_size)
+        mean_ms, p95_ms = time_queries(model, sentences)
+        query_bytes = query_memory(model, sentences)
+        print("{:<10}{:>12.1f}{:>12.1f}{:>12.4f}{:>12.4f}{:>12.2f}"
+              "{:>12.2f}".format(precision, model.nbytes / 2**20,
+                                 query_bytes / 2**20, token_acc,
+                                 sentence_acc, mean_ms, p95_ms))
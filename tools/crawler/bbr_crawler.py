@@ -1,16 +1,31 @@
-import bs4
+import os
+import sys
 import threading
 import datetime
 import psycopg2 as psql
 
-from urllib.request import urlopen
+from urllib.request import Request, urlopen
 from urllib.error import HTTPError
 
-from time import sleep, time
-from collections import defaultdict
+from time import time
+from contextlib import contextmanager
 
 # includes all of the psql queries and the Performance namedtuple
 from crawler_utils import *
+from gamelog import parse_player
+from pipeline import CrawlPipeline, TokenBucket
+from page_cache import PageCache
+from planner import group_by_player, plan_crawl, season_of
+
+sys.path.insert(0, os.environ.get('HH_ROOT', '.'))
+from hooperhub.util.columnar import CREATE_GAME_LIST_INDEX
+from hooperhub.util.lookup_index import get_lookup_index
+from hooperhub.util.rollups import (ensure_rollups, rebuild_rollups,
+                                    upsert_rollups)
+from ingest import ensure_performance_key, insert_performances
+
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('HH_ROOT', '.'),
+                                 'tools/crawler/page_cache/')
 
 
 class BBR_Crawler(object):
@@ -22,11 +37,34 @@ class BBR_Crawler(object):
         basketball-reference.com
     """
 
-    def __init__(self, base_url, dbname):
+    def __init__(self,
+                 base_url,
+                 dbname,
+                 rate=1/3.0,
+                 burst=1,
+                 fetch_workers=2,
+                 parse_workers=None,
+                 queue_size=16,
+                 cache_dir=DEFAULT_CACHE_DIR,
+                 remove_duplicates=False):
         """ Constructs the crawler.
             Args:
                 base_url: The url for the Basketball Reference index page.
                 dbname: Name of the database where data will be stored.
+                rate: The most requests made per second on average.
+                burst: The number of requests that may be made back to back
+                    after an idle period.
+                fetch_workers: The most requests in flight at once.
+                parse_workers: The number of processes parsing pages.
+                    Defaults to the number of CPUs.
+                queue_size: The number of players buffered between the
+                    fetch, parse and write stages.
+                cache_dir: The directory of the on-disk page cache, or None
+                    to always download pages.
+                remove_duplicates: Whether to delete games that earlier
+                    crawls stored more than once. Otherwise the crawler
+                    raises a ValueError if there are any, since they block
+                    the unique key on (player_id, game_date).
 
         """
         self.base_url = base_url
@@ -37,8 +75,61 @@ class BBR_Crawler(object):
                                  user = PG_USER)
         self.conn.autocommit = True
         self.cursor = self.conn.cursor()
-        # keeps track of the last urlopen request
-        self.last_req = time()
+        # team abbreviations are resolved from memory
+        self.index = get_lookup_index()
+        self.index.refresh(self.cursor)
+        # split rollups are built once and then kept up to date on insert
+        with self.transaction() as cursor:
+            removed = ensure_performance_key(cursor, remove_duplicates)
+            if not ensure_rollups(cursor) and removed:
+                # the rollups still count the deleted games
+                rebuild_rollups(cursor)
+            cursor.execute(CREATE_GAME_LIST_INDEX)
+        if removed:
+            self.print_ts("Removed {} duplicate performances".format(removed))
+        # throttles requests, by default to one every three seconds
+        self.bucket = TokenBucket(rate, burst)
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        # fetched pages are kept to be revalidated instead of downloaded
+        self.cache = PageCache(cache_dir) if cache_dir else None
+        # performances written and seconds spent writing them, for reporting
+        self.rows_written = 0
+        self.write_seconds = 0.0
+        # called as listener(player_id, player_name, performances) after new
+        # performances are inserted for a player
+        self.insert_listeners = []
+
+
+    def add_insert_listener(self, listener):
+        """ Registers a function to call after new performances have been
+            inserted for a player, e.g. QueryCache.on_insert or
+            ColumnarStore.on_insert when the crawler shares a process with
+            the query server.
+            Args:
+                listener: A function taking the player id, the player name
+                    and the list of inserted Performance tuples.
+        """
+        self.insert_listeners.append(listener)
+
+
+    @contextmanager
+    def transaction(self):
+        """ Context manager that runs the statements executed on the cursor
+            it yields in a single transaction, which is committed on exit and
+            rolled back on error. The connection is in autocommit mode
+            otherwise.
+        """
+        self.conn.autocommit = False
+        try:
+            yield self.cursor
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self.conn.autocommit = True
 
 
     def print_ts(self, sentence):
@@ -51,157 +142,87 @@ class BBR_Crawler(object):
         print(ts+sentence)
 
 
-    def get_soup(self, url):
-        """ Creates and returns a BeautifulSoup object. It will make sure
-                that URL requests are throttled at a minimum of 3 seconds.
-            Args:
-                url: The url that will be requested.
-            Returns:
-                The BeautifulSoup object that can be scraped.
+    def current_season(self):
+        """ Returns:
+                The year in which the current season ends.
         """
-        html = ''
+        return season_of(datetime.date.today())
 
-        # ensure three second delay between requests
-        dur = time() - self.last_req
-        sleep((3 - dur) if (dur < 3) else 0)
 
-        self.print_ts("Opening URL: "+url)
-        try: 
-            html = urlopen(url).read()
-        except HTTPError:
-            self.print_ts("Could not open URL: "+url)
-        finally:
-            # update the last request time regardless of failure
-            self.last_req = time()
-
-        soup = bs4.BeautifulSoup(html, 'html.parser')
-        return soup
+    def is_complete(self, url):
+        """ Returns:
+                True if the URL is the gamelog of a season that has ended,
+                whose page can no longer change.
+        """
+        season = url.rstrip('/').rsplit('/', 1)[-1]
+        return season.isdigit() and int(season) < self.current_season()
 
 
-    def get_playoff_teams(self, post_season_soup):
-        """ Creates a dictionary that maps the playoff round to a team id.
+    def get_page(self, url):
+        """ Requests a page, taking a token from self.bucket first so that
+            requests are throttled however many threads make them. Cached
+            pages of completed seasons are returned without a request and
+            other cached pages are revalidated with a conditional request.
             Args:
-                post_season_soup: A BeautifulSoup object with an html table
-                    containing all the playoff data.
+                url: The url that will be requested.
             Returns:
-                A dictionary with keys as team names and values as the
-                playoff round.
+                The HTML of the page, or b'' if it could not be opened.
         """
-        post_season_game_rows = post_season_soup.findAll('tr')
+        entry = self.cache.entry(url) if self.cache else None
+        cached = self.cache.page(entry) if entry else None
+        if cached is not None and entry['immutable']:
+            return cached
 
-        rd = 1
-        prev_team = ''
-        playoff_dict = defaultdict(int)
-        for game_row in post_season_game_rows:
-            opponent = game_row.find('td', {'data-stat': 'opp_id'})
-            # skip any row that doesn't have the tag 'opp_id'
-            if not opponent:
-                continue
-            opponent = opponent.string
+        headers = {}
+        if cached is not None:
+            headers = self.cache.conditional_headers(entry)
+        immutable = self.is_complete(url)
 
-            if opponent != prev_team:
-                playoff_dict[opponent] = rd
-                rd += 1
-                prev_team = opponent
+        self.bucket.acquire()
+        self.print_ts("Opening URL: "+url)
+        try:
+            response = urlopen(Request(url, headers=headers))
+            html = response.read()
+        except HTTPError as e:
+            if e.code == 304 and cached is not None:
+                self.cache.revalidated(entry, immutable)
+                return cached
+            self.print_ts("Could not open URL: "+url)
+            return b''
 
-        return playoff_dict
+        if self.cache:
+            self.cache.store(url,
+                             html,
+                             etag = response.headers.get('ETag'),
+                             last_modified = response.headers.get(
+                                             'Last-Modified'),
+                             immutable = immutable)
+        return html
 
 
-    def scrape_season(self, player_id, player_url, season):
-        """
-            Args:
-                player_id: The id for the player being scraped.
-                season: The season that is being scraped. It is concatenated
-                    to the gamelog_url to make the URL request and get the
-                    gamelog soups
-            Returns:
-                A list of Performance objects containing all gamelog data
-                for the given season.
+    def gamelog_urls(self, player_url, season):
+        """ Returns:
+                The basic and advanced gamelog URLs of the given season.
         """
-        self.cursor.execute(select_last_played, (player_id,))
-        last_played = self.cursor.fetchone()[0]
-
-        basic_gamelog_url = self.base_url+player_url+"/gamelog/"+season
-        basic_gamelog_soup = self.get_soup(basic_gamelog_url)
-        basic_data = self.scrape_gamelog(player_id,
-                                         basic_gamelog_soup)
+        return [self.base_url+player_url+"/gamelog/"+season,
+                self.base_url+player_url+"/gamelog-advanced/"+season]
 
-        adv_gamelog_url = self.base_url+player_url+"/gamelog-advanced/"+season
-        adv_gamelog_soup = self.get_soup(adv_gamelog_url)
-        adv_data = self.scrape_gamelog(player_id,
-                                       adv_gamelog_soup,
-                                       advanced=True)
 
-        # adds both basic and advanced data tuples for each game
-        total_gl_data = list(map(lambda x,y: x+y, basic_data, adv_data))
-        season_data = []
-        for game in total_gl_data:
-            season_data.append(Performance(*game))
-        return season_data
-
-
-    def scrape_gamelog(self, player_id, soup, advanced=False):
-        """ Scraped a gamelog for a given player. It can be regular stats or
-            advanced.
+    def to_performances(self, player_data):
+        """ Converts parsed gamelog rows to Performance objects, resolving
+            team abbreviations to their team_id in the DB.
             Args:
-                player_id: The id for the given player to be scraped.
-                soup: the BeautifulSoup object containing all the gamelog data.
-                advanced: A boolean that when true scraped the advanced
-                    gamelog stats.
+                player_data: A list of tuples as returned by parse_season.
             Returns:
-                A list of gamelog data which are stored as tuples.
+                A list of Performance objects.
         """
-        gl_data = []
-
-        reg_season_div_id = 'all_pgl_basic'
-        post_season_div_id = 'all_pgl_basic_playoffs'
-        if advanced:
-            reg_season_div_id = 'all_pgl_advanced'
-            post_season_div_id = 'all_pgl_advanced_playoffs'
-
-        reg_season_div = soup.find('div', id=reg_season_div_id)
-        if reg_season_div:
-            reg_season_table = reg_season_div.find('tbody')
-            reg_season_game_rows = reg_season_table.findAll('tr', id=True)
-            for game_row in reg_season_game_rows:
-                gl_data.append(self.scrape_statline(player_id,
-                                                    game_row,
-                                                    defaultdict(int),
-                                                    advanced))
-
-        post_season_div = soup.find('div', id=post_season_div_id)
-        if post_season_div:
-            # for some reason, the HTML for playoff data is in a comment...
-            # so we'll parse that comment and create a new BS4 object out
-            # of it
-            post_season_text = post_season_div.find(
-                               text = lambda t: isinstance(t, bs4.Comment))
-            post_season_soup = bs4.BeautifulSoup(post_season_text,
-                                                 'html.parser')
-            post_season_table = post_season_soup.find('tbody')
-            post_season_dict = self.get_playoff_teams(post_season_table)
-            post_season_game_rows = post_season_table.findAll('tr', id=True)
-            for game_row in post_season_game_rows:
-                gl_data.append(self.scrape_statline(player_id,
-                                                    game_row,
-                                                    post_season_dict,
-                                                    advanced))
-
-        return gl_data
-
-
-    def get_stat(self, stat_name, game_row):
-        """ Gets the stat for the given name from the statline row.
-            Args:
-                stat_name: The name of the stat that will be scraped.
-                game_row: The soup that will be scraped from.
-            Returns:
-                A string that represents the stat value.
-        """
-        stat = game_row.find('td', {'data-stat': stat_name})
-        if stat != None:
-            stat = stat.string
-        return stat
+        performances = []
+        for game in player_data:
+            game = list(game)
+            game[5] = self.get_team_id(game[5])
+            game[6] = self.get_team_id(game[6])
+            performances.append(Performance(*game))
+        return performances
 
 
     def get_team_id(self, team_str):
@@ -226,6 +247,10 @@ class BBR_Crawler(object):
         if team_str == "SEA":
             team_str = "OKC"
 
+        team_id = self.index.team_id(team_str)
+        if team_id is not None:
+            return team_id
+
         self.cursor.execute(select_team_id, (team_str.lower(),))
         team_id = self.cursor.fetchone()
 
@@ -234,82 +259,16 @@ class BBR_Crawler(object):
             self.cursor.execute(select_team_id, (team_str,))
             team_id = self.cursor.fetchone()
 
+        self.index.add_team(team_id[0], team_str)
         return team_id[0]
 
 
-    def scrape_statline(self, player_id, statline, playoff_dict, adv):
-        """ Responsible for scraping the statline soup.
-            Args:
-                player_id: The id for the player that is being scraped.
-                statline: The BeautifulSoup object containing the row of all
-                    the player stats.
-                playoff_dict: The dictionary that maps team's to playoff round.
-                    It is an empty defaultdict for regular season statlines.
-                adv: A boolean that when true scrapes the advanced stats.
-            Returns:
-                A tuple containing all stat values in the table row.
-        """
-        # adv stats
-        if adv:
-            usg  = self.get_stat('usg_pct', statline)
-            ortg = self.get_stat('off_rtg', statline)
-            drtg = self.get_stat('def_rtg', statline)
-
-            return (usg, ortg, drtg)
-
-        # basic stats
-        game_date   = self.get_stat('date_game', statline)
-        game_result = self.get_stat('game_result', statline)
-        location    = self.get_stat('game_location', statline)
-        team        = self.get_stat('team_id', statline)
-        opp         = self.get_stat('opp_id', statline)
-        started     = self.get_stat('gs', statline)
-        time_played = self.get_stat('mp', statline)
-        fg          = self.get_stat('fg', statline)
-        fga         = self.get_stat('fga', statline)
-        fg3         = self.get_stat('fg3', statline)
-        fg3a        = self.get_stat('fg3a', statline)
-        ft          = self.get_stat('ft', statline)
-        fta         = self.get_stat('fta', statline)
-        orb         = self.get_stat('orb', statline)
-        drb         = self.get_stat('drb', statline)
-        ast         = self.get_stat('ast', statline)
-        stl         = self.get_stat('stl', statline)
-        blk         = self.get_stat('blk', statline)
-        tov         = self.get_stat('tov', statline)
-        pf          = self.get_stat('pf', statline)
-        plus_minus  = self.get_stat('plus_minus', statline)
-
-        # get playoff_rd (e.g. 0 = regular season, 4 = finals)
-        playoff_rd = playoff_dict[opp]
-        # convert MM:SS to seconds
-        if not time_played:
-            mmss = [0,0]
-        else:
-            mmss = list(map(int, time_played.split(':')))
-        seconds = mmss[0]*60 +mmss[1]
-        # convert date string to datetime object
-        date = datetime.date(*tuple(map(int, game_date.split('-'))))
-        # convert started (0 or 1) to a boolean
-        started = bool(int(started))
-        # convert game_result string (e.g. "L (-15)") into an int (-15)
-        win_margin = eval(game_result[game_result.find('('):])
-        # convert location ('@' or '') to a boolean
-        home = False
-        if location == None or location == '':
-            home = True
-        # convert team abbrevations to their corresponding team_id in the DB
-        team_id = self.get_team_id(team)
-        opp_id = self.get_team_id(opp)
-
-        return (player_id, date, playoff_rd, win_margin, home, team_id, opp_id,
-                started, seconds, fg, fga, fg3, fg3a, ft, fta, orb, drb,ast, 
-                stl, blk, tov, pf, plus_minus)
-
-
     def update_performances(self, performance_data, player_id):
-        """ Inserts new performance into performance table and updates the
-            last_played date in the player table.
+        """ Inserts new performances into the performance table with
+            multi-row inserts and updates the last_played date in the player
+            table and the split rollups, all in one transaction. Games that
+            are already stored are skipped, so this can be run again on the
+            same data.
             Args:
                 performance_data: The columns to be updated in performances.
                 player_id: The id for the player who will be updated.
@@ -320,21 +279,32 @@ class BBR_Crawler(object):
         self.cursor.execute(select_player_name, (player_id,))
         player_name = self.cursor.fetchone()[0]
 
-        successful_insert_count = 0
-        for p in performance_data:
-            if last_played == None or last_played < p.game_date:
-                # insert into performance table
-                self.cursor.execute(insert_performance, p)
-                # update last played date for player
-                self.cursor.execute(update_last_played, (p.game_date, player_id))
-                successful_insert_count += 1
-
-        self.print_ts("Successfully inserted {} performances for {}".format(
-                      successful_insert_count, player_name))
+        new_games = [p for p in performance_data
+                     if last_played == None or last_played < p.game_date]
+        start = time()
+        with self.transaction() as cursor:
+            inserted = insert_performances(cursor, player_id, new_games)
+            upsert_rollups(cursor, inserted)
+        duration = time() - start
+        successful_insert_count = len(inserted)
+        self.rows_written += successful_insert_count
+        self.write_seconds += duration
+
+        self.print_ts("Successfully inserted {} performances for {} "
+                      "({:.0f} rows/s)".format(
+                      successful_insert_count, player_name,
+                      successful_insert_count / max(duration, 1e-6)))
+        # upsert_rollups bumped rollup_version, so query servers re-rank
+        # their leaderboards on the next leader query
+        if successful_insert_count:
+            for listener in self.insert_listeners:
+                listener(player_id, player_name, inserted)
 
 
     def crawl(self, complete_crawl=False, start_id=1):
-        """ Begins the crawling process.
+        """ Begins the crawling process. Only the seasons that can have new
+            games are crawled (see plan_crawl), most recently active players
+            first.
             Args:
                 complete_crawl: boolean that when True will crawl player data
                     from the beginning of their rookie year. This is only
@@ -347,34 +317,47 @@ class BBR_Crawler(object):
         self.cursor.execute(select_all_players)
         players = self.cursor.fetchall()
 
-        now = datetime.datetime.now()
-        current_season = now.year
-        # update the new season every September
-        if now.month > 8:
-            current_season += 1
-
         # player tuple: (player_id, name, url, rookie_year, last_played)
-        for player in players:
-            # start_id is a player_id of where we want to start scraping
-            # this allows us to skip players if we know they are up to date
-            # and can save us time
-            if player[0] < start_id:
-                continue
-            player_data = []
-            start_season = current_season
-            if complete_crawl:
-                # start at player's rookie season for complete crawl
-                start_season = player[3]
-
-            for season in range(start_season, current_season+1):
-                player_data.extend(self.scrape_season(player[0],
-                                                      player[2],
-                                                      str(season)))
-
-            self.update_performances(player_data, player[0])
-
+        plan = plan_crawl(players,
+                          datetime.date.today(),
+                          complete_crawl = complete_crawl,
+                          start_id = start_id)
+        jobs = []
+        for player, seasons in group_by_player(plan):
+            seasons = [str(s) for s in seasons]
+            urls = []
+            for season in seasons:
+                urls.extend(self.gamelog_urls(player[2], season))
+            jobs.append(((player[0], seasons), urls))
+        self.print_ts("Planned {} seasons of {} out of {} players".format(
+                      len(plan), len(jobs), len(players)))
+
+        # pages are fetched and parsed concurrently, while the DB is only
+        # written from this thread
+        pipeline = CrawlPipeline(self.get_page,
+                                 parse_player,
+                                 self.write_player,
+                                 fetch_workers = self.fetch_workers,
+                                 parse_workers = self.parse_workers,
+                                 queue_size = self.queue_size)
+        pipeline.run(jobs)
+        for job, e in pipeline.errors:
+            self.print_ts("Failed to crawl player {}: {!r}".format(job[0], e))
+        self.print_ts("Inserted {} performances in {:.1f}s of writing "
+                      "({:.0f} rows/s)".format(
+                      self.rows_written, self.write_seconds,
+                      self.rows_written / max(self.write_seconds, 1e-6)))
 
         self.cursor.close()
         self.conn.close()
 
 
+    def write_player(self, job, player_data):
+        """ Stores the gamelog rows parsed for a crawl job.
+            Args:
+                job: The (player_id, seasons) tuple that was crawled.
+                player_data: A list of tuples as returned by parse_season.
+        """
+        self.update_performances(self.to_performances(player_data), job[0])
+
+
@@ -0,0 +1,351 @@
+""" Parses basketball-reference gamelog pages into performance rows. The
+    functions here only read HTML, so that pages can be parsed in worker
+    processes while the crawler keeps fetching.
+"""
+
+import datetime
+
+from html.parser import HTMLParser
+from collections import defaultdict
+
+# tags that never have children or a closing tag
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                 'keygen', 'link', 'menuitem', 'meta', 'param', 'source',
+                 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame',
+                 'image', 'isindex', 'nextid', 'spacer'}
+WHITESPACE = ' \t\n\r\f'
+
+
+class _Comment(str):
+    """ A comment inside a cell, which is never merged with adjacent text. """
+
+
+def _cell_string(node):
+    """ Returns:
+            The text of a cell node as BeautifulSoup's .string would give it,
+            i.e. its only string descendant if it has a single child at
+            every level, and None otherwise.
+    """
+    while len(node) == 1:
+        child = node[0]
+        if isinstance(child, str):
+            child = str(child)
+            # whitespace-only strings are collapsed, as in BeautifulSoup
+            if not child.strip(WHITESPACE):
+                return '\n' if '\n' in child else ' '
+            return child
+        node = child
+    return None
+
+
+class GamelogParser(HTMLParser):
+    """ Tokenizes a gamelog page once, collecting the rows of the first
+        tbody in each of the divs with the given ids (or in the whole page if
+        div_ids is None). Each row is a (has_id, cells) pair, where cells maps
+        the data-stat of the first td with each data-stat to its text. The
+        site ships its playoff tables commented out, so for the divs in
+        commented_ids the first comment is tokenized in place of the div.
+        The rows end up in self.tables, keyed by div id.
+    """
+
+    def __init__(self, div_ids=None, commented_ids=()):
+        super().__init__(convert_charrefs=True)
+        self.div_ids = div_ids
+        self.commented_ids = set(commented_ids)
+        self.tables = {}
+        # (tag, role) for every open tag
+        self._stack = []
+        self._seen = set()
+        self._commented = set()
+        self._section = None
+        self._tbody_done = False
+        self._rows = None
+        self._row = None
+        self._row_has_id = False
+        self._cell_stat = None
+        # the open nodes of the cell being read, as lists of children
+        self._nodes = None
+
+
+    def _reading(self):
+        return self.div_ids is None or self._section is not None
+
+
+    def handle_starttag(self, tag, attrs):
+        if self._nodes is not None:
+            node = []
+            self._nodes[-1].append(node)
+            if tag not in VOID_ELEMENTS:
+                self._nodes.append(node)
+                self._stack.append((tag, 'node'))
+            return
+        if tag in VOID_ELEMENTS:
+            return
+
+        attrs = dict(attrs)
+        role = None
+        if (tag == 'div' and self._section is None and self.div_ids
+                and attrs.get('id') in self.div_ids
+                and attrs['id'] not in self._seen):
+            role = 'div'
+            self._section = attrs['id']
+            self._seen.add(self._section)
+            self._tbody_done = False
+        elif tag == 'tbody':
+            if (self._reading() and self._rows is None
+                    and not self._tbody_done):
+                role = 'tbody'
+                self._rows = []
+        elif tag == 'tr':
+            if self._rows is not None and self._row is None:
+                role = 'tr'
+                self._row = {}
+                self._row_has_id = 'id' in attrs
+        elif tag == 'td':
+            stat = attrs.get('data-stat')
+            if self._row is not None and stat is not None:
+                role = 'cell'
+                self._cell_stat = stat
+                self._nodes = [[]]
+        self._stack.append((tag, role))
+
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        # like BeautifulSoup, close everything up to the last open tag of
+        # the same name and ignore unmatched end tags
+        for i in range(len(self._stack)-1, -1, -1):
+            if self._stack[i][0] == tag:
+                break
+        else:
+            return
+        while len(self._stack) > i:
+            self._close(self._stack.pop()[1])
+
+
+    def close(self):
+        super().close()
+        # tags left open at the end of the page are closed, as in
+        # BeautifulSoup
+        while self._stack:
+            self._close(self._stack.pop()[1])
+
+
+    def _close(self, role):
+        if role == 'node':
+            self._nodes.pop()
+        elif role == 'cell':
+            if self._cell_stat not in self._row:
+                self._row[self._cell_stat] = _cell_string(self._nodes[0])
+            self._nodes = None
+        elif role == 'tr':
+            self._rows.append((self._row_has_id, self._row))
+            self._row = None
+        elif role == 'tbody':
+            # a commented out table takes precedence over the div's own
+            self.tables.setdefault(self._section, self._rows)
+            self._rows = None
+            self._tbody_done = True
+        elif role == 'div':
+            self._section = None
+
+
+    def handle_data(self, data):
+        if self._nodes is not None:
+            node = self._nodes[-1]
+            if node and type(node[-1]) is str:
+                node[-1] += data
+            else:
+                node.append(data)
+
+
+    def handle_comment(self, data):
+        if self._nodes is not None:
+            self._nodes[-1].append(_Comment(data))
+        elif (self._section in self.commented_ids
+                and self._section not in self._commented):
+            self._commented.add(self._section)
+            comment = GamelogParser()
+            comment.feed(data)
+            comment.close()
+            self.tables[self._section] = comment.tables.get(None, [])
+
+
+def get_playoff_teams(rows):
+    """ Creates a dictionary that maps the playoff round to a team id.
+        Args:
+            rows: The (has_id, cells) rows of the playoff table.
+        Returns:
+            A dictionary with keys as team names and values as the
+            playoff round.
+    """
+    rd = 1
+    prev_team = ''
+    playoff_dict = defaultdict(int)
+    for _, cells in rows:
+        # skip any row that doesn't have the tag 'opp_id'
+        if 'opp_id' not in cells:
+            continue
+        opponent = cells['opp_id']
+
+        if opponent != prev_team:
+            playoff_dict[opponent] = rd
+            rd += 1
+            prev_team = opponent
+
+    return playoff_dict
+
+
+def scrape_statline(player_id, statline, playoff_dict, adv):
+    """ Responsible for scraping the statline cells.
+        Args:
+            player_id: The id for the player that is being scraped.
+            statline: The dictionary mapping each data-stat in the row to
+                its text.
+            playoff_dict: The dictionary that maps team's to playoff round.
+                It is an empty defaultdict for regular season statlines.
+            adv: A boolean that when true scrapes the advanced stats.
+        Returns:
+            A tuple containing all stat values in the table row, with the
+            team and opponent as abbreviations.
+    """
+    get_stat = statline.get
+    # adv stats
+    if adv:
+        usg  = get_stat('usg_pct')
+        ortg = get_stat('off_rtg')
+        drtg = get_stat('def_rtg')
+
+        return (usg, ortg, drtg)
+
+    # basic stats
+    game_date   = get_stat('date_game')
+    game_result = get_stat('game_result')
+    location    = get_stat('game_location')
+    team        = get_stat('team_id')
+    opp         = get_stat('opp_id')
+    started     = get_stat('gs')
+    time_played = get_stat('mp')
+    fg          = get_stat('fg')
+    fga         = get_stat('fga')
+    fg3         = get_stat('fg3')
+    fg3a        = get_stat('fg3a')
+    ft          = get_stat('ft')
+    fta         = get_stat('fta')
+    orb         = get_stat('orb')
+    drb         = get_stat('drb')
+    ast         = get_stat('ast')
+    stl         = get_stat('stl')
+    blk         = get_stat('blk')
+    tov         = get_stat('tov')
+    pf          = get_stat('pf')
+    plus_minus  = get_stat('plus_minus')
+
+    # get playoff_rd (e.g. 0 = regular season, 4 = finals)
+    playoff_rd = playoff_dict[opp]
+    # convert MM:SS to seconds
+    if not time_played:
+        mmss = [0,0]
+    else:
+        mmss = list(map(int, time_played.split(':')))
+    seconds = mmss[0]*60 +mmss[1]
+    # convert date string to datetime object
+    date = datetime.date(*tuple(map(int, game_date.split('-'))))
+    # convert started (0 or 1) to a boolean
+    started = bool(int(started))
+    # convert game_result string (e.g. "L (-15)") into an int (-15)
+    win_margin = eval(game_result[game_result.find('('):])
+    # convert location ('@' or '') to a boolean
+    home = False
+    if location == None or location == '':
+        home = True
+
+    return (player_id, date, playoff_rd, win_margin, home, team, opp,
+            started, seconds, fg, fga, fg3, fg3a, ft, fta, orb, drb,ast,
+            stl, blk, tov, pf, plus_minus)
+
+
+def scrape_gamelog(player_id, html, advanced=False):
+    """ Scraped a gamelog for a given player. It can be regular stats or
+        advanced.
+        Args:
+            player_id: The id for the given player to be scraped.
+            html: The HTML of the gamelog page, as bytes or str.
+            advanced: A boolean that when true scraped the advanced
+                gamelog stats.
+        Returns:
+            A list of gamelog data which are stored as tuples.
+    """
+    reg_season_div_id = 'all_pgl_basic'
+    post_season_div_id = 'all_pgl_basic_playoffs'
+    if advanced:
+        reg_season_div_id = 'all_pgl_advanced'
+        post_season_div_id = 'all_pgl_advanced_playoffs'
+
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', 'replace')
+    # for some reason, the HTML for playoff data is in a comment...
+    parser = GamelogParser({reg_season_div_id, post_season_div_id},
+                           commented_ids = {post_season_div_id})
+    parser.feed(html)
+    parser.close()
+
+    gl_data = []
+    for has_id, cells in parser.tables.get(reg_season_div_id, []):
+        if has_id:
+            gl_data.append(scrape_statline(player_id,
+                                           cells,
+                                           defaultdict(int),
+                                           advanced))
+
+    post_season_rows = parser.tables.get(post_season_div_id, [])
+    post_season_dict = get_playoff_teams(post_season_rows)
+    for has_id, cells in post_season_rows:
+        if has_id:
+            gl_data.append(scrape_statline(player_id,
+                                           cells,
+                                           post_season_dict,
+                                           advanced))
+
+    return gl_data
+
+
+def parse_season(player_id, basic_html, adv_html):
+    """ Parses the basic and advanced gamelog pages of one season.
+        Args:
+            player_id: The id for the player being scraped.
+            basic_html: The HTML of the basic gamelog page.
+            adv_html: The HTML of the advanced gamelog page.
+        Returns:
+            A list of tuples with the values of a Performance for each game,
+            except that the team and opponent are abbreviations.
+    """
+    basic_data = scrape_gamelog(player_id, basic_html)
+    adv_data = scrape_gamelog(player_id, adv_html, advanced=True)
+    # adds both basic and advanced data tuples for each game
+    return list(map(lambda x,y: x+y, basic_data, adv_data))
+
+
+def parse_player(job, pages):
+    """ Parses the pages fetched for a crawl job of one player.
+        Args:
+            job: A (player_id, seasons) tuple.
+            pages: The basic and advanced gamelog pages of each season, in
+                the order of seasons, i.e. [basic, advanced, basic, ...].
+        Returns:
+            A list of tuples as returned by parse_season, for all seasons.
+    """
+    player_id, seasons = job
+    player_data = []
+    for i in range(len(seasons)):
+        player_data.extend(parse_season(player_id,
+                                        pages[2*i],
+                                        pages[2*i+1]))
+    return player_data
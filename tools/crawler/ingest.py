@@ -0,0 +1,113 @@
+""" Bulk ingestion of scraped performances """
+
+from psycopg2.extras import execute_values
+
+from hooperhub.util.columnar import PERFORMANCE_COLUMNS
+
+
+# a player plays at most one game a day, so inserting a game that is already
+# stored is a no-op and a crawl can safely be run again
+CREATE_PERFORMANCE_KEY = """
+    CREATE UNIQUE INDEX IF NOT EXISTS performance_player_date_key
+    ON performance (player_id, game_date);
+    """
+
+FIND_DUPLICATE_PERFORMANCES = """
+    SELECT player_id, game_date, count(*) FROM performance
+    GROUP BY player_id, game_date HAVING count(*) > 1
+    ORDER BY player_id, game_date;
+    """
+
+# keeps the first stored row of each (player_id, game_date)
+DELETE_DUPLICATE_PERFORMANCES = """
+    DELETE FROM performance p USING performance q
+    WHERE p.player_id = q.player_id AND p.game_date = q.game_date
+    AND p.ctid > q.ctid;
+    """
+
+INSERT_PERFORMANCES = """
+    INSERT INTO performance ({columns}) VALUES %s
+    ON CONFLICT (player_id, game_date) DO NOTHING
+    RETURNING game_date;
+    """.format(columns=', '.join(PERFORMANCE_COLUMNS))
+
+UPDATE_LAST_PLAYED = """
+    UPDATE player SET last_played = GREATEST(last_played, %s)
+    WHERE player_id = %s;
+    """
+
+# rows per INSERT statement
+PAGE_SIZE = 500
+
+
+def ensure_performance_key(cursor, remove_duplicates=False):
+    """ Creates the unique index on performance (player_id, game_date) that
+        insert_performances relies on, unless it exists already. Tables
+        filled by earlier crawls can have the same game stored twice, which
+        would make creating the index fail, so they are checked first.
+        Args:
+            cursor: The cursor to execute on.
+            remove_duplicates: Whether to delete all but the first stored row
+                of each duplicated game instead of raising.
+        Returns:
+            The number of duplicate rows that were deleted.
+        Raises:
+            ValueError: If the table has duplicated games and
+                remove_duplicates is False.
+    """
+    cursor.execute("SELECT to_regclass('performance_player_date_key');")
+    if cursor.fetchone()[0] is not None:
+        return 0
+    cursor.execute(FIND_DUPLICATE_PERFORMANCES)
+    duplicates = cursor.fetchall()
+    removed = 0
+    if duplicates and not remove_duplicates:
+        examples = ', '.join('player {} on {} ({} rows)'.format(*d)
+                             for d in duplicates[:5])
+        raise ValueError("Cannot create performance_player_date_key: {} "
+                         "(player_id, game_date) pairs are stored more than "
+                         "once, e.g. {}. Remove the duplicates, or run with "
+                         "remove_duplicates=True to keep only the first row "
+                         "of each.".format(len(duplicates), examples))
+    if duplicates:
+        cursor.execute(DELETE_DUPLICATE_PERFORMANCES)
+        removed = cursor.rowcount
+    cursor.execute(CREATE_PERFORMANCE_KEY)
+    return removed
+
+
+def insert_performances(cursor, player_id, performances,
+                        page_size=PAGE_SIZE):
+    """ Inserts the performances of a player with multi-row INSERTs, skips
+        games that are already stored and moves the player's last_played
+        date forward once to the latest game. Call this in a transaction.
+        Args:
+            cursor: The cursor to execute on.
+            player_id: The id of the player the performances belong to.
+            performances: Sequences of values in PERFORMANCE_COLUMNS order,
+                such as the crawler's Performance tuples.
+            page_size: The number of rows per INSERT statement.
+        Returns:
+            The list of performances that were inserted, i.e. were not
+            stored yet.
+    """
+    if not performances:
+        return []
+    inserted_dates = set()
+    for i in range(0, len(performances), page_size):
+        page = performances[i:i+page_size]
+        # one page per statement, so that every RETURNING row is fetched
+        execute_values(cursor, INSERT_PERFORMANCES, page,
+                       page_size = len(page))
+        inserted_dates.update(row[0] for row in cursor.fetchall())
+
+    date_idx = PERFORMANCE_COLUMNS.index('game_date')
+    cursor.execute(UPDATE_LAST_PLAYED,
+                   (max(p[date_idx] for p in performances), player_id))
+    inserted = []
+    for p in performances:
+        # only the first of two rows with the same date was inserted
+        if p[date_idx] in inserted_dates:
+            inserted_dates.remove(p[date_idx])
+            inserted.append(p)
+    return inserted
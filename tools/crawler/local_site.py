@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+""" Serves saved basketball-reference pages from a directory, so that the
+    crawler can be run and timed offline. A request for /players/j/
+    jamesle01/gamelog/2016 is answered with <pages>/players/j/jamesle01/
+    gamelog/2016 or the same path with .html appended, and with a 404 when
+    neither exists. Pages carry a Last-Modified header from the file's
+    modification time and If-Modified-Since is answered with 304, like the
+    real site.
+"""
+
+import os
+import argparse
+import threading
+
+from time import sleep
+from email.utils import formatdate, parsedate_to_datetime
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def make_handler(root, latency=0.0):
+    """ Returns:
+            A request handler class serving the pages under root, each after
+            latency seconds, like a remote server would.
+    """
+    root = os.path.abspath(root)
+
+    class SavedPageHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            path = os.path.normpath(os.path.join(root,
+                                                 self.path.lstrip('/')))
+            for candidate in (path, path + '.html'):
+                if candidate.startswith(root) and os.path.isfile(candidate):
+                    with open(candidate, 'rb') as f:
+                        body = f.read()
+                    mtime = int(os.path.getmtime(candidate))
+                    break
+            else:
+                self.send_error(404)
+                return
+            sleep(latency)
+            since = self.headers.get('If-Modified-Since')
+            if since and parsedate_to_datetime(since).timestamp() >= mtime:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Last-Modified', formatdate(mtime, usegmt=True))
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+
+        def log_message(self, format, *args):
+            pass
+
+    return SavedPageHandler
+
+
+def serve(root, port=0, latency=0.0):
+    """ Starts serving the pages under root on a background thread.
+        Args:
+            root: The directory of saved pages.
+            port: The port to listen on, or 0 for any free port.
+            latency: Seconds to wait before answering each request.
+        Returns:
+            The server, whose base URL is
+            'http://127.0.0.1:{}'.format(server.server_port). Stop it with
+            server.shutdown().
+    """
+    server = _ThreadingHTTPServer(('127.0.0.1', port),
+                                  make_handler(root, latency))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--pages',
+                            type = str,
+                            required = True,
+                            help = "directory of saved pages")
+    arg_parser.add_argument('--port', type = int, default = 8000)
+    arg_parser.add_argument('--latency',
+                            type = float,
+                            default = 0.0,
+                            help = "seconds before each response")
+    args = arg_parser.parse_args()
+    server = _ThreadingHTTPServer(('127.0.0.1', args.port),
+                                  make_handler(args.pages, args.latency))
+    print("Serving {} on http://127.0.0.1:{}".format(args.pages, args.port))
+    server.serve_forever()
@@ -0,0 +1,134 @@
+""" A compressed on-disk cache of fetched pages, so that pages which have
+    not changed are not downloaded again.
+"""
+
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+
+from time import time
+
+
+def _write_atomic(path, data):
+    """ Writes data to path through a temporary file, so that concurrent
+        readers never see a partial file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+class PageCache(object):
+    """ Stores pages gzipped under the SHA-256 of their content, so that
+        identical pages (e.g. empty gamelogs) are stored once, and keeps a
+        small JSON entry per URL with the content hash and the ETag and
+        Last-Modified headers to revalidate it with. Entries marked
+        immutable, e.g. gamelogs of completed seasons, are served without
+        revalidation. Safe to use from several threads or processes.
+    """
+
+    def __init__(self, directory):
+        """ Creates the PageCache.
+            Args:
+                directory: The directory the cache is stored in. It is
+                    created if it does not exist.
+        """
+        self.directory = directory
+        self.url_dir = os.path.join(directory, 'urls')
+        self.page_dir = os.path.join(directory, 'pages')
+        os.makedirs(self.url_dir, exist_ok=True)
+        os.makedirs(self.page_dir, exist_ok=True)
+
+
+    def _entry_path(self, url):
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.url_dir, name+'.json')
+
+
+    def _page_path(self, digest):
+        return os.path.join(self.page_dir, digest[:2], digest+'.gz')
+
+
+    def entry(self, url):
+        """ Returns:
+                The cache entry of the URL, a dictionary with the keys url,
+                digest, etag, last_modified, immutable and fetched, or None
+                if the URL is not cached.
+        """
+        try:
+            with open(self._entry_path(url)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    def page(self, entry):
+        """ Returns:
+                The page of the cache entry, or None if it is missing.
+        """
+        try:
+            with gzip.open(self._page_path(entry['digest'])) as f:
+                return f.read()
+        except (OSError, EOFError):
+            return None
+
+
+    def conditional_headers(self, entry):
+        """ Returns:
+                The request headers that ask the server to answer 304 Not
+                Modified if the page of the entry is still current.
+        """
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+
+    def store(self, url, page, etag=None, last_modified=None,
+              immutable=False):
+        """ Stores a fetched page.
+            Args:
+                url: The URL of the page.
+                page: The page as bytes.
+                etag: The ETag header of the response, if any.
+                last_modified: The Last-Modified header of the response, if
+                    any.
+                immutable: Whether the page can no longer change, in which
+                    case it is never revalidated.
+        """
+        digest = hashlib.sha256(page).hexdigest()
+        page_path = self._page_path(digest)
+        if not os.path.exists(page_path):
+            os.makedirs(os.path.dirname(page_path), exist_ok=True)
+            _write_atomic(page_path, gzip.compress(page))
+        self._write_entry({'url': url,
+                           'digest': digest,
+                           'etag': etag,
+                           'last_modified': last_modified,
+                           'immutable': immutable,
+                           'fetched': time()})
+
+
+    def revalidated(self, entry, immutable=False):
+        """ Records that the server answered 304 Not Modified for an entry.
+            Args:
+                entry: The cache entry that was revalidated.
+                immutable: Whether the page can no longer change.
+        """
+        entry = dict(entry, fetched=time())
+        entry['immutable'] = entry['immutable'] or immutable
+        self._write_entry(entry)
+
+
+    def _write_entry(self, entry):
+        _write_atomic(self._entry_path(entry['url']),
+                      json.dumps(entry).encode('utf-8'))
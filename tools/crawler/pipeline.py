@@ -0,0 +1,179 @@
+""" A staged crawl: throttled fetching, parsing in worker processes and
+    writing, connected by bounded queues
+"""
+
+import queue
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+from time import monotonic, sleep
+
+
+class TokenBucket(object):
+    """ Limits requests to rate per second on average, allowing bursts of up
+        to burst requests after an idle period. With burst=1 requests are
+        spaced at least 1/rate seconds apart. Thread-safe.
+    """
+
+    def __init__(self, rate, burst=1):
+        """ Creates a full TokenBucket.
+            Args:
+                rate: The number of requests allowed per second.
+                burst: The number of requests that may be made back to back.
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = monotonic()
+        self._lock = threading.Lock()
+
+
+    def acquire(self):
+        """ Blocks until a request may be made and takes its token. """
+        while True:
+            with self._lock:
+                now = monotonic()
+                self._tokens = min(self.burst,
+                                   self._tokens + (now-self._last)*self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            sleep(wait)
+
+
+# marks the end of the jobs on a queue
+_DONE = object()
+
+
+class CrawlPipeline(object):
+    """ Runs crawl jobs through three stages. Fetch threads download the pages
+        of each job, taking a token from a TokenBucket before every request
+        (unless fetch throttles itself) so that the allowed request rate stays
+        saturated while other requests are in flight. A process pool parses the
+        pages of each job, and the calling thread writes the parsed results,
+        e.g. to the database. The stages are connected by queues of queue_size
+        jobs, so a slow stage holds the ones before it back instead of letting
+        pages pile up in memory.
+    """
+
+    def __init__(self,
+                 fetch,
+                 parse,
+                 write,
+                 bucket=None,
+                 fetch_workers=2,
+                 parse_workers=None,
+                 queue_size=16):
+        """ Creates the CrawlPipeline.
+            Args:
+                fetch: A thread-safe function that takes a URL and returns
+                    its page.
+                parse: A module-level function that takes a job and the
+                    list of its pages and returns the parsed result. It runs
+                    in a worker process, so its arguments and result are
+                    pickled.
+                write: A function that takes a job and its parsed result. It
+                    runs in the thread that calls run().
+                bucket: The TokenBucket that throttles fetch(), or None if
+                    fetch takes its own tokens, e.g. to skip cached pages.
+                fetch_workers: The number of fetch threads, i.e. the most
+                    requests in flight at once.
+                parse_workers: The number of parser processes. Defaults to
+                    the number of CPUs.
+                queue_size: The number of jobs each queue holds.
+        """
+        self.fetch = fetch
+        self.parse = parse
+        self.write = write
+        self.bucket = bucket
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        # (job, exception) for every job that failed in any stage
+        self.errors = []
+        self.fetched_count = 0
+        self.written_count = 0
+
+
+    def _fetch_loop(self, jobs, fetched):
+        while True:
+            item = jobs.get()
+            if item is _DONE:
+                fetched.put(_DONE)
+                return
+            job, urls = item
+            pages = []
+            try:
+                for url in urls:
+                    if self.bucket:
+                        self.bucket.acquire()
+                    pages.append(self.fetch(url))
+            except Exception as e:
+                # the job is dropped, to be crawled again on the next run
+                self.errors.append((job, e))
+                continue
+            fetched.put((job, pages))
+
+
+    def _parse_loop(self, executor, fetched, parsed):
+        remaining = self.fetch_workers
+        while remaining:
+            item = fetched.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            job, pages = item
+            self.fetched_count += 1
+            # a full queue blocks here, which bounds the parses in flight
+            parsed.put((job, executor.submit(self.parse, job, pages)))
+        parsed.put(_DONE)
+
+
+    def _feed(self, items, jobs):
+        for item in items:
+            jobs.put(item)
+        for _ in range(self.fetch_workers):
+            jobs.put(_DONE)
+
+
+    def run(self, items):
+        """ Crawls every job and returns once all of them are written.
+            Args:
+                items: An iterable of (job, urls) pairs, where job is a
+                    picklable description of the work passed to parse and
+                    write, and urls is the list of URLs to fetch for it.
+            Returns:
+                The number of jobs written.
+        """
+        jobs = queue.Queue(self.queue_size)
+        fetched = queue.Queue(self.queue_size)
+        parsed = queue.Queue(self.queue_size)
+        with ProcessPoolExecutor(self.parse_workers) as executor:
+            threads = [threading.Thread(target=self._feed,
+                                        args=(items, jobs))]
+            threads.extend(threading.Thread(target=self._fetch_loop,
+                                            args=(jobs, fetched))
+                           for _ in range(self.fetch_workers))
+            threads.append(threading.Thread(target=self._parse_loop,
+                                            args=(executor, fetched, parsed)))
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+
+            while True:
+                item = parsed.get()
+                if item is _DONE:
+                    break
+                job, future = item
+                try:
+                    self.write(job, future.result())
+                    self.written_count += 1
+                except Exception as e:
+                    self.errors.append((job, e))
+            for thread in threads:
+                thread.join()
+        return self.written_count
@@ -0,0 +1,88 @@
+""" Plans which players and seasons a crawl needs to fetch """
+
+import heapq
+
+
+def season_of(date):
+    """ Returns:
+            The year in which the season of the given date ends, which is
+            how seasons are named in gamelog URLs. A new season starts every
+            September.
+    """
+    if date.month > 8:
+        return date.year + 1
+    return date.year
+
+
+def plan_crawl(players, today, complete_crawl=False, start_id=1,
+               retired_after=2, rookie_seasons=2):
+    """ Builds a priority queue of the (player, season) pairs that can have
+        games which are not stored yet and returns it in priority order.
+        Seasons before the one of a player's last_played date are complete
+        and stored, so they are skipped, as are players who have not played
+        for retired_after seasons. Players without stored games are crawled
+        from their rookie year, but an incremental crawl only looks for the
+        first games of recent rookies. Players who played
+        most recently come first, so that a crawl that is cut short has
+        updated the active players.
+        Args:
+            players: (player_id, name, url, rookie_year, last_played)
+                tuples from the player table.
+            today: The date of the crawl.
+            complete_crawl: Whether to crawl players without stored games
+                from their rookie year.
+            start_id: The first player id to crawl for.
+            retired_after: The number of seasons without a game after which
+                a player is considered retired.
+            rookie_seasons: The number of seasons, including the current
+                one, in which an incremental crawl looks for the first games
+                of a player.
+        Returns:
+            The list of (player, season) pairs, where season is an int. The
+            seasons of a player are consecutive and in ascending order.
+    """
+    current_season = season_of(today)
+    queue = []
+    for player in players:
+        player_id, rookie_year, last_played = player[0], player[3], player[4]
+        if player_id < start_id:
+            continue
+
+        if last_played is not None:
+            first_season = season_of(last_played)
+            if first_season <= current_season - retired_after:
+                continue
+            days_idle = (today - last_played).days
+        else:
+            first_season = rookie_year
+            if (not complete_crawl
+                    and rookie_year <= current_season - rookie_seasons):
+                continue
+            # players without games go after every player with games
+            days_idle = float('inf')
+
+        for season in range(max(first_season, rookie_year),
+                             current_season+1):
+            heapq.heappush(queue, (days_idle, player_id, season, player))
+
+    plan = []
+    while queue:
+        _, _, season, player = heapq.heappop(queue)
+        plan.append((player, season))
+    return plan
+
+
+def group_by_player(plan):
+    """ Groups a crawl plan into one entry per player.
+        Args:
+            plan: The list of (player, season) pairs from plan_crawl.
+        Returns:
+            A list of (player, seasons) pairs in the order of the plan.
+    """
+    groups = []
+    for player, season in plan:
+        if groups and groups[-1][0][0] == player[0]:
+            groups[-1][1].append(season)
+        else:
+            groups.append((player, [season]))
+    return groups